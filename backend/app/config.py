@@ -16,6 +16,36 @@ class Settings(BaseSettings):
     # Plex
     plex_client_id: str = "byetz-app"
     plex_product: str = "BYETZ"
+    # Server polled for playback activity (default: first server of the
+    # first signed-in user)
+    plex_server_url: str = ""
+    plex_server_token: str = ""
+
+    # Back off clip processing while Plex is streaming: direct plays slow
+    # intake to one item per slow interval; transcodes (or pause_streams
+    # concurrent streams) pause it until the next poll
+    plex_throttle_enabled: bool = True
+    plex_throttle_poll_s: int = 30
+    plex_throttle_slow_interval_s: int = 300
+    plex_throttle_pause_streams: int = 3
+
+    # Library scans list only items added/updated since the last scan; a full
+    # listing that also drops deleted items runs every reconcile interval.
+    # The periodic delta scan needs celery beat (0 disables it)
+    plex_delta_scan_interval_min: int = 15
+    plex_reconcile_interval_h: int = 24
+    # Library listings are fetched in pages, a few at a time
+    plex_page_size: int = 500
+    plex_page_concurrency: int = 4
+    plex_page_retries: int = 3
+
+    # Shared HTTP clients for Plex (plex.tv and media servers). Pool limits
+    # apply per host and process; HTTP/2 to plex.tv needs the h2 package
+    http2_enabled: bool = True
+    http_timeout_s: float = 10.0
+    http_max_connections: int = 32
+    http_max_keepalive_connections: int = 16
+    http_keepalive_expiry_s: float = 60.0
 
     # Clip Storage
     clip_storage_path: str = "/data/clips"
@@ -25,6 +55,82 @@ class Settings(BaseSettings):
     max_clip_duration_ms: int = 30000
     clips_per_movie: int = 10
     clips_per_episode: int = 5
+    # Clips encoded per ffmpeg process during extraction
+    clip_extract_batch_size: int = 5
+    # Stream-copy H.264 video cut on keyframes instead of re-encoding
+    clip_smart_cut: bool = True
+    smart_cut_max_shift_ms: int = 2000
+    # Width of the feed-card thumbnail variant (0 disables it)
+    thumbnail_small_width: int = 480
+
+    # Media analysis
+    # Scene detection profile: "full" (every frame, full resolution),
+    # "reduced" (downscaled, low fps) or "keyframe" (keyframes only, downscaled)
+    scene_analysis_profile: str = "full"
+    scene_reduced_width: int = 320
+    scene_reduced_fps: float = 4.0
+    # "full" decodes the whole runtime; "targeted" only decodes windows around
+    # subtitle lines (titles without text subtitles still get a full pass)
+    analysis_mode: str = "targeted"
+    # Extra context decoded on each side of a candidate for scene snapping
+    targeted_window_padding_ms: int = 10000
+    # Windows closer than this are decoded as one range
+    targeted_merge_gap_ms: int = 5000
+    # Fall back to a full pass when windows cover more of the runtime than this
+    targeted_max_coverage: float = 0.6
+    # Windows decoded per ffmpeg process
+    targeted_windows_per_run: int = 16
+    # Subtitle languages, most preferred first, as they appear in sidecar
+    # names (Movie.en.srt) and stream language tags
+    subtitle_languages: str = "en,eng"
+
+    # Analysis cache (defaults to <clip_storage_path>/.analysis). The pipeline
+    # always hands analyses between stages through it; disabling it only
+    # stops reuse of earlier results.
+    analysis_cache_enabled: bool = True
+    analysis_cache_path: str = ""
+    analysis_cache_max_mb: int = 2048
+
+    # Copy each source to local scratch (default: <tmp>/byetz-staging) before
+    # analysis and extraction, so every ffmpeg pass reads the local copy
+    # instead of the library mount. At most volume_concurrency copies per
+    # source volume run at once on a host. Point analysis and encode workers
+    # in separate containers at a shared volume so each source is copied once.
+    source_staging_enabled: bool = False
+    source_staging_path: str = ""
+    source_staging_max_mb: int = 200 * 1024
+    source_staging_volume_concurrency: int = 1
+
+    # Items in flight per source volume (storage device), shared by all
+    # workers; further items on a busy volume wait in Redis and start as
+    # slots free up, so workers spread across drives. 0 disables the cap.
+    volume_max_in_flight: int = 2
+    volume_slot_ttl_s: int = 3 * 60 * 60
+
+    # Imported quote database (python -m app.services.quote_store import ...),
+    # defaults to <clip_storage_path>/.quotes
+    quote_db_path: str = ""
+
+    # ffmpeg resource governor: the CPU budget (0 = all cores) is split between
+    # concurrently running ffmpeg processes, which share lease files in
+    # ffmpeg_governor_path (default: <tmp>/byetz-ffmpeg; point workers in
+    # separate containers at a shared volume)
+    ffmpeg_governor_enabled: bool = True
+    ffmpeg_cpu_budget: int = 0
+    ffmpeg_governor_path: str = ""
+    # Per-stage nice increment and I/O class (0 = unchanged, 2 = best-effort
+    # lowest level, 3 = idle); stages: analysis, encode, thumbnail
+    analysis_nice: int = 10
+    analysis_ionice_class: int = 2
+    encode_nice: int = 5
+    encode_ionice_class: int = 0
+    thumbnail_nice: int = 5
+    thumbnail_ionice_class: int = 0
+
+    # Worker processes per Celery queue (python -m app.tasks.worker <queue>)
+    analysis_concurrency: int = 1
+    encode_concurrency: int = 2
+    db_concurrency: int = 2
 
     # Recommendation
     exploration_rate: float = 0.20
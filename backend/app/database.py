@@ -1,3 +1,4 @@
+from sqlalchemy import text
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.orm import DeclarativeBase
 from app.config import get_settings
@@ -12,6 +13,29 @@ class Base(DeclarativeBase):
     pass
 
 
+# create_all only creates missing tables, so columns added to existing tables
+# are applied here. Every statement is idempotent and runs on each startup.
+SCHEMA_UPGRADES = (
+    "ALTER TABLE media_items ADD COLUMN IF NOT EXISTS library_id UUID",
+    "ALTER TABLE media_items ADD COLUMN IF NOT EXISTS priority INTEGER DEFAULT 0",
+    "ALTER TABLE media_items ADD COLUMN IF NOT EXISTS plex_added_at TIMESTAMP WITHOUT TIME ZONE",
+    "ALTER TABLE media_items ADD COLUMN IF NOT EXISTS processing_task_id VARCHAR",
+    "ALTER TABLE media_items ADD COLUMN IF NOT EXISTS processing_stage VARCHAR",
+    "ALTER TABLE media_items ADD COLUMN IF NOT EXISTS processing_progress FLOAT",
+    "CREATE INDEX IF NOT EXISTS ix_media_items_library_id ON media_items (library_id)",
+    "CREATE INDEX IF NOT EXISTS ix_media_items_priority ON media_items (priority)",
+    "ALTER TABLE plex_libraries ADD COLUMN IF NOT EXISTS added_watermark TIMESTAMP WITHOUT TIME ZONE",
+    "ALTER TABLE plex_libraries ADD COLUMN IF NOT EXISTS updated_watermark TIMESTAMP WITHOUT TIME ZONE",
+    "ALTER TABLE plex_libraries ADD COLUMN IF NOT EXISTS last_reconciled TIMESTAMP WITHOUT TIME ZONE",
+)
+
+
+def upgrade_schema(connection):
+    """Bring tables created by an older release up to the current models."""
+    for statement in SCHEMA_UPGRADES:
+        connection.execute(text(statement))
+
+
 async def get_db() -> AsyncSession:
     async with async_session() as session:
         try:
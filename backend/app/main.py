@@ -2,7 +2,8 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 from app.config import get_settings
-from app.database import engine, Base
+from app.database import engine, Base, upgrade_schema
+from app.services.http_client import close_http_client
 from app.models import user, clip, interaction  # noqa: F401 — ensure models are registered
 from app.routers import auth, feed, clips, interactions, profile, library
 from app.routers import settings as settings_router
@@ -13,7 +14,9 @@ from app.routers import taste_profile
 async def lifespan(app: FastAPI):
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(upgrade_schema)
     yield
+    await close_http_client()
 
 
 settings = get_settings()
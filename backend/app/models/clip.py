@@ -51,7 +51,17 @@ class MediaItem(Base):
     poster_url = Column(String, nullable=True)
     content_rating = Column(String, nullable=True)
     file_path = Column(String, nullable=True)
+    # PlexLibrary the item was listed in; scopes delete reconciliation
+    library_id = Column(UUID(as_uuid=True), nullable=True, index=True)
     processing_status = Column(String, default="pending")
+    # Processing urgency 0-9, higher first (see app.services.processing_queue)
+    priority = Column(Integer, default=0, index=True)
+    plex_added_at = Column(DateTime, nullable=True)
+    # Celery task currently working on the item; its state carries progress
+    processing_task_id = Column(String, nullable=True)
+    # Pipeline stage in flight and its completed fraction (extraction: clips persisted)
+    processing_stage = Column(String, nullable=True)
+    processing_progress = Column(Float, nullable=True)
     clips_generated = Column(Integer, default=0)
     last_processed = Column(DateTime, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
@@ -71,4 +81,9 @@ class PlexLibrary(Base):
     total_items = Column(Integer, default=0)
     processed_items = Column(Integer, default=0)
     last_scanned = Column(DateTime, nullable=True)
+    # Newest Plex addedAt/updatedAt seen; delta scans only list items past them
+    added_watermark = Column(DateTime, nullable=True)
+    updated_watermark = Column(DateTime, nullable=True)
+    # Last full listing, which also drops items deleted from Plex
+    last_reconciled = Column(DateTime, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
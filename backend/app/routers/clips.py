@@ -9,6 +9,7 @@ from app.database import get_db
 from app.models.clip import Clip
 from app.schemas.clip import ClipResponse
 from app.services.auth import get_current_user, AuthService
+from app.services.clip_engine import small_thumbnail_path
 
 router = APIRouter()
 
@@ -85,6 +86,7 @@ async def stream_clip(
 async def get_thumbnail(
     clip_id: UUID,
     token: Optional[str] = Query(None),
+    size: Optional[str] = Query(None, description="'small' for the feed-card variant"),
     db: AsyncSession = Depends(get_db),
 ):
     """Serve the thumbnail image for a clip."""
@@ -98,8 +100,10 @@ async def get_thumbnail(
     if not clip:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Clip not found")
 
-    # Find first existing thumbnail
+    # Find first existing thumbnail, preferring the downscaled variant when asked
     for thumb_path in (clip.thumbnail_paths or []):
+        if size == "small" and os.path.exists(small_thumbnail_path(thumb_path)):
+            return FileResponse(small_thumbnail_path(thumb_path), media_type="image/jpeg")
         if os.path.exists(thumb_path):
             return FileResponse(thumb_path, media_type="image/jpeg")
 
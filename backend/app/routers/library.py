@@ -4,8 +4,9 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from uuid import UUID
 import httpx
 from app.database import get_db
-from app.schemas.library import LibraryStatus, LibraryToggle
+from app.schemas.library import LibraryStatus, LibraryToggle, QueuedItem
 from app.services.auth import get_current_user
+from app.services.http_client import get_http_client
 from app.services.library import LibraryService
 
 router = APIRouter()
@@ -20,6 +21,17 @@ async def get_library_status(
     return await service.get_status(user_id)
 
 
+@router.get("/queue", response_model=list[QueuedItem])
+async def get_processing_queue(
+    limit: int = Query(100, ge=1, le=1000),
+    user_id: UUID = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """Pending clip processing work, highest priority first."""
+    service = LibraryService(db)
+    return await service.get_queue(limit)
+
+
 @router.post("/discover")
 async def discover_libraries(
     user_id: UUID = Depends(get_current_user),
@@ -44,11 +56,13 @@ async def process_libraries(
 
 @router.post("/rescan")
 async def trigger_rescan(
+    full: bool = Query(False),
     user_id: UUID = Depends(get_current_user),
     db: AsyncSession = Depends(get_db),
 ):
+    """Scan for items added or updated since the last scan (``full`` relists everything)."""
     service = LibraryService(db)
-    await service.trigger_rescan(user_id)
+    await service.trigger_rescan(user_id, full=full)
     return {"status": "rescan_queued"}
 
 
@@ -71,15 +85,14 @@ async def proxy_poster(
     if not url:
         raise HTTPException(status_code=400, detail="Missing url parameter")
     try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            resp = await client.get(url)
-            if resp.status_code != 200:
-                raise HTTPException(status_code=resp.status_code, detail="Plex returned error")
-            content_type = resp.headers.get("content-type", "image/jpeg")
-            return StreamingResponse(
-                iter([resp.content]),
-                media_type=content_type,
-                headers={"Cache-Control": "public, max-age=86400"},
-            )
+        resp = await get_http_client(url).get(url)
+        if resp.status_code != 200:
+            raise HTTPException(status_code=resp.status_code, detail="Plex returned error")
+        content_type = resp.headers.get("content-type", "image/jpeg")
+        return StreamingResponse(
+            iter([resp.content]),
+            media_type=content_type,
+            headers={"Cache-Control": "public, max-age=86400"},
+        )
     except httpx.RequestError:
         raise HTTPException(status_code=502, detail="Could not reach Plex server")
@@ -30,10 +30,36 @@ class LibraryDetail(BaseModel):
     last_scanned: Optional[datetime] = None
 
 
+class ItemProgress(BaseModel):
+    media_id: str
+    title: str
+    stage: Optional[str] = None
+    progress: Optional[float] = None
+
+
+class ThrottleStatus(BaseModel):
+    level: str
+    streams: int = 0
+    transcodes: int = 0
+    checked_at: Optional[datetime] = None
+
+
 class LibraryStatus(BaseModel):
     server_name: str
     server_reachable: bool
     libraries: list[LibraryDetail]
+    in_progress: list[ItemProgress] = []
+    throttle: Optional[ThrottleStatus] = None
+
+
+class QueuedItem(BaseModel):
+    media_id: str
+    title: str
+    media_type: str
+    processing_status: str
+    priority: int
+    clips_generated: int
+    added_at: Optional[datetime] = None
 
 
 class LibraryToggle(BaseModel):
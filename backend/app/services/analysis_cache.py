@@ -0,0 +1,285 @@
+import os
+import io
+import json
+import hashlib
+import logging
+from collections import Counter
+from dataclasses import dataclass
+from typing import Optional
+import numpy as np
+from app.config import get_settings
+from app.services.clip_engine import MediaAnalysis, SubtitleEntry, SceneChange, energy_array
+
+logger = logging.getLogger(__name__)
+
+settings = get_settings()
+
+# Bytes hashed from the head and tail of the file. Enough to catch a replaced
+# file with identical size/mtime without reading a multi-GB remux.
+FINGERPRINT_SAMPLE_BYTES = 1 << 20
+
+CACHE_FORMAT_VERSION = 2
+
+
+@dataclass(frozen=True)
+class MediaFingerprint:
+    path: str
+    size: int
+    mtime_ns: int
+    partial_hash: str
+
+    @property
+    def key(self) -> str:
+        raw = f"{self.path}\0{self.size}\0{self.mtime_ns}\0{self.partial_hash}"
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def fingerprint_file(path: str, sample_bytes: int = FINGERPRINT_SAMPLE_BYTES) -> MediaFingerprint:
+    st = os.stat(path)
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        digest.update(f.read(sample_bytes))
+        if st.st_size > sample_bytes:
+            f.seek(max(sample_bytes, st.st_size - sample_bytes))
+            digest.update(f.read(sample_bytes))
+    return MediaFingerprint(
+        path=path, size=st.st_size, mtime_ns=st.st_mtime_ns, partial_hash=digest.hexdigest(),
+    )
+
+
+def default_cache_dir() -> str:
+    return settings.analysis_cache_path or os.path.join(settings.clip_storage_path, ".analysis")
+
+
+class AnalysisCache:
+    """On-disk store of MediaAnalysis results, keyframe indexes and resolved
+    subtitles keyed by source file fingerprint.
+
+    Entries are compressed .npz archives of flat arrays (no pickling). Hits
+    touch the entry's mtime so garbage collection evicts least recently used
+    entries first once the directory exceeds its size budget."""
+
+    # Per-process counters, shared by every cache instance in the worker
+    stats: Counter = Counter()
+
+    def __init__(self, root: str = None, max_bytes: int = None):
+        self.root = root or default_cache_dir()
+        self.max_bytes = max_bytes if max_bytes is not None else settings.analysis_cache_max_mb * 1024 * 1024
+
+    def entry_path(self, fingerprint: MediaFingerprint, variant: str) -> str:
+        """Entry location for an analysis variant (see MediaAnalysis.cache_variant)."""
+        return os.path.join(self.root, f"{fingerprint.key}-{variant}.npz")
+
+    def get(self, fingerprint: MediaFingerprint, variant: str) -> Optional[MediaAnalysis]:
+        path = self.entry_path(fingerprint, variant)
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                analysis = self._decode(data)
+        except FileNotFoundError:
+            self.stats["misses"] += 1
+            return None
+        except (OSError, ValueError, KeyError) as exc:
+            logger.warning("Discarding unreadable analysis cache entry %s: %s", path, exc)
+            self._remove(path)
+            self.stats["misses"] += 1
+            return None
+
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        self.stats["hits"] += 1
+        return analysis
+
+    def put(self, fingerprint: MediaFingerprint, analysis: MediaAnalysis) -> Optional[str]:
+        if not analysis.complete:
+            return None
+        return self.stash(fingerprint, analysis)
+
+    def stash(self, fingerprint: MediaFingerprint, analysis: MediaAnalysis) -> Optional[str]:
+        """Write an analysis and return its path so pipeline stages can pass it by reference.
+
+        Incomplete analyses go to a separate entry that get() never returns,
+        so they are handed off but not reused by later runs."""
+        path = self.entry_path(fingerprint, analysis.cache_variant)
+        if not analysis.complete:
+            path = path.replace(".npz", ".partial.npz")
+        buf = io.BytesIO()
+        np.savez_compressed(buf, **self._encode(fingerprint, analysis))
+        return self._write(path, buf.getvalue())
+
+    def load(self, path: str) -> Optional[MediaAnalysis]:
+        """Load an entry by the path returned from stash()."""
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                analysis = self._decode(data)
+        except (OSError, ValueError, KeyError) as exc:
+            logger.warning("Could not load analysis %s: %s", path, exc)
+            return None
+        analysis.complete = not path.endswith(".partial.npz")
+        return analysis
+
+    def _keyframes_path(self, fingerprint: MediaFingerprint) -> str:
+        return os.path.join(self.root, f"{fingerprint.key}-keyframes.npy")
+
+    def get_keyframes(self, fingerprint: MediaFingerprint) -> Optional[list[int]]:
+        """Cached keyframe index; an empty list means the source cannot be stream-copied."""
+        path = self._keyframes_path(fingerprint)
+        try:
+            keyframes = np.load(path, allow_pickle=False).tolist()
+        except FileNotFoundError:
+            self.stats["keyframe_misses"] += 1
+            return None
+        except (OSError, ValueError) as exc:
+            logger.warning("Discarding unreadable keyframe index %s: %s", path, exc)
+            self._remove(path)
+            self.stats["keyframe_misses"] += 1
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        self.stats["keyframe_hits"] += 1
+        return keyframes
+
+    def put_keyframes(self, fingerprint: MediaFingerprint, keyframes: list[int]) -> Optional[str]:
+        path = self._keyframes_path(fingerprint)
+        buf = io.BytesIO()
+        np.save(buf, np.asarray(keyframes, dtype=np.int64))
+        return self._write(path, buf.getvalue())
+
+    def _subtitles_path(self, fingerprint: MediaFingerprint, source: str) -> str:
+        digest = hashlib.sha1(source.encode("utf-8")).hexdigest()[:16]
+        return os.path.join(self.root, f"{fingerprint.key}-subtitles-{digest}.npz")
+
+    def get_subtitles(self, fingerprint: MediaFingerprint, source: str) -> Optional[list[SubtitleEntry]]:
+        """Cached subtitles read from ``source`` (see subtitles.subtitle_source),
+        so a new or edited sidecar misses."""
+        path = self._subtitles_path(fingerprint, source)
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                subtitles = _decode_subtitles(data)
+        except FileNotFoundError:
+            self.stats["subtitle_misses"] += 1
+            return None
+        except (OSError, ValueError, KeyError) as exc:
+            logger.warning("Discarding unreadable subtitle cache entry %s: %s", path, exc)
+            self._remove(path)
+            self.stats["subtitle_misses"] += 1
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        self.stats["subtitle_hits"] += 1
+        return subtitles
+
+    def put_subtitles(
+        self, fingerprint: MediaFingerprint, source: str, subtitles: list[SubtitleEntry],
+    ) -> Optional[str]:
+        buf = io.BytesIO()
+        np.savez_compressed(buf, **_encode_subtitles(subtitles))
+        return self._write(self._subtitles_path(fingerprint, source), buf.getvalue())
+
+    def _write(self, path: str, payload: bytes) -> Optional[str]:
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(self.root, exist_ok=True)
+            with open(tmp_path, "wb") as f:
+                f.write(payload)
+            os.replace(tmp_path, path)
+        except OSError as exc:
+            # The cache is an optimization; never fail processing over it
+            logger.warning("Could not write analysis cache entry %s: %s", path, exc)
+            self._remove(tmp_path)
+            return None
+        self.stats["writes"] += 1
+        self.gc()
+        return path
+
+    def gc(self) -> int:
+        """Evict least recently used entries until the cache fits its budget."""
+        try:
+            entries = [e for e in os.scandir(self.root) if e.is_file()]
+        except FileNotFoundError:
+            return 0
+
+        files = [(e.stat().st_mtime, e.stat().st_size, e.path) for e in entries]
+        total = sum(size for _, size, _ in files)
+        evicted = 0
+        for _, size, path in sorted(files):
+            if total <= self.max_bytes:
+                break
+            self._remove(path)
+            total -= size
+            evicted += 1
+        if evicted:
+            self.stats["evictions"] += evicted
+            logger.info("Analysis cache GC evicted %d entries (%d bytes remain)", evicted, total)
+        return evicted
+
+    def _remove(self, path: str):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def _encode(self, fingerprint: MediaFingerprint, analysis: MediaAnalysis) -> dict:
+        meta = {
+            "version": CACHE_FORMAT_VERSION,
+            "path": fingerprint.path,
+            "scene_profile": analysis.scene_profile,
+            "wall_time_s": analysis.wall_time_s,
+            "audio_hop_ms": analysis.audio_hop_ms,
+        }
+        return {
+            "meta": np.array(json.dumps(meta)),
+            **_encode_subtitles(analysis.subtitles),
+            "scene_ts": np.array([sc.timestamp_ms for sc in analysis.scene_changes], dtype=np.int64),
+            "scene_score": np.array([sc.score for sc in analysis.scene_changes], dtype=np.float64),
+            "audio_rms": np.frombuffer(analysis.audio_energy, dtype=np.float32),
+            "windows": np.array(analysis.windows, dtype=np.int64).reshape(-1, 2),
+        }
+
+    def _decode(self, data) -> MediaAnalysis:
+        meta = json.loads(str(data["meta"]))
+        if meta.get("version") != CACHE_FORMAT_VERSION:
+            raise ValueError(f"unsupported cache format version {meta.get('version')}")
+
+        subtitles = _decode_subtitles(data)
+        scene_changes = [
+            SceneChange(timestamp_ms=ts, score=score)
+            for ts, score in zip(data["scene_ts"].tolist(), data["scene_score"].tolist())
+        ]
+        windows = []
+        if "windows" in data.files:
+            windows = [(start, end) for start, end in data["windows"].tolist()]
+        return MediaAnalysis(
+            subtitles=subtitles, scene_changes=scene_changes,
+            audio_energy=energy_array(data["audio_rms"]), audio_hop_ms=meta["audio_hop_ms"],
+            scene_profile=meta["scene_profile"], wall_time_s=meta.get("wall_time_s", 0.0),
+            windows=windows,
+        )
+
+
+def _encode_subtitles(subtitles: list[SubtitleEntry]) -> dict:
+    texts = [s.text.encode("utf-8") for s in subtitles]
+    return {
+        "sub_index": np.array([s.index for s in subtitles], dtype=np.int64),
+        "sub_start": np.array([s.start_ms for s in subtitles], dtype=np.int64),
+        "sub_end": np.array([s.end_ms for s in subtitles], dtype=np.int64),
+        "sub_text_offsets": np.cumsum([0] + [len(t) for t in texts], dtype=np.int64),
+        "sub_text": np.frombuffer(b"".join(texts), dtype=np.uint8),
+    }
+
+
+def _decode_subtitles(data) -> list[SubtitleEntry]:
+    blob = data["sub_text"].tobytes()
+    offsets = data["sub_text_offsets"].tolist()
+    return [
+        SubtitleEntry(index=idx, start_ms=start, end_ms=end,
+                      text=blob[offsets[i]:offsets[i + 1]].decode("utf-8"))
+        for i, (idx, start, end) in enumerate(zip(
+            data["sub_index"].tolist(), data["sub_start"].tolist(), data["sub_end"].tolist(),
+        ))
+    ]
@@ -2,19 +2,52 @@ import os
 import subprocess
 import json
 import re
-from dataclasses import dataclass
+import logging
+import math
+import time
+import tempfile
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass, field, replace
+from typing import Callable, Optional
+import numpy as np
 from app.config import get_settings
 from app.services.scoring import ClipScoringService, ClipCandidate
+from app.services.quote_matcher import QuoteMatcher, get_quote_matcher
+from app.services.resource_governor import FfmpegLease, ResourceGovernor, get_governor
+from app.services.subtitles import (
+    SubtitleEntry, find_sidecar, language_rank, parse_srt, preferred_languages, read_srt,
+)
+
+logger = logging.getLogger(__name__)
 
 settings = get_settings()
 
+# Subtitle codecs ffmpeg can transcode to SRT. Bitmap subtitles (PGS, VobSub)
+# would make the whole combined analysis run fail, so they are never mapped.
+TEXT_SUBTITLE_CODECS = {"subrip", "srt", "ass", "ssa", "mov_text", "webvtt", "text"}
 
-@dataclass
-class SubtitleEntry:
-    index: int
-    start_ms: int
-    end_ms: int
-    text: str
+SCENE_PROFILES = ("full", "reduced", "keyframe")
+
+# Video the feed can play as-is when stream-copied into an MP4
+STREAM_COPY_CODECS = {"h264"}
+STREAM_COPY_PROFILES = {"Constrained Baseline", "Baseline", "Main", "High"}
+STREAM_COPY_PIX_FMTS = {"yuv420p", "yuvj420p"}
+
+# Analysis modes: "full" decodes the whole runtime, "targeted" only the
+# windows around subtitle lines that can become candidates
+ANALYSIS_MODES = ("full", "targeted")
+
+# Context kept around a subtitle line when it becomes a clip candidate
+SUBTITLE_CONTEXT_MS = 2000
+
+# Audio energy is measured on mono float PCM at this rate, one RMS level
+# (dBFS) per hop. Hops outside the analyzed windows hold -inf.
+AUDIO_SAMPLE_RATE = 8000
+AUDIO_HOP_MS = 50
+AUDIO_SILENCE_DB = -100.0
+PCM_CHUNK_BYTES = 64 * 1024
 
 
 @dataclass
@@ -23,124 +56,666 @@ class SceneChange:
     score: float
 
 
+def _sparse_max_table(values) -> list[np.ndarray]:
+    """Sparse table for O(1) range-max queries: level k holds max(values[i:i + 2**k])."""
+    if len(values) == 0:
+        return []
+    table = [np.asarray(values, dtype=np.float64)]
+    span = 1
+    while span * 2 <= len(values):
+        prev = table[-1]
+        table.append(np.maximum(prev[:-span], prev[span:]))
+        span *= 2
+    return table
+
+
+def _range_max(table: list[np.ndarray], lo: int, hi: int) -> float:
+    """Max of values[lo:hi] (hi exclusive, non-empty)."""
+    k = (hi - lo).bit_length() - 1
+    return float(max(table[k][lo], table[k][hi - (1 << k)]))
+
+
+def energy_array(levels) -> array:
+    """Pack RMS levels into the compact float32 timeline MediaAnalysis holds."""
+    packed = array("f")
+    packed.frombytes(np.asarray(levels, dtype="<f4").tobytes())
+    return packed
+
+
+def _clip_audio_filter(duration_sec: float) -> str:
+    return (
+        f"afade=t=in:st=0:d=0.5,afade=t=out:st={duration_sec - 1.0}:d=1.0,"
+        f"loudnorm=I=-16:TP=-1.5:LRA=11"
+    )
+
+
+def _thumbnail_offsets_ms(candidate: ClipCandidate) -> list[int]:
+    """Clip-relative thumbnail positions: first frame, midpoint, one second before the end."""
+    duration = candidate.end_ms - candidate.start_ms
+    return [0, duration // 2, max(0, duration - 1000)]
+
+
+def small_thumbnail_path(thumbnail_path: str) -> str:
+    root, ext = os.path.splitext(thumbnail_path)
+    return f"{root}_small{ext}"
+
+
+def _thumbnail_select(offsets_sec: list[float]) -> str:
+    """select expression picking the first frame at or after each offset."""
+    terms = ["eq(n,0)" if t <= 0 else f"gte(t,{t})*lt(prev_t,{t})" for t in offsets_sec]
+    return "select='" + "+".join(terms) + "'"
+
+
+def _snap_to_keyframes(candidate: ClipCandidate, keyframes: list[int]) -> Optional[ClipCandidate]:
+    """Move a candidate onto keyframe boundaries for a stream-copy cut.
+
+    The start snaps to the last keyframe at or before it (so dialogue is
+    never cut off) and the end to the nearest keyframe. Returns None when no
+    keyframe is close enough to the start."""
+    max_shift = settings.smart_cut_max_shift_ms
+    i = bisect_right(keyframes, candidate.start_ms) - 1
+    if i < 0 or candidate.start_ms - keyframes[i] > max_shift:
+        return None
+    start = keyframes[i]
+
+    end = candidate.end_ms
+    j = bisect_left(keyframes, end)
+    nearby = [k for k in keyframes[max(0, j - 1):j + 1] if k > start and abs(k - end) <= max_shift]
+    if nearby:
+        end = min(nearby, key=lambda k: abs(k - end))
+    end = max(min(end, start + settings.max_clip_duration_ms), start + settings.min_clip_duration_ms)
+    return replace(candidate, start_ms=start, end_ms=end, duration_ms=end - start)
+
+
+@dataclass
+class ExtractedClip:
+    candidate: ClipCandidate
+    output_path: str
+    success: bool
+    thumbnail_paths: list[str] = field(default_factory=list)
+    stream_copied: bool = False
+
+
+_PTS_TIME_RE = re.compile(r"pts_time:(\d+\.?\d*)")
+
+
+class _AnalysisLogParser:
+    """Incremental parser for the scene detection stderr stream."""
+
+    def __init__(self, scene_threshold: float):
+        self.scene_threshold = scene_threshold
+        self.scenes: list[SceneChange] = []
+        # Furthest timestamp seen, for progress reporting
+        self.position_s = 0.0
+
+    def feed(self, line: str):
+        if "Parsed_showinfo" in line:
+            time_match = _PTS_TIME_RE.search(line)
+            if time_match:
+                ts = float(time_match.group(1))
+                self.position_s = max(self.position_s, ts)
+                self.scenes.append(SceneChange(timestamp_ms=int(ts * 1000), score=self.scene_threshold))
+
+
+class _EnergyWindows:
+    """RMS level per fixed hop of a mono float32 PCM stream, fed in chunks.
+
+    Only a partial hop is carried between chunks; each chunk's whole hops
+    are reduced with one vectorized pass, so memory stays at one float per
+    hop however long the decode runs."""
+
+    def __init__(self, sample_rate: int = AUDIO_SAMPLE_RATE, hop_ms: int = AUDIO_HOP_MS):
+        self.sample_rate = sample_rate
+        self.hop = sample_rate * hop_ms // 1000
+        self.bytes_read = 0
+        self._pending = b""
+        self._levels: list[np.ndarray] = []
+
+    @property
+    def position_s(self) -> float:
+        return self.bytes_read / 4 / self.sample_rate
+
+    def feed(self, chunk: bytes):
+        self.bytes_read += len(chunk)
+        data = self._pending + chunk
+        usable = len(data) - len(data) % (self.hop * 4)
+        self._pending = data[usable:]
+        if usable:
+            frames = np.frombuffer(data, dtype="<f4", count=usable // 4).reshape(-1, self.hop)
+            self._levels.append(self._rms_db(frames))
+
+    def finish(self) -> np.ndarray:
+        """Levels for every hop fed so far, including a trailing partial hop."""
+        tail = len(self._pending) // 4
+        if tail:
+            frames = np.frombuffer(self._pending, dtype="<f4", count=tail).reshape(1, -1)
+            self._levels.append(self._rms_db(frames))
+            self._pending = b""
+        if not self._levels:
+            return np.empty(0, dtype=np.float32)
+        return np.concatenate(self._levels)
+
+    @staticmethod
+    def _rms_db(frames: np.ndarray) -> np.ndarray:
+        rms = np.sqrt(np.mean(np.square(frames, dtype=np.float64), axis=1))
+        floor = 10 ** (AUDIO_SILENCE_DB / 20)
+        return (20 * np.log10(np.maximum(rms, floor))).astype(np.float32)
+
+
+class _ProgressReporter:
+    """Throttles progress callbacks to one per percent and per second."""
+
+    def __init__(self, callback: Optional[Callable[[float], None]], duration_ms: Optional[int]):
+        self.callback = callback if duration_ms else None
+        self.duration_s = (duration_ms or 0) / 1000.0
+        self.last_fraction = 0.0
+        self.last_report = 0.0
+
+    def update(self, position_s: float):
+        if not self.callback:
+            return
+        fraction = min(1.0, position_s / self.duration_s)
+        now = time.monotonic()
+        if fraction - self.last_fraction >= 0.01 and now - self.last_report >= 1.0:
+            self.last_fraction = fraction
+            self.last_report = now
+            self.callback(fraction)
+
+
+@dataclass
+class MediaAnalysis:
+    subtitles: list[SubtitleEntry] = field(default_factory=list)
+    scene_changes: list[SceneChange] = field(default_factory=list)
+    # RMS dBFS per AUDIO_HOP_MS hop from the start of the file (see energy_array)
+    audio_energy: array = field(default_factory=lambda: array("f"))
+    audio_hop_ms: int = AUDIO_HOP_MS
+    scene_profile: str = "full"
+    wall_time_s: float = 0.0
+    # False when a pass failed or timed out, so partial results are not cached
+    complete: bool = True
+    # (start_ms, end_ms) ranges scene/audio analysis covered; empty means the whole runtime
+    windows: list[tuple[int, int]] = field(default_factory=list)
+
+    @property
+    def cache_variant(self) -> str:
+        return f"{self.scene_profile}-targeted" if self.windows else self.scene_profile
+
+
+def _candidate_windows(
+    subtitles: list[SubtitleEntry], duration_ms: int, padding_ms: int, merge_gap_ms: int,
+) -> list[tuple[int, int]]:
+    """Merged time ranges that can contain a candidate built from ``subtitles``.
+
+    Each line is widened by the candidate context plus ``padding_ms`` so the
+    scene cuts near a candidate's edges are analyzed; cuts further out are
+    never found, and candidates only snap to cuts from their own window (see
+    ClipEngine.identify_clip_candidates). Windows closer than
+    ``merge_gap_ms`` are joined since seeking costs more than decoding a
+    short gap."""
+    reach = SUBTITLE_CONTEXT_MS + padding_ms
+    windows: list[list[int]] = []
+    for sub in sorted(subtitles, key=lambda s: s.start_ms):
+        start = max(0, sub.start_ms - reach)
+        end = min(duration_ms, sub.end_ms + reach)
+        if end <= start:
+            continue
+        if windows and start - windows[-1][1] <= merge_gap_ms:
+            windows[-1][1] = max(windows[-1][1], end)
+        else:
+            windows.append([start, end])
+    return [(start, end) for start, end in windows]
+
+
+def _with_threads(cmd: list[str], lease: FfmpegLease, encoders: bool = False) -> list[str]:
+    """Apply a governor lease's thread allocation to an ffmpeg command.
+
+    Filter graph and decoder threads go in front of the inputs; with
+    ``encoders``, encoder threads are also set on every output (ahead of
+    its ``-movflags``). A batched command decodes every input and encodes
+    every output at once, so the lease's threads are split between the
+    inputs and between the outputs (at least one each) rather than given
+    to each of them."""
+    if not lease.threads:
+        return cmd
+    inputs = cmd.count("-i")
+    outputs = cmd.count("-movflags") if encoders else 0
+    input_args = ["-threads", str(max(1, lease.threads // max(1, inputs)))]
+    output_args = ["-threads", str(max(1, lease.threads // max(1, outputs)))]
+    out = [cmd[0], *lease.global_args]
+    for arg in cmd[1:]:
+        if arg == "-i":
+            out += input_args
+        if encoders and arg == "-movflags":
+            out += output_args
+        out.append(arg)
+    return out
+
+
 class ClipEngine:
-    def __init__(self):
+    def __init__(self, governor: ResourceGovernor = None):
         self.scoring = ClipScoringService()
+        self.governor = governor or get_governor()
 
-    def extract_subtitles(self, media_path: str) -> list[SubtitleEntry]:
+    def _probe_streams(self, media_path: str) -> list[dict]:
+        result = subprocess.run(
+            ["ffprobe", "-v", "quiet", "-print_format", "json",
+             "-show_entries", "stream=index,codec_type,codec_name:stream_tags=language:stream_disposition=forced",
+             media_path],
+            capture_output=True, text=True, timeout=30,
+        )
+        return json.loads(result.stdout).get("streams", [])
+
+    def _subtitle_stream(self, streams: list[dict]) -> Optional[dict]:
+        """Text subtitle stream to read: preferred language first, forced tracks last."""
+        languages = preferred_languages()
+        text_streams = [
+            s for s in streams
+            if s.get("codec_type") == "subtitle" and s.get("codec_name") in TEXT_SUBTITLE_CODECS
+        ]
+        return min(
+            text_streams,
+            key=lambda s: (
+                bool(s.get("disposition", {}).get("forced")),
+                language_rank(s.get("tags", {}).get("language"), languages),
+            ),
+            default=None,
+        )
+
+    def _read_sidecar(self, path: str) -> Optional[list[SubtitleEntry]]:
         try:
-            result = subprocess.run(
-                ["ffprobe", "-v", "quiet", "-print_format", "json",
-                 "-show_entries", "stream=index,codec_type,codec_name", media_path],
-                capture_output=True, text=True, timeout=30,
-            )
-            streams = json.loads(result.stdout).get("streams", [])
-            sub_stream = next((s for s in streams if s.get("codec_type") == "subtitle"), None)
-            if not sub_stream:
-                return []
+            entries = read_srt(path)
+        except OSError as exc:
+            logger.warning("Could not read subtitle sidecar %s: %s", path, exc)
+            return None
+        logger.info("Using subtitle sidecar %s (%d lines)", path, len(entries))
+        return entries
 
-            sub_index = sub_stream["index"]
-            result = subprocess.run(
-                ["ffmpeg", "-i", media_path, "-map", f"0:{sub_index}", "-f", "srt", "-"],
-                capture_output=True, text=True, timeout=120,
-            )
-            return self._parse_srt(result.stdout)
+    def _scene_filter(self, profile: str, threshold: float) -> tuple[list[str], str]:
+        """Input options and video filter chain for a scene detection profile."""
+        select = f"select='gt(scene,{threshold})',showinfo"
+        scale = f"scale={settings.scene_reduced_width}:-2"
+        if profile == "full":
+            return [], select
+        if profile == "reduced":
+            return [], f"fps={settings.scene_reduced_fps},{scale},{select}"
+        if profile == "keyframe":
+            return ["-skip_frame:v", "nokey"], f"{scale},{select}"
+        raise ValueError(f"Unknown scene analysis profile: {profile!r} (expected one of {SCENE_PROFILES})")
+
+    def analyze_media(
+        self, media_path: str, subtitles: bool = True, scenes: bool = True,
+        audio: bool = True, scene_threshold: float = 0.3, scene_profile: str = None,
+        duration_ms: int = None, progress: Callable[[float], None] = None,
+        subtitle_entries: list[SubtitleEntry] = None,
+    ) -> MediaAnalysis:
+        """Run subtitle, scene and audio analysis in a single ffmpeg pass.
+
+        The source is demuxed and decoded once. Scene detection writes
+        showinfo lines to stderr, which are parsed line by line as ffmpeg
+        runs; the audio track is downmixed to low-rate mono PCM on stdout and
+        reduced to RMS levels per hop as it arrives; the subtitle stream is
+        converted to an SRT temp file, unless a matching sidecar exists or
+        ``subtitle_entries`` are passed in. ``scene_profile`` trades scene
+        boundary precision for decode speed (see SCENE_PROFILES). With
+        ``duration_ms``, ``progress`` is called with the decoded fraction of
+        the runtime."""
+        scene_profile = scene_profile or settings.scene_analysis_profile
+        input_opts, scene_chain = self._scene_filter(scene_profile, scene_threshold)
+        started = time.monotonic()
+        if subtitles and subtitle_entries is None:
+            sidecar = find_sidecar(media_path)
+            if sidecar:
+                subtitle_entries = self._read_sidecar(sidecar)
+            if subtitle_entries is not None and not (scenes or audio):
+                return MediaAnalysis(subtitles=subtitle_entries)
+        try:
+            streams = self._probe_streams(media_path)
         except (subprocess.TimeoutExpired, FileNotFoundError, json.JSONDecodeError):
-            return []
+            return MediaAnalysis(subtitles=subtitle_entries or [], complete=False)
 
-    def _parse_srt(self, srt_text: str) -> list[SubtitleEntry]:
-        entries = []
-        blocks = re.split(r"\n\n+", srt_text.strip())
-        for block in blocks:
-            lines = block.strip().split("\n")
-            if len(lines) < 3:
-                continue
-            try:
-                index = int(lines[0])
-                time_match = re.match(
-                    r"(\d{2}):(\d{2}):(\d{2}),(\d{3})\s*-->\s*(\d{2}):(\d{2}):(\d{2}),(\d{3})",
-                    lines[1],
-                )
-                if not time_match:
-                    continue
-                g = time_match.groups()
-                start_ms = (int(g[0]) * 3600 + int(g[1]) * 60 + int(g[2])) * 1000 + int(g[3])
-                end_ms = (int(g[4]) * 3600 + int(g[5]) * 60 + int(g[6])) * 1000 + int(g[7])
-                text = " ".join(lines[2:]).strip()
-                text = re.sub(r"<[^>]+>", "", text)
-                entries.append(SubtitleEntry(index=index, start_ms=start_ms, end_ms=end_ms, text=text))
-            except (ValueError, IndexError):
-                continue
-        return entries
+        sub_stream = None
+        if subtitles and subtitle_entries is None:
+            sub_stream = self._subtitle_stream(streams)
+        has_video = scenes and any(s.get("codec_type") == "video" for s in streams)
+        has_audio = audio and any(s.get("codec_type") == "audio" for s in streams)
+        if not (sub_stream or has_video or has_audio):
+            return MediaAnalysis(subtitles=subtitle_entries or [])
 
-    def detect_scene_changes(self, media_path: str, threshold: float = 0.3) -> list[SceneChange]:
+        cmd = ["ffmpeg", "-nostdin", "-nostats", "-y"]
+        # Keep unused tracks out of the demuxer entirely; a subtitle-only run
+        # then just reads packets without decoding anything
+        cmd += input_opts if has_video else ["-vn"]
+        if not has_audio:
+            cmd += ["-an"]
+        cmd += ["-i", media_path]
+        if has_video:
+            cmd += ["-filter_complex", f"[0:v:0]{scene_chain}[scenes]",
+                    "-map", "[scenes]", "-f", "null", "-"]
+        if has_audio:
+            cmd += ["-map", "0:a:0", *self._pcm_output_args()]
+        srt_path = None
+        if sub_stream:
+            fd, srt_path = tempfile.mkstemp(suffix=".srt")
+            os.close(fd)
+            cmd += ["-map", f"0:{sub_stream['index']}", "-f", "srt", srt_path]
+
+        parser = _AnalysisLogParser(scene_threshold)
+        energy = _EnergyWindows()
+        reporter = _ProgressReporter(progress, duration_ms)
+        decodes = has_video or has_audio
         try:
-            result = subprocess.run(
-                ["ffmpeg", "-i", media_path,
-                 "-filter:v", f"select='gt(scene,{threshold})',showinfo",
-                 "-f", "null", "-"],
-                capture_output=True, text=True, timeout=600,
+            def on_line(line: str):
+                parser.feed(line)
+                if not has_audio:
+                    reporter.update(parser.position_s)
+
+            def on_pcm(chunk: bytes):
+                energy.feed(chunk)
+                reporter.update(energy.position_s)
+
+            with self.governor.lease("analysis") as lease:
+                returncode = self._run_streaming(
+                    _with_threads(cmd, lease), 600 if decodes else 120, on_line,
+                    preexec_fn=lease.preexec_fn, on_pcm=on_pcm if has_audio else None,
+                )
+            if sub_stream:
+                subtitle_entries = read_srt(srt_path)
+        except subprocess.TimeoutExpired:
+            if not decodes:
+                return MediaAnalysis(complete=False)
+            logger.warning("Combined analysis timed out for %s", media_path)
+            # Fall back to a cheap subtitle-only pass so candidates can still be found
+            if sub_stream:
+                subtitle_entries = self.extract_subtitles(media_path)
+            return MediaAnalysis(subtitles=subtitle_entries or [], complete=False)
+        except (FileNotFoundError, OSError):
+            return MediaAnalysis(subtitles=subtitle_entries or [], complete=False)
+        finally:
+            if srt_path and os.path.exists(srt_path):
+                os.remove(srt_path)
+
+        wall_time = time.monotonic() - started
+        if returncode != 0:
+            # Whatever was decoded before the error is handed on, but never reused
+            logger.warning("Combined analysis of %s exited with status %d", media_path, returncode)
+        logger.info(
+            "Analyzed %s in %.1fs (scene profile: %s, %.1f MB of PCM)",
+            media_path, wall_time, scene_profile if has_video else "off", energy.bytes_read / 1e6,
+        )
+        return MediaAnalysis(
+            subtitles=subtitle_entries or [],
+            scene_changes=parser.scenes,
+            audio_energy=energy_array(energy.finish()),
+            scene_profile=scene_profile,
+            wall_time_s=round(wall_time, 3),
+            complete=returncode == 0,
+        )
+
+    @staticmethod
+    def _pcm_output_args() -> list[str]:
+        """Output options writing the mapped audio as mono float PCM to stdout."""
+        return ["-ac", "1", "-ar", str(AUDIO_SAMPLE_RATE),
+                "-c:a", "pcm_f32le", "-f", "f32le", "pipe:1"]
+
+    def analyze_media_targeted(
+        self, media_path: str, duration_ms: int, scene_threshold: float = 0.3,
+        scene_profile: str = None, progress: Callable[[float], None] = None,
+        subtitle_entries: list[SubtitleEntry] = None,
+    ) -> MediaAnalysis:
+        """Analyze scenes and audio only around dialogue that can become a candidate.
+
+        Subtitles are resolved first (``subtitle_entries``, a sidecar, or a
+        demux-only read of the text stream), merged into candidate windows,
+        and each window is decoded through an input-seeked ffmpeg input.
+        Titles without text subtitles, or whose windows cover most of the
+        runtime anyway, get the regular full pass."""
+        scene_profile = scene_profile or settings.scene_analysis_profile
+        input_opts, scene_chain = self._scene_filter(scene_profile, scene_threshold)
+        started = time.monotonic()
+
+        def full_scan() -> MediaAnalysis:
+            return self.analyze_media(
+                media_path, scene_threshold=scene_threshold, scene_profile=scene_profile,
+                duration_ms=duration_ms, progress=progress, subtitle_entries=subtitle_entries,
             )
-            scenes = []
-            for line in result.stderr.split("\n"):
-                if "showinfo" in line and "pts_time:" in line:
-                    time_match = re.search(r"pts_time:(\d+\.?\d*)", line)
-                    if time_match:
-                        ts_ms = int(float(time_match.group(1)) * 1000)
-                        scenes.append(SceneChange(timestamp_ms=ts_ms, score=threshold))
-            return scenes
-        except (subprocess.TimeoutExpired, FileNotFoundError):
-            return []
 
-    def analyze_audio_energy(self, media_path: str) -> list[dict]:
+        if not duration_ms:
+            return full_scan()
+        if subtitle_entries is None:
+            subtitle_entries = self.resolve_subtitles(media_path)
+        if not subtitle_entries:
+            return full_scan()
+        subtitles = MediaAnalysis(subtitles=subtitle_entries)
+        windows = _candidate_windows(
+            subtitles.subtitles, duration_ms,
+            settings.targeted_window_padding_ms, settings.targeted_merge_gap_ms,
+        )
+        covered_ms = sum(end - start for start, end in windows)
+        if covered_ms > settings.targeted_max_coverage * duration_ms:
+            return full_scan()
+
         try:
-            result = subprocess.run(
-                ["ffmpeg", "-i", media_path,
-                 "-af", "astats=metadata=1:reset=1,ametadata=print:key=lavfi.astats.Overall.RMS_level",
-                 "-f", "null", "-"],
-                capture_output=True, text=True, timeout=600,
-            )
-            energy_data = []
-            current_time = 0.0
-            for line in result.stderr.split("\n"):
-                time_match = re.search(r"pts_time:(\d+\.?\d*)", line)
-                if time_match:
-                    current_time = float(time_match.group(1))
-                rms_match = re.search(r"RMS_level=(-?\d+\.?\d*)", line)
-                if rms_match:
-                    rms = float(rms_match.group(1))
-                    energy_data.append({"time_ms": int(current_time * 1000), "rms_db": rms})
-            return energy_data
-        except (subprocess.TimeoutExpired, FileNotFoundError):
-            return []
+            streams = self._probe_streams(media_path)
+        except (subprocess.TimeoutExpired, FileNotFoundError, json.JSONDecodeError):
+            return replace(subtitles, complete=False)
+        has_video = any(s.get("codec_type") == "video" for s in streams)
+        has_audio = any(s.get("codec_type") == "audio" for s in streams)
+
+        # Whole hops per window, so each window's PCM maps onto a slice of the timeline
+        hop = AUDIO_HOP_MS
+        windows = [(start - start % hop, -(-end // hop) * hop) for start, end in windows]
+        parser = _AnalysisLogParser(scene_threshold)
+        levels = np.full(-(-duration_ms // hop), -np.inf, dtype=np.float32)
+        if has_video or has_audio:
+            per_run = max(1, settings.targeted_windows_per_run)
+            done_ms = 0
+            for i in range(0, len(windows), per_run):
+                batch = windows[i:i + per_run]
+                cmd = self._window_analysis_command(
+                    media_path, batch, input_opts if has_video else [],
+                    scene_chain if has_video else None, has_audio,
+                )
+                energy = _EnergyWindows()
+                try:
+                    with self.governor.lease("analysis") as lease:
+                        returncode = self._run_streaming(
+                            _with_threads(cmd, lease), 600, parser.feed, preexec_fn=lease.preexec_fn,
+                            on_pcm=energy.feed if has_audio else None,
+                        )
+                except subprocess.TimeoutExpired:
+                    logger.warning("Targeted analysis timed out for %s", media_path)
+                    return replace(subtitles, complete=False)
+                except OSError:
+                    return replace(subtitles, complete=False)
+                if returncode != 0:
+                    logger.warning("Targeted analysis of %s exited with status %d", media_path, returncode)
+                    return replace(subtitles, complete=False)
+                # The concatenated PCM holds exactly (end - start) / hop hops per window
+                batch_levels = energy.finish()
+                offset = 0
+                for start, end in batch:
+                    n = (end - start) // hop
+                    chunk = batch_levels[offset:offset + n]
+                    first = start // hop
+                    chunk = chunk[:max(0, len(levels) - first)]
+                    levels[first:first + len(chunk)] = chunk
+                    offset += n
+                done_ms += sum(end - start for start, end in batch)
+                if progress:
+                    progress(min(1.0, done_ms / covered_ms))
+
+        wall_time = time.monotonic() - started
+        logger.info(
+            "Analyzed %s in %.1fs (targeted: %d windows, %.0f%% of runtime, scene profile: %s)",
+            media_path, wall_time, len(windows), 100.0 * covered_ms / duration_ms, scene_profile,
+        )
+        return MediaAnalysis(
+            subtitles=subtitles.subtitles,
+            scene_changes=sorted(parser.scenes, key=lambda sc: sc.timestamp_ms),
+            audio_energy=energy_array(levels if has_audio else []),
+            scene_profile=scene_profile,
+            wall_time_s=round(wall_time, 3),
+            windows=windows,
+        )
+
+    def _window_analysis_command(
+        self, media_path: str, windows: list[tuple[int, int]], input_opts: list[str],
+        scene_chain: Optional[str], has_audio: bool,
+    ) -> list[str]:
+        """One ffmpeg run decoding each window as its own fast-seeked input.
+
+        ``-copyts`` keeps source timestamps, so the pts_time values in the log
+        are absolute and parse exactly like a full pass. Each window's audio is
+        padded or trimmed to exactly its length and the windows are
+        concatenated into one PCM stream on stdout."""
+        cmd = ["ffmpeg", "-nostdin", "-nostats", "-y", "-copyts"]
+        for start, end in windows:
+            cmd += (input_opts if scene_chain else ["-vn"]) + [
+                "-ss", f"{start / 1000.0:.3f}", "-t", f"{(end - start) / 1000.0:.3f}", "-i", media_path,
+            ]
+        graph, outputs = [], []
+        for n, (start, end) in enumerate(windows):
+            if scene_chain:
+                graph.append(f"[{n}:v:0]{scene_chain}[scenes{n}]")
+                outputs.append(f"[scenes{n}]")
+            if has_audio:
+                length = f"{(end - start) / 1000.0:.3f}"
+                graph.append(
+                    f"[{n}:a:0]aformat=sample_fmts=flt:sample_rates={AUDIO_SAMPLE_RATE}:channel_layouts=mono,"
+                    f"apad=whole_dur={length},atrim=duration={length}[pcm{n}]"
+                )
+        if has_audio:
+            graph.append("".join(f"[pcm{n}]" for n in range(len(windows)))
+                         + f"concat=n={len(windows)}:v=0:a=1[pcm]")
+        cmd += ["-filter_complex", ";".join(graph)]
+        if outputs:
+            for label in outputs:
+                cmd += ["-map", label]
+            cmd += ["-f", "null", "-"]
+        if has_audio:
+            cmd += ["-map", "[pcm]", *self._pcm_output_args()]
+        return cmd
+
+    def _run_streaming(
+        self, cmd: list[str], timeout: float, on_line: Callable[[str], None],
+        preexec_fn: Callable[[], None] = None, on_pcm: Callable[[bytes], None] = None,
+    ) -> int:
+        """Run ffmpeg and hand each stderr line to ``on_line`` as it is produced.
+
+        With ``on_pcm``, stdout is read in PCM_CHUNK_BYTES chunks and passed
+        along while a helper thread drains stderr, so neither pipe can fill
+        up and stall ffmpeg. Nothing is buffered beyond the current line or
+        chunk, so memory stays flat no matter how long the decode runs.
+        Raises TimeoutExpired after ``timeout`` seconds."""
+        proc = subprocess.Popen(
+            cmd, stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE if on_pcm else subprocess.DEVNULL, stderr=subprocess.PIPE,
+            preexec_fn=preexec_fn,
+        )
+        timed_out = threading.Event()
+
+        def kill():
+            timed_out.set()
+            proc.kill()
+
+        def drain_stderr():
+            for line in proc.stderr:
+                on_line(line.decode("utf-8", errors="replace"))
+
+        watchdog = threading.Timer(timeout, kill)
+        watchdog.daemon = True
+        watchdog.start()
+        try:
+            if on_pcm:
+                reader = threading.Thread(target=drain_stderr, daemon=True)
+                reader.start()
+                while chunk := proc.stdout.read(PCM_CHUNK_BYTES):
+                    on_pcm(chunk)
+                reader.join()
+            else:
+                drain_stderr()
+            returncode = proc.wait()
+        finally:
+            watchdog.cancel()
+            proc.stderr.close()
+            if on_pcm:
+                proc.stdout.close()
+        if timed_out.is_set():
+            raise subprocess.TimeoutExpired(cmd, timeout)
+        return returncode
+
+    def resolve_subtitles(self, media_path: str) -> Optional[list[SubtitleEntry]]:
+        """Subtitles from the preferred sidecar, else a demux-only read of the
+        best text stream. Returns None if reading them failed."""
+        analysis = self.analyze_media(media_path, scenes=False, audio=False)
+        return analysis.subtitles if analysis.complete else None
+
+    def extract_subtitles(self, media_path: str) -> list[SubtitleEntry]:
+        return self.resolve_subtitles(media_path) or []
+
+    def _parse_srt(self, srt_text: str) -> list[SubtitleEntry]:
+        return parse_srt(srt_text.splitlines())
+
+    def detect_scene_changes(
+        self, media_path: str, threshold: float = 0.3, profile: str = None,
+    ) -> list[SceneChange]:
+        return self.analyze_media(
+            media_path, subtitles=False, audio=False,
+            scene_threshold=threshold, scene_profile=profile,
+        ).scene_changes
+
+    def analyze_audio_energy(self, media_path: str) -> array:
+        return self.analyze_media(media_path, subtitles=False, scenes=False).audio_energy
 
     def identify_clip_candidates(
         self, subtitles: list[SubtitleEntry], scene_changes: list[SceneChange],
-        audio_energy: list[dict], total_duration_ms: int,
-        popular_quotes: list[str] = None,
+        audio_energy, total_duration_ms: int,
+        popular_quotes: list[str] | QuoteMatcher = None, audio_hop_ms: int = AUDIO_HOP_MS,
+        windows: list[tuple[int, int]] = None,
     ) -> list[ClipCandidate]:
+        """Build one candidate per subtitle line.
+
+        ``audio_energy`` is the per-hop RMS timeline from MediaAnalysis
+        (``audio_hop_ms`` apart); each candidate scores on its loudest hop.
+        With the ``windows`` of a targeted analysis, a candidate only snaps
+        to scene cuts within ``targeted_window_padding_ms`` of the window
+        holding its line; other cuts belong to unrelated lines."""
         candidates = []
+        windows = sorted(windows or [])
+        window_starts = [w[0] for w in windows]
+        padding = settings.targeted_window_padding_ms
+
+        # Sorted timelines so every per-subtitle lookup is a bisect instead of a full scan
+        scene_ts = sorted(sc.timestamp_ms for sc in scene_changes)
+        subs_by_start = sorted(subtitles, key=lambda s: s.start_ms)
+        sub_starts = [s.start_ms for s in subs_by_start]
+        energy = np.asarray(audio_energy, dtype=np.float32)
+        energy_max = _sparse_max_table(energy)
+
+        quotes = None
+        if isinstance(popular_quotes, QuoteMatcher):
+            quotes = popular_quotes
+        elif popular_quotes:
+            quotes = get_quote_matcher(popular_quotes)
 
         for sub in subtitles:
-            quote_score = 0.0
-            if popular_quotes:
-                text_lower = sub.text.lower().strip()
-                for quote in popular_quotes:
-                    if quote.lower() in text_lower or text_lower in quote.lower():
-                        quote_score = max(quote_score, 0.9)
-                        break
-
-            start = max(0, sub.start_ms - 2000)
-            end = min(total_duration_ms, sub.end_ms + 2000)
-
-            nearest_scene_before = max(
-                (sc.timestamp_ms for sc in scene_changes if sc.timestamp_ms <= start),
-                default=start,
-            )
-            nearest_scene_after = min(
-                (sc.timestamp_ms for sc in scene_changes if sc.timestamp_ms >= end),
-                default=end,
-            )
+            quote_score = quotes.score(sub.text) if quotes else 0.0
+
+            start = max(0, sub.start_ms - SUBTITLE_CONTEXT_MS)
+            end = min(total_duration_ms, sub.end_ms + SUBTITLE_CONTEXT_MS)
+
+            snap_lo, snap_hi = 0, total_duration_ms
+            if windows:
+                k = bisect_right(window_starts, sub.start_ms) - 1
+                if k >= 0 and sub.start_ms <= windows[k][1]:
+                    snap_lo, snap_hi = windows[k][0] - padding, windows[k][1] + padding
+                else:
+                    snap_lo, snap_hi = start, end
+
+            i = bisect_right(scene_ts, start)
+            nearest_scene_before = scene_ts[i - 1] if i and scene_ts[i - 1] >= snap_lo else start
+            j = bisect_left(scene_ts, end)
+            nearest_scene_after = scene_ts[j] if j < len(scene_ts) and scene_ts[j] <= snap_hi else end
 
             clip_start = nearest_scene_before
             clip_end = nearest_scene_after
@@ -153,20 +728,28 @@ class ClipEngine:
 
             duration = clip_end - clip_start
 
-            nearby_subs = [s for s in subtitles if s.start_ms >= clip_start and s.end_ms <= clip_end]
+            # Subtitles fully inside the window must also start inside it
+            nearby_subs = [
+                s for s in subs_by_start[
+                    bisect_left(sub_starts, clip_start):bisect_right(sub_starts, clip_end)
+                ]
+                if s.end_ms <= clip_end
+            ]
             dialogue_score = self.scoring.compute_dialogue_density_score(
                 [{"text": s.text} for s in nearby_subs]
             )
             temporal_score = self.scoring.compute_temporal_position_score(clip_start, total_duration_ms)
 
             audio_score = 0.5
-            if audio_energy:
-                nearby_energy = [e for e in audio_energy if clip_start <= e["time_ms"] <= clip_end]
-                if nearby_energy:
-                    max_rms = max(e["rms_db"] for e in nearby_energy)
+            # Hops starting inside [clip_start, clip_end]; -inf marks hops never analyzed
+            lo = -(-clip_start // audio_hop_ms)
+            hi = min(len(energy), clip_end // audio_hop_ms + 1)
+            if hi > lo:
+                max_rms = _range_max(energy_max, lo, hi)
+                if max_rms > -math.inf:
                     audio_score = min(1.0, max(0.0, (max_rms + 60) / 60))
 
-            scene_density = len([sc for sc in scene_changes if clip_start <= sc.timestamp_ms <= clip_end])
+            scene_density = bisect_right(scene_ts, clip_end) - bisect_left(scene_ts, clip_start)
             scene_score = min(1.0, scene_density / 5.0)
 
             candidate = ClipCandidate(
@@ -179,38 +762,245 @@ class ClipEngine:
 
         return candidates
 
-    def extract_clip(self, media_path: str, output_path: str, start_ms: int, end_ms: int) -> bool:
+    def extract_clip(
+        self, media_path: str, output_path: str, start_ms: int, end_ms: int,
+        stream_copy: bool = False,
+    ) -> bool:
         start_sec = start_ms / 1000.0
         duration_sec = (end_ms - start_ms) / 1000.0
         os.makedirs(os.path.dirname(output_path), exist_ok=True)
 
+        if stream_copy:
+            video_args = ["-map", "0:v:0", "-map", "0:a:0", "-c:v", "copy",
+                          "-avoid_negative_ts", "make_zero"]
+        else:
+            video_args = ["-c:v", "libx264", "-preset", "fast", "-crf", "23"]
         try:
-            subprocess.run(
-                ["ffmpeg", "-y", "-ss", str(start_sec), "-i", media_path,
-                 "-t", str(duration_sec),
-                 "-c:v", "libx264", "-preset", "fast", "-crf", "23",
-                 "-c:a", "aac", "-b:a", "128k",
-                 "-af", f"afade=t=in:st=0:d=0.5,afade=t=out:st={duration_sec - 1.0}:d=1.0,"
-                        f"loudnorm=I=-16:TP=-1.5:LRA=11",
-                 "-movflags", "+faststart", output_path],
-                capture_output=True, timeout=120, check=True,
-            )
+            with self.governor.lease("encode") as lease:
+                subprocess.run(
+                    ["ffmpeg", "-y", "-ss", str(start_sec), "-i", media_path,
+                     "-t", str(duration_sec),
+                     *video_args, *lease.output_args,
+                     "-c:a", "aac", "-b:a", "128k",
+                     "-af", _clip_audio_filter(duration_sec),
+                     "-movflags", "+faststart", output_path],
+                    capture_output=True, timeout=120, check=True, preexec_fn=lease.preexec_fn,
+                )
             return True
         except (subprocess.TimeoutExpired, subprocess.CalledProcessError, FileNotFoundError):
             return False
 
-    def generate_thumbnails(self, media_path: str, output_dir: str, timestamps_ms: list[int]) -> list[str]:
-        paths = []
-        os.makedirs(output_dir, exist_ok=True)
-        for i, ts in enumerate(timestamps_ms[:3]):
-            out = os.path.join(output_dir, f"thumb_{i}.jpg")
+    def stream_copy_compatible(self, media_path: str) -> Optional[bool]:
+        """Whether the first video stream can be copied into a feed MP4 untouched.
+
+        None if the probe itself failed, so the answer is unknown."""
+        try:
+            result = subprocess.run(
+                ["ffprobe", "-v", "quiet", "-print_format", "json", "-select_streams", "v:0",
+                 "-show_entries", "stream=codec_name,profile,pix_fmt", media_path],
+                capture_output=True, text=True, timeout=30,
+            )
+            streams = json.loads(result.stdout).get("streams", [])
+        except (subprocess.TimeoutExpired, FileNotFoundError, json.JSONDecodeError):
+            return None
+        if not streams:
+            return False
+        video = streams[0]
+        return (
+            video.get("codec_name") in STREAM_COPY_CODECS
+            and video.get("profile") in STREAM_COPY_PROFILES
+            and video.get("pix_fmt") in STREAM_COPY_PIX_FMTS
+        )
+
+    def build_keyframe_index(self, media_path: str) -> Optional[list[int]]:
+        """Keyframe timestamps (ms, ascending) of the first video stream.
+
+        Reads packet flags only, so nothing is decoded. Returns an empty list
+        for sources that cannot be stream-copied and None if probing failed."""
+        compatible = self.stream_copy_compatible(media_path)
+        if compatible is None:
+            return None
+        if not compatible:
+            return []
+        try:
+            result = subprocess.run(
+                ["ffprobe", "-v", "error", "-select_streams", "v:0",
+                 "-show_entries", "packet=pts_time,flags", "-of", "csv=print_section=0",
+                 media_path],
+                capture_output=True, text=True, timeout=300,
+            )
+        except (subprocess.TimeoutExpired, FileNotFoundError):
+            return None
+        if result.returncode != 0:
+            return None
+        return self._parse_keyframe_packets(result.stdout)
+
+    def _parse_keyframe_packets(self, csv_text: str) -> list[int]:
+        keyframes = set()
+        for line in csv_text.splitlines():
+            pts_time, _, flags = line.partition(",")
+            if "K" not in flags:
+                continue
             try:
+                # Round up so an input seek to this time never lands on the previous GOP
+                keyframes.add(math.ceil(float(pts_time) * 1000))
+            except ValueError:
+                continue
+        return sorted(keyframes)
+
+    def extract_clips(
+        self, media_path: str, candidates: list[ClipCandidate], output_paths: list[str],
+        keyframes: list[int] = None,
+        on_batch: Callable[[list[ExtractedClip]], None] = None,
+    ) -> list[ExtractedClip]:
+        """Encode clips and their thumbnails in as few ffmpeg runs as possible.
+
+        Each batch of ``clip_extract_batch_size`` candidates is one ffmpeg
+        process with a fast-seeked input per clip, so the source is never
+        decoded between clips. Thumbnails are then cut from the freshly written
+        clips (one more process per batch) into the sibling directory named
+        after each clip file. Candidates of a batch that fails are retried one
+        at a time with extract_clip.
+
+        With a keyframe index (see build_keyframe_index), clips are snapped to
+        keyframes and their video is stream-copied; only audio is re-encoded.
+        Returned candidates carry the snapped boundaries. ``on_batch`` is
+        called with each batch's results as soon as its files are written."""
+        jobs = []
+        for candidate, output_path in zip(candidates, output_paths):
+            snapped = _snap_to_keyframes(candidate, keyframes) if keyframes else None
+            jobs.append((snapped or candidate, output_path, snapped is not None))
+
+        results = []
+        batch_size = max(1, settings.clip_extract_batch_size)
+        for i in range(0, len(jobs), batch_size):
+            batch_results = self._extract_batch(media_path, jobs[i:i + batch_size])
+            if on_batch:
+                on_batch(batch_results)
+            results.extend(batch_results)
+        return results
+
+    def _extract_batch(
+        self, media_path: str, batch: list[tuple[ClipCandidate, str, bool]],
+    ) -> list[ExtractedClip]:
+        cmd = ["ffmpeg", "-y"]
+        for candidate, _, _ in batch:
+            cmd += ["-ss", str(candidate.start_ms / 1000.0),
+                    "-t", str((candidate.end_ms - candidate.start_ms) / 1000.0),
+                    "-i", media_path]
+
+        graph = []
+        outputs = []
+        for n, (candidate, output_path, stream_copy) in enumerate(batch):
+            duration_sec = (candidate.end_ms - candidate.start_ms) / 1000.0
+            os.makedirs(os.path.dirname(output_path), exist_ok=True)
+            if stream_copy:
+                video_args = ["-c:v", "copy", "-avoid_negative_ts", "make_zero"]
+            else:
+                video_args = ["-c:v", "libx264", "-preset", "fast", "-crf", "23"]
+            graph.append(f"[{n}:a:0]{_clip_audio_filter(duration_sec)}[a{n}]")
+            outputs += [
+                "-map", f"{n}:v:0", "-map", f"[a{n}]", *video_args,
+                "-c:a", "aac", "-b:a", "128k",
+                "-movflags", "+faststart", output_path,
+            ]
+        cmd += ["-filter_complex", ";".join(graph)] + outputs
+
+        try:
+            with self.governor.lease("encode") as lease:
+                subprocess.run(
+                    _with_threads(cmd, lease, encoders=True),
+                    capture_output=True, timeout=120 * len(batch), check=True, preexec_fn=lease.preexec_fn,
+                )
+        except (subprocess.TimeoutExpired, subprocess.CalledProcessError, FileNotFoundError) as exc:
+            logger.warning(
+                "Batch extraction of %d clips from %s failed (%s); retrying individually",
+                len(batch), media_path, type(exc).__name__,
+            )
+            return [self._extract_single(media_path, *job) for job in batch]
+
+        results = [
+            ExtractedClip(
+                candidate=candidate, output_path=output_path,
+                success=os.path.isfile(output_path) and os.path.getsize(output_path) > 0,
+                stream_copied=stream_copy,
+            )
+            for candidate, output_path, stream_copy in batch
+        ]
+        done = [r for r in results if r.success]
+        thumbs = self._thumbnails_from_clips([
+            (r.output_path, os.path.splitext(r.output_path)[0], _thumbnail_offsets_ms(r.candidate))
+            for r in done
+        ])
+        for result, paths in zip(done, thumbs):
+            result.thumbnail_paths = paths
+        return results
+
+    def _extract_single(
+        self, media_path: str, candidate: ClipCandidate, output_path: str, stream_copy: bool = False,
+    ) -> ExtractedClip:
+        if stream_copy and not self.extract_clip(
+            media_path, output_path, candidate.start_ms, candidate.end_ms, stream_copy=True,
+        ):
+            # Copy failed (odd container/bitstream); a full re-encode still works
+            stream_copy = False
+        if not stream_copy and not self.extract_clip(
+            media_path, output_path, candidate.start_ms, candidate.end_ms,
+        ):
+            return ExtractedClip(candidate=candidate, output_path=output_path, success=False)
+        thumbs = self.generate_thumbnails(
+            output_path, os.path.splitext(output_path)[0], _thumbnail_offsets_ms(candidate),
+        )
+        return ExtractedClip(
+            candidate=candidate, output_path=output_path, success=True,
+            thumbnail_paths=thumbs, stream_copied=stream_copy,
+        )
+
+    def generate_thumbnails(self, clip_path: str, output_dir: str, offsets_ms: list[int]) -> list[str]:
+        """Grab up to three thumbnails from an encoded clip in one ffmpeg run.
+
+        ``offsets_ms`` are relative to the start of the clip. Reading the
+        small local MP4 avoids seeking around the source media volume."""
+        return self._thumbnails_from_clips([(clip_path, output_dir, offsets_ms)])[0]
+
+    def _thumbnails_from_clips(self, jobs: list[tuple[str, str, list[int]]]) -> list[list[str]]:
+        """Thumbnails for several encoded clips from a single ffmpeg process.
+
+        Writes thumb_{i}.jpg per offset and, when thumbnail_small_width is
+        set, a downscaled thumb_{i}_small.jpg for feed cards. Returns the
+        full-size paths that were written for each job."""
+        if not jobs:
+            return []
+        small_width = settings.thumbnail_small_width
+        cmd = ["ffmpeg", "-y"]
+        graph = []
+        outputs = []
+        for n, (clip_path, output_dir, offsets_ms) in enumerate(jobs):
+            os.makedirs(output_dir, exist_ok=True)
+            cmd += ["-i", clip_path]
+            select = _thumbnail_select([ts / 1000.0 for ts in offsets_ms[:3]])
+            image_args = ["-fps_mode", "vfr", "-q:v", "2", "-start_number", "0"]
+            if small_width:
+                graph.append(f"[{n}:v:0]{select},split=2[th{n}][ts{n}]")
+                graph.append(f"[ts{n}]scale={small_width}:-2[tsm{n}]")
+                outputs += ["-map", f"[th{n}]", *image_args, os.path.join(output_dir, "thumb_%d.jpg")]
+                outputs += ["-map", f"[tsm{n}]", *image_args, os.path.join(output_dir, "thumb_%d_small.jpg")]
+            else:
+                graph.append(f"[{n}:v:0]{select}[th{n}]")
+                outputs += ["-map", f"[th{n}]", *image_args, os.path.join(output_dir, "thumb_%d.jpg")]
+        cmd += ["-filter_complex", ";".join(graph)] + outputs
+
+        try:
+            with self.governor.lease("thumbnail") as lease:
                 subprocess.run(
-                    ["ffmpeg", "-y", "-ss", str(ts / 1000.0), "-i", media_path,
-                     "-vframes", "1", "-q:v", "2", out],
-                    capture_output=True, timeout=30, check=True,
+                    _with_threads(cmd, lease), capture_output=True, timeout=30 * len(jobs), check=True,
+                    preexec_fn=lease.preexec_fn,
                 )
-                paths.append(out)
-            except (subprocess.TimeoutExpired, subprocess.CalledProcessError, FileNotFoundError):
-                pass
-        return paths
+        except (subprocess.TimeoutExpired, subprocess.CalledProcessError, FileNotFoundError):
+            logger.warning("Thumbnail generation failed for %d clips", len(jobs))
+
+        results = []
+        for _, output_dir, offsets_ms in jobs:
+            paths = [os.path.join(output_dir, f"thumb_{i}.jpg") for i in range(len(offsets_ms[:3]))]
+            results.append([p for p in paths if os.path.isfile(p)])
+        return results
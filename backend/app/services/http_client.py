@@ -0,0 +1,74 @@
+import asyncio
+import logging
+import httpx
+from typing import Optional
+from app.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+settings = get_settings()
+
+# One pooled client per event loop and host: connections belong to the loop
+# that opened them, and a client per host gives each Plex server (and
+# plex.tv) its own connection limits instead of one pool shared by all. The
+# API server runs a single loop, and so does each Celery worker thread (see
+# app.tasks.clip_processing._event_loop).
+_clients: dict[tuple[asyncio.AbstractEventLoop, str], httpx.AsyncClient] = {}
+
+
+def _host_key(url: str) -> str:
+    """scheme://host:port of ``url``, the unit connection limits apply to."""
+    parsed = httpx.URL(url)
+    return f"{parsed.scheme}://{parsed.host}:{parsed.port or ''}"
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _new_client() -> httpx.AsyncClient:
+    # HTTP/2 is negotiated over TLS only, so plex.tv gets one multiplexed
+    # connection while LAN servers on plain http keep HTTP/1.1 keep-alive
+    http2 = settings.http2_enabled and _http2_available()
+    if settings.http2_enabled and not http2:
+        logger.info("h2 is not installed; Plex requests use HTTP/1.1")
+    return httpx.AsyncClient(
+        http2=http2,
+        timeout=httpx.Timeout(settings.http_timeout_s),
+        limits=httpx.Limits(
+            max_connections=settings.http_max_connections,
+            max_keepalive_connections=settings.http_max_keepalive_connections,
+            keepalive_expiry=settings.http_keepalive_expiry_s,
+        ),
+    )
+
+
+def get_http_client(url: str) -> httpx.AsyncClient:
+    """Shared, pooled client for ``url``'s host on the running event loop.
+
+    Callers use it directly and never close it; close_http_client() does
+    that when the process shuts down."""
+    key = (asyncio.get_running_loop(), _host_key(url))
+    client = _clients.get(key)
+    if client is None or client.is_closed:
+        client = _clients[key] = _new_client()
+    return client
+
+
+async def close_http_client():
+    """Close the running loop's clients, if any were opened."""
+    loop = asyncio.get_running_loop()
+    for key in [key for key in _clients if key[0] is loop]:
+        client: Optional[httpx.AsyncClient] = _clients.pop(key, None)
+        if client is not None:
+            await client.aclose()
+
+
+def forget_http_clients():
+    """Drop clients without closing them, e.g. ones inherited across a fork
+    whose sockets still belong to the parent process."""
+    _clients.clear()
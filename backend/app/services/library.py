@@ -1,11 +1,17 @@
+import asyncio
+from datetime import datetime
+from typing import Optional
 from uuid import UUID
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, update
-from app.models.clip import PlexLibrary
+from app.config import get_settings
+from app.models.clip import PlexLibrary, MediaItem
 from app.models.user import User
-from app.schemas.library import LibraryStatus, LibraryDetail
+from app.schemas.library import LibraryStatus, LibraryDetail, QueuedItem, ItemProgress, ThrottleStatus
 from app.services.plex import PlexService
 
+settings = get_settings()
+
 
 class LibraryService:
     def __init__(self, db: AsyncSession):
@@ -39,18 +45,94 @@ class LibraryService:
 
         return LibraryStatus(
             server_name=server_name, server_reachable=server_reachable, libraries=details,
+            in_progress=await self.get_in_progress(),
+            throttle=await asyncio.to_thread(_throttle_status),
+        )
+
+    async def get_in_progress(self, limit: int = 20) -> list[ItemProgress]:
+        """Items being processed right now, with the progress their task last reported."""
+        result = await self.db.execute(
+            select(MediaItem)
+            .where(MediaItem.processing_status == "processing")
+            .order_by(MediaItem.updated_at.desc())
+            .limit(limit)
+        )
+        items = result.scalars().all()
+        task_info = await asyncio.to_thread(
+            _task_progress, [item.processing_task_id for item in items],
+        )
+        # Live task state is finer grained; the item's checkpointed stage covers the rest
+        return [
+            ItemProgress(
+                media_id=item.plex_rating_key, title=item.title,
+                stage=info.get("stage", item.processing_stage),
+                progress=info.get("progress", item.processing_progress),
+            )
+            for item, info in zip(items, task_info)
+        ]
+
+    async def get_queue(self, limit: int = 100) -> list[QueuedItem]:
+        """Pending and in-flight items in the order workers will pick them up."""
+        result = await self.db.execute(
+            select(MediaItem)
+            .where(MediaItem.processing_status.in_(["pending", "queued", "processing"]))
+            .order_by(
+                MediaItem.priority.desc(),
+                MediaItem.plex_added_at.desc().nulls_last(),
+                MediaItem.created_at,
+            )
+            .limit(limit)
         )
+        return [
+            QueuedItem(
+                media_id=item.plex_rating_key, title=item.title, media_type=item.media_type,
+                processing_status=item.processing_status, priority=item.priority or 0,
+                clips_generated=item.clips_generated or 0, added_at=item.plex_added_at,
+            )
+            for item in result.scalars().all()
+        ]
 
     async def discover(self, user_id: UUID):
         from app.tasks.clip_processing import discover_libraries
         discover_libraries.delay(str(user_id))
 
-    async def trigger_rescan(self, user_id: UUID):
+    async def trigger_rescan(self, user_id: UUID, full: bool = False):
         from app.tasks.clip_processing import scan_library
-        scan_library.delay(str(user_id))
+        scan_library.delay(str(user_id), full)
 
     async def toggle_library(self, library_id: UUID, enabled: bool):
         await self.db.execute(
             update(PlexLibrary).where(PlexLibrary.id == library_id).values(enabled=enabled)
         )
         await self.db.commit()
+
+
+def _task_progress(task_ids: list) -> list[dict]:
+    """PROGRESS metadata for each task id, or {} when the task has not reported any."""
+    from app.tasks.celery_app import celery_app
+
+    infos = []
+    for task_id in task_ids:
+        info = {}
+        if task_id:
+            result = celery_app.AsyncResult(task_id)
+            if result.state == "PROGRESS" and isinstance(result.info, dict):
+                info = result.info
+        infos.append(info)
+    return infos
+
+
+def _throttle_status() -> Optional[ThrottleStatus]:
+    """Processing throttle as last recorded by the workers."""
+    from app.services.plex_throttle import get_throttle
+
+    if not settings.plex_throttle_enabled:
+        return None
+    try:
+        state = get_throttle().current()
+    except Exception:
+        return None
+    return ThrottleStatus(
+        level=state.level, streams=state.streams, transcodes=state.transcodes,
+        checked_at=datetime.utcfromtimestamp(state.checked_at) if state.checked_at else None,
+    )
@@ -1,10 +1,22 @@
 import httpx
-from typing import Optional
+import asyncio
+import logging
+from typing import AsyncIterator, Optional
 from app.config import get_settings
+from app.services.http_client import get_http_client
+
+logger = logging.getLogger(__name__)
 
 settings = get_settings()
 
 PLEX_API_BASE = "https://plex.tv/api/v2"
+# First retry of a failed library page waits this long, doubling after
+PAGE_RETRY_BACKOFF_S = 1.0
+PAGE_TIMEOUT_S = 30.0
+
+
+class PlexListingError(Exception):
+    """A library listing page could not be fetched, even after retries."""
 
 
 class PlexService:
@@ -16,136 +28,247 @@ class PlexService:
         }
 
     async def validate_token(self, token: str) -> Optional[dict]:
-        async with httpx.AsyncClient() as client:
-            try:
-                response = await client.get(
-                    f"{PLEX_API_BASE}/user",
-                    headers={**self.headers, "X-Plex-Token": token},
-                )
-                if response.status_code == 200:
-                    data = response.json()
-                    return {
-                        "id": data.get("id"),
-                        "username": data.get("username"),
-                        "email": data.get("email"),
-                        "thumb": data.get("thumb"),
-                    }
-            except httpx.RequestError:
-                pass
+        client = get_http_client(PLEX_API_BASE)
+        try:
+            response = await client.get(
+                f"{PLEX_API_BASE}/user",
+                headers={**self.headers, "X-Plex-Token": token},
+            )
+            if response.status_code == 200:
+                data = response.json()
+                return {
+                    "id": data.get("id"),
+                    "username": data.get("username"),
+                    "email": data.get("email"),
+                    "thumb": data.get("thumb"),
+                }
+        except httpx.RequestError:
+            pass
         return None
 
     async def get_servers(self, token: str) -> list[dict]:
-        async with httpx.AsyncClient() as client:
-            try:
-                response = await client.get(
-                    f"{PLEX_API_BASE}/resources",
-                    headers={**self.headers, "X-Plex-Token": token},
-                    params={"includeHttps": 1, "includeRelay": 0},
-                )
-                if response.status_code == 200:
-                    resources = response.json()
-                    servers = []
-                    for r in resources:
-                        if r.get("provides") == "server":
-                            connections = r.get("connections", [])
-                            local = next(
-                                (c for c in connections if c.get("local")),
-                                connections[0] if connections else None,
-                            )
-                            if local:
-                                servers.append({
-                                    "server_id": r["clientIdentifier"],
-                                    "name": r["name"],
-                                    "address": local["address"],
-                                    "port": local["port"],
-                                    "is_reachable": r.get("presence", False),
-                                    "token": r.get("accessToken", token),
-                                })
-                    return servers
-            except httpx.RequestError:
-                pass
+        client = get_http_client(PLEX_API_BASE)
+        try:
+            response = await client.get(
+                f"{PLEX_API_BASE}/resources",
+                headers={**self.headers, "X-Plex-Token": token},
+                params={"includeHttps": 1, "includeRelay": 0},
+            )
+            if response.status_code == 200:
+                resources = response.json()
+                servers = []
+                for r in resources:
+                    if r.get("provides") == "server":
+                        connections = r.get("connections", [])
+                        local = next(
+                            (c for c in connections if c.get("local")),
+                            connections[0] if connections else None,
+                        )
+                        if local:
+                            servers.append({
+                                "server_id": r["clientIdentifier"],
+                                "name": r["name"],
+                                "address": local["address"],
+                                "port": local["port"],
+                                "is_reachable": r.get("presence", False),
+                                "token": r.get("accessToken", token),
+                            })
+                return servers
+        except httpx.RequestError:
+            pass
         return []
 
     async def get_libraries(self, server_url: str, token: str) -> list[dict]:
-        async with httpx.AsyncClient() as client:
-            try:
-                response = await client.get(
-                    f"{server_url}/library/sections",
-                    headers={**self.headers, "X-Plex-Token": token},
-                )
-                if response.status_code == 200:
-                    data = response.json()
-                    libraries = []
-                    for section in data.get("MediaContainer", {}).get("Directory", []):
-                        if section.get("type") in ("movie", "show"):
-                            libraries.append({
-                                "library_key": section["key"],
-                                "title": section["title"],
-                                "library_type": section["type"],
-                                "total_items": section.get("count", 0),
-                            })
-                    return libraries
-            except httpx.RequestError:
-                pass
+        client = get_http_client(server_url)
+        try:
+            response = await client.get(
+                f"{server_url}/library/sections",
+                headers={**self.headers, "X-Plex-Token": token},
+            )
+            if response.status_code == 200:
+                data = response.json()
+                libraries = []
+                for section in data.get("MediaContainer", {}).get("Directory", []):
+                    if section.get("type") in ("movie", "show"):
+                        libraries.append({
+                            "library_key": section["key"],
+                            "title": section["title"],
+                            "library_type": section["type"],
+                            "total_items": section.get("count", 0),
+                        })
+                return libraries
+        except httpx.RequestError:
+            pass
         return []
 
     async def get_library_items(
         self, server_url: str, token: str, library_key: str, library_type: str = "movie",
+        added_since: Optional[int] = None, updated_since: Optional[int] = None,
     ) -> list[dict]:
-        """Fetch processable items from a Plex library.
-        For movie libraries: returns movies directly.
-        For show libraries: returns episodes (type=4) so we get actual file paths."""
-        async with httpx.AsyncClient(timeout=60.0) as client:
+        """Whole listing of iter_library_items() as one list; [] if it cannot be fetched."""
+        items = []
+        try:
+            async for page in self.iter_library_items(
+                server_url, token, library_key, library_type, added_since, updated_since,
+            ):
+                items += page
+        except PlexListingError as exc:
+            logger.warning("Could not list Plex library %s: %s", library_key, exc)
+            return []
+        return items
+
+    async def iter_library_items(
+        self, server_url: str, token: str, library_key: str, library_type: str = "movie",
+        added_since: Optional[int] = None, updated_since: Optional[int] = None,
+    ) -> AsyncIterator[list[dict]]:
+        """Yield processable items from a Plex library, one page at a time.
+        For movie libraries: yields movies directly.
+        For show libraries: yields episodes (type=4) so we get actual file paths.
+
+        Pages of ``plex_page_size`` are requested with X-Plex-Container-Start/
+        Size, up to ``plex_page_concurrency`` at once, and yielded as they
+        arrive; each page is retried ``plex_page_retries`` times before
+        PlexListingError is raised. With ``added_since``/``updated_since``
+        (Plex epoch seconds) only items added or updated after them are
+        listed, filtered by Plex itself; each filter is its own listing and
+        items matching both are yielded once.
+
+        Concurrent offset pages are not a snapshot: an item deleted in Plex
+        mid-listing shifts later offsets, so a still-present item can be
+        missed. A full listing that shrank while it ran therefore raises
+        PlexListingError after its last page, so callers do not reconcile
+        deletions against it."""
+        # For show libraries, fetch episodes directly (type=4)
+        # Shows themselves don't have file paths — episodes do
+        url = f"{server_url}/library/sections/{library_key}/all"
+        # Oldest first, so items added mid-listing land on the last page
+        # instead of shifting the offsets of pages not yet fetched
+        params = {"sort": "addedAt"}
+        if library_type == "show":
+            params["type"] = "4"  # Plex type 4 = episode
+        filters = [
+            {f"{field}>>": since}
+            for field, since in (("addedAt", added_since), ("updatedAt", updated_since))
+            if since is not None
+        ]
+
+        seen: set[str] = set()
+        slots = asyncio.Semaphore(max(1, settings.plex_page_concurrency))
+        client = get_http_client(url)
+        for extra in filters or [{}]:
+            query = {**params, **extra}
+
+            async def page(start: int) -> dict:
+                async with slots:
+                    return await self._library_page(client, url, token, query, start)
+
+            first = await page(0)
+            size = settings.plex_page_size
+            total = int(first.get("totalSize", 0))
+            rest = [
+                asyncio.ensure_future(page(start))
+                for start in range(size, total, size)
+            ]
+            rows, shrunk = 0, False
             try:
-                # For show libraries, fetch episodes directly (type=4)
-                # Shows themselves don't have file paths — episodes do
-                url = f"{server_url}/library/sections/{library_key}/all"
-                params = {}
-                if library_type == "show":
-                    params["type"] = "4"  # Plex type 4 = episode
-
-                response = await client.get(
-                    url,
-                    headers={**self.headers, "X-Plex-Token": token},
-                    params=params,
-                )
-                if response.status_code == 200:
-                    data = response.json()
+                # Pages are yielded in order while later ones are still being fetched
+                for index in range(len(rest) + 1):
+                    container = await rest[index - 1] if index else first
+                    rows += len(container.get("Metadata", []))
+                    shrunk = shrunk or int(container.get("totalSize", total)) < total
                     items = []
-                    for item in data.get("MediaContainer", {}).get("Metadata", []):
-                        media = item.get("Media", [{}])
-                        if not media:
-                            continue
-                        parts = media[0].get("Part", [{}])
-                        file_path = parts[0].get("file") if parts else None
-                        if not file_path:
-                            continue
-
-                        # For episodes, build a combined title
-                        title = item.get("grandparentTitle", item["title"])
-                        season_episode = None
-                        if item.get("type") == "episode":
-                            s = item.get("parentIndex", 0)
-                            e = item.get("index", 0)
-                            season_episode = f"S{s:02d}E{e:02d}"
-                            ep_title = item.get("title", "")
-                            title = f"{item.get('grandparentTitle', title)} - {season_episode} - {ep_title}"
-
-                        items.append({
-                            "rating_key": item["ratingKey"],
-                            "title": title,
-                            "type": item["type"],
-                            "year": item.get("year") or item.get("parentYear"),
-                            "genres": [g["tag"] for g in item.get("Genre", [])],
-                            "actors": [r["tag"] for r in item.get("Role", [])[:5]],
-                            "director": next((d["tag"] for d in item.get("Director", [])), None),
-                            "duration": item.get("duration"),
-                            "poster": item.get("thumb") or item.get("grandparentThumb"),
-                            "content_rating": item.get("contentRating"),
-                            "file_path": file_path,
-                            "season_episode": season_episode,
-                        })
-                    return items
-            except httpx.RequestError:
-                pass
-        return []
+                    for item in container.get("Metadata", []):
+                        parsed = _library_item(item)
+                        if parsed and parsed["rating_key"] not in seen:
+                            seen.add(parsed["rating_key"])
+                            items.append(parsed)
+                    if items:
+                        yield items
+            finally:
+                for future in rest:
+                    if not future.cancel() and not future.cancelled():
+                        future.exception()  # mark a failed page's error as seen
+            # Items added meanwhile sort last and only add rows; fewer rows means a deletion
+            if not filters and (shrunk or rows < total):
+                raise PlexListingError(f"library changed during listing: {rows} of {total} rows")
+
+    async def _library_page(
+        self, client: httpx.AsyncClient, url: str, token: str, params: dict, start: int,
+    ) -> dict:
+        """MediaContainer of one listing page, retried with backoff."""
+        headers = {
+            **self.headers, "X-Plex-Token": token,
+            "X-Plex-Container-Start": str(start),
+            "X-Plex-Container-Size": str(settings.plex_page_size),
+        }
+        attempts = max(1, settings.plex_page_retries + 1)
+        for attempt in range(attempts):
+            try:
+                response = await client.get(url, headers=headers, params=params, timeout=PAGE_TIMEOUT_S)
+                if response.status_code == 200:
+                    return response.json().get("MediaContainer", {})
+                error = f"HTTP {response.status_code}"
+            except (httpx.RequestError, ValueError) as exc:
+                error = str(exc) or type(exc).__name__
+            if attempt + 1 < attempts:
+                await asyncio.sleep(PAGE_RETRY_BACKOFF_S * 2 ** attempt)
+        raise PlexListingError(f"page at {start} of {url}: {error}")
+
+    async def get_sessions(self, server_url: str, token: str) -> Optional[dict]:
+        """Active playback on a server: stream count and how many are transcoding.
+
+        Returns None when the server cannot be reached."""
+        client = get_http_client(server_url)
+        try:
+            response = await client.get(
+                f"{server_url}/status/sessions",
+                headers={**self.headers, "X-Plex-Token": token},
+            )
+            if response.status_code == 200:
+                sessions = response.json().get("MediaContainer", {}).get("Metadata", [])
+                transcodes = sum(
+                    1 for s in sessions
+                    if s.get("TranscodeSession", {}).get("videoDecision") == "transcode"
+                )
+                return {"streams": len(sessions), "transcodes": transcodes}
+        except httpx.RequestError:
+            pass
+        return None
+
+
+def _library_item(item: dict) -> Optional[dict]:
+    """Item dict for one library listing entry; None when it has no file."""
+    media = item.get("Media", [{}])
+    if not media:
+        return None
+    parts = media[0].get("Part", [{}])
+    file_path = parts[0].get("file") if parts else None
+    if not file_path:
+        return None
+
+    # For episodes, build a combined title
+    title = item.get("grandparentTitle", item["title"])
+    season_episode = None
+    if item.get("type") == "episode":
+        s = item.get("parentIndex", 0)
+        e = item.get("index", 0)
+        season_episode = f"S{s:02d}E{e:02d}"
+        ep_title = item.get("title", "")
+        title = f"{item.get('grandparentTitle', title)} - {season_episode} - {ep_title}"
+
+    return {
+        "rating_key": item["ratingKey"],
+        "title": title,
+        "type": item["type"],
+        "year": item.get("year") or item.get("parentYear"),
+        "genres": [g["tag"] for g in item.get("Genre", [])],
+        "actors": [r["tag"] for r in item.get("Role", [])[:5]],
+        "director": next((d["tag"] for d in item.get("Director", [])), None),
+        "duration": item.get("duration"),
+        "poster": item.get("thumb") or item.get("grandparentThumb"),
+        "content_rating": item.get("contentRating"),
+        "file_path": file_path,
+        "season_episode": season_episode,
+        "added_at": item.get("addedAt"),
+        "updated_at": item.get("updatedAt"),
+    }
@@ -0,0 +1,111 @@
+import json
+import time
+import logging
+from dataclasses import dataclass, asdict
+from typing import Callable, Optional
+from app.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+settings = get_settings()
+
+STATE_KEY = "byetz:plex-throttle:state"
+REFRESH_LOCK_KEY = "byetz:plex-throttle:refresh"
+SLOW_SLOT_KEY = "byetz:plex-throttle:slot"
+
+# Throttle levels, least to most restrictive
+IDLE = "idle"          # nothing playing: process flat out
+SLOW = "slow"          # direct plays: start items at a reduced rate
+PAUSED = "paused"      # transcodes or many streams: start nothing
+UNKNOWN = "unknown"    # Plex unreachable or not configured: do not hold work back
+
+
+@dataclass
+class ThrottleState:
+    level: str = UNKNOWN
+    streams: int = 0
+    transcodes: int = 0
+    checked_at: float = 0.0
+
+
+def classify(sessions: Optional[dict]) -> ThrottleState:
+    if sessions is None:
+        return ThrottleState(level=UNKNOWN, checked_at=time.time())
+    streams, transcodes = sessions.get("streams", 0), sessions.get("transcodes", 0)
+    if transcodes or streams >= settings.plex_throttle_pause_streams:
+        level = PAUSED
+    elif streams:
+        level = SLOW
+    else:
+        level = IDLE
+    return ThrottleState(level=level, streams=streams, transcodes=transcodes, checked_at=time.time())
+
+
+class PlexThrottle:
+    """Adaptive intake throttle driven by Plex playback activity.
+
+    The last /status/sessions result is shared between workers (and the API)
+    in Redis; whichever worker finds it older than the poll interval
+    refreshes it. admit() tells the caller how long to wait before starting
+    another item: never while idle, one item per slow interval while Plex
+    is direct-playing, and a poll interval at a time while it is transcoding."""
+
+    def __init__(self, store, fetch_sessions: Callable[[], Optional[dict]] = None):
+        self.store = store
+        self.fetch_sessions = fetch_sessions
+
+    def current(self) -> ThrottleState:
+        """Last recorded state, without polling Plex."""
+        raw = self.store.get(STATE_KEY)
+        if not raw:
+            return ThrottleState()
+        return ThrottleState(**json.loads(raw))
+
+    def state(self) -> ThrottleState:
+        state = self.current()
+        poll_s = settings.plex_throttle_poll_s
+        if self.fetch_sessions is None or time.time() - state.checked_at < poll_s:
+            return state
+        # One worker polls per interval; the rest keep using the previous state
+        if not self.store.set(REFRESH_LOCK_KEY, "1", nx=True, ex=max(1, poll_s)):
+            return state
+        try:
+            sessions = self.fetch_sessions()
+        except Exception as exc:
+            logger.warning("Could not poll Plex sessions: %s", exc)
+            sessions = None
+        new_state = classify(sessions)
+        self.store.set(STATE_KEY, json.dumps(asdict(new_state)))
+        if new_state.level != state.level:
+            logger.info(
+                "Plex throttle %s -> %s (%d streams, %d transcodes)",
+                state.level, new_state.level, new_state.streams, new_state.transcodes,
+            )
+        return new_state
+
+    def admit(self) -> int:
+        """Seconds to wait before starting another item; 0 means start now."""
+        state = self.state()
+        if state.level == PAUSED:
+            return settings.plex_throttle_poll_s
+        if state.level == SLOW:
+            interval = settings.plex_throttle_slow_interval_s
+            if self.store.set(SLOW_SLOT_KEY, "1", nx=True, ex=interval):
+                return 0
+            ttl = self.store.ttl(SLOW_SLOT_KEY)
+            return ttl if ttl and ttl > 0 else interval
+        return 0
+
+
+_throttle: Optional[PlexThrottle] = None
+
+
+def get_throttle(fetch_sessions: Callable[[], Optional[dict]] = None) -> PlexThrottle:
+    """The process's throttle, backed by the Celery Redis instance."""
+    global _throttle
+    if _throttle is None:
+        import redis
+        _throttle = PlexThrottle(redis.Redis.from_url(settings.redis_url))
+    if fetch_sessions is not None:
+        _throttle.fetch_sessions = fetch_sessions
+    return _throttle
@@ -0,0 +1,32 @@
+from datetime import datetime
+from typing import Optional
+
+# Urgency scale stored on MediaItem.priority: 0 (back catalog) .. 9 (do now).
+MAX_PRIORITY = 9
+
+# (max age in days, points) — newer additions reach the feed first (PRD CE-07)
+RECENCY_POINTS = [(1, 4), (7, 3), (30, 2), (365, 1)]
+NO_CLIPS_POINTS = 2
+TASTE_SELECTION_POINTS = 3
+
+
+def compute_priority(
+    added_at: Optional[datetime], clips_generated: int, in_taste_profile: bool,
+    now: datetime = None,
+) -> int:
+    """Processing urgency for a media item; higher is processed first."""
+    now = now or datetime.utcnow()
+    priority = 0
+    if added_at:
+        age_days = (now - added_at).total_seconds() / 86400
+        priority += next((points for days, points in RECENCY_POINTS if age_days <= days), 0)
+    if not clips_generated:
+        priority += NO_CLIPS_POINTS
+    if in_taste_profile:
+        priority += TASTE_SELECTION_POINTS
+    return min(priority, MAX_PRIORITY)
+
+
+def celery_priority(priority: int) -> int:
+    """Map urgency to a Redis-transport Celery priority, where 0 is served first."""
+    return MAX_PRIORITY - max(0, min(priority, MAX_PRIORITY))
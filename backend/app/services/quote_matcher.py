@@ -0,0 +1,89 @@
+import re
+import unicodedata
+from collections import Counter
+from functools import lru_cache
+from typing import Iterable
+
+_NON_WORD_RE = re.compile(r"[^a-z0-9]+")
+
+# Quotes compared in full per subtitle line, by number of shared shingles
+MAX_CANDIDATES = 20
+# Weaker similarities are treated as no match
+MIN_SCORE = 0.5
+# A subtitle that is only part of a quote needs this many words to count
+MIN_FRAGMENT_TOKENS = 3
+
+
+def normalize_quote(text: str) -> str:
+    """Lowercase, strip accents and punctuation, collapse whitespace."""
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    text = text.lower().replace("'", "").replace("’", "")
+    return " ".join(_NON_WORD_RE.sub(" ", text).split())
+
+
+def _shingles(tokens: list[str]) -> set[str]:
+    """Word bigrams; single-word texts are keyed by the word itself."""
+    if len(tokens) < 2:
+        return set(tokens)
+    return {f"{a} {b}" for a, b in zip(tokens, tokens[1:])}
+
+
+class QuoteMatcher:
+    """Inverted index of word bigrams over a quote collection.
+
+    A subtitle line only compares against quotes it shares a bigram with, so
+    lookups stay cheap with tens of thousands of quotes. Scores are graded:
+    1.0 when the line contains the whole quote, 0.5-0.9 when the line is a
+    substantial fragment of it, and a bigram Dice similarity (scaled to 0.9)
+    for paraphrases and transcription differences."""
+
+    def __init__(self, quotes: Iterable[str]):
+        self._quotes: list[tuple[str, int, set[str]]] = []
+        self._postings: dict[str, list[int]] = {}
+        seen = set()
+        for quote in quotes:
+            norm = normalize_quote(quote)
+            if not norm or norm in seen:
+                continue
+            seen.add(norm)
+            tokens = norm.split()
+            keys = _shingles(tokens)
+            qid = len(self._quotes)
+            self._quotes.append((norm, len(tokens), keys))
+            for key in keys:
+                self._postings.setdefault(key, []).append(qid)
+
+    def __len__(self) -> int:
+        return len(self._quotes)
+
+    def score(self, text: str) -> float:
+        norm = normalize_quote(text)
+        if not norm:
+            return 0.0
+        tokens = norm.split()
+        keys = _shingles(tokens)
+        shared = Counter(qid for key in keys for qid in self._postings.get(key, ()))
+
+        best = 0.0
+        padded = f" {norm} "
+        for qid, overlap in shared.most_common(MAX_CANDIDATES):
+            quote, quote_len, quote_keys = self._quotes[qid]
+            if f" {quote} " in padded:
+                return 1.0
+            if len(tokens) >= MIN_FRAGMENT_TOKENS and padded in f" {quote} ":
+                score = 0.5 + 0.4 * len(tokens) / quote_len
+            else:
+                score = 0.9 * 2 * overlap / (len(keys) + len(quote_keys))
+            best = max(best, score)
+        return best if best >= MIN_SCORE else 0.0
+
+
+@lru_cache(maxsize=32)
+def _cached_matcher(quotes: tuple[str, ...]) -> QuoteMatcher:
+    return QuoteMatcher(quotes)
+
+
+def get_quote_matcher(quotes: Iterable[str]) -> QuoteMatcher:
+    """Matcher for a quote collection, built once per worker process and reused."""
+    return _cached_matcher(tuple(quotes))
@@ -0,0 +1,176 @@
+"""Local quote database.
+
+Quote dumps (CSV or JSONL with ``title``, ``year`` and ``quote`` fields) are
+imported into a directory of flat arrays:
+
+    keys.npy           sorted 64-bit hashes of "normalized title|year"
+    groups.npy         per-key start offsets into quote_offsets (n_keys + 1)
+    quote_offsets.npy  per-quote byte offsets into quotes.bin (n_quotes + 1)
+    quotes.bin         UTF-8 quote text, concatenated
+
+The reader memory-maps every file, so all worker processes on a host share
+one copy through the page cache instead of loading it into each heap.
+
+    python -m app.services.quote_store import quotes.csv more_quotes.jsonl
+"""
+import os
+import csv
+import sys
+import json
+import shutil
+import hashlib
+import logging
+import argparse
+from functools import lru_cache
+from typing import Iterable, Optional
+import numpy as np
+from app.config import get_settings
+from app.services.quote_matcher import normalize_quote
+
+logger = logging.getLogger(__name__)
+
+settings = get_settings()
+
+QUOTE_FIELDS = ("quote", "text", "line")
+TITLE_FIELDS = ("title", "movie", "show")
+
+
+def default_store_dir() -> str:
+    return settings.quote_db_path or os.path.join(settings.clip_storage_path, ".quotes")
+
+
+def title_key(title: str, year: Optional[int] = None) -> int:
+    """64-bit key for a normalized title and optional year."""
+    raw = f"{normalize_quote(title)}|{year or ''}"
+    return int.from_bytes(hashlib.blake2b(raw.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def _read_records(path: str) -> Iterable[dict]:
+    with open(path, encoding="utf-8", newline="") as f:
+        if path.endswith((".jsonl", ".ndjson")):
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            yield from csv.DictReader(f)
+
+
+def _field(record: dict, names: tuple[str, ...]) -> str:
+    return next((str(record[n]).strip() for n in names if record.get(n)), "")
+
+
+def _year(value) -> Optional[int]:
+    try:
+        return int(str(value).strip()[:4])
+    except (TypeError, ValueError):
+        return None
+
+
+def import_quotes(sources: list[str], out_dir: str = None) -> dict:
+    """Build the on-disk store from quote dumps, replacing any existing store.
+
+    Quotes are deduplicated per title after normalization. Entries with a
+    year are also filed under the bare title so lookups for items Plex has
+    no year for still find them."""
+    out_dir = out_dir or default_store_dir()
+    groups: dict[int, dict[str, str]] = {}
+    skipped = 0
+    for path in sources:
+        for record in _read_records(path):
+            title = _field(record, TITLE_FIELDS)
+            quote = _field(record, QUOTE_FIELDS)
+            norm = normalize_quote(quote)
+            if not title or not norm:
+                skipped += 1
+                continue
+            year = _year(record.get("year"))
+            keys = {title_key(title, year), title_key(title)}
+            for key in keys:
+                groups.setdefault(key, {}).setdefault(norm, quote)
+
+    keys = sorted(groups)
+    group_offsets = [0]
+    quote_offsets = [0]
+    blob = bytearray()
+    for key in keys:
+        for quote in groups[key].values():
+            blob += quote.encode("utf-8")
+            quote_offsets.append(len(blob))
+        group_offsets.append(len(quote_offsets) - 1)
+
+    tmp_dir = f"{out_dir}.{os.getpid()}.tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    np.save(os.path.join(tmp_dir, "keys.npy"), np.array(keys, dtype=np.uint64))
+    np.save(os.path.join(tmp_dir, "groups.npy"), np.array(group_offsets, dtype=np.int64))
+    np.save(os.path.join(tmp_dir, "quote_offsets.npy"), np.array(quote_offsets, dtype=np.int64))
+    with open(os.path.join(tmp_dir, "quotes.bin"), "wb") as f:
+        f.write(blob)
+    shutil.rmtree(out_dir, ignore_errors=True)
+    os.replace(tmp_dir, out_dir)
+    get_quote_store.cache_clear()
+
+    stats = {"titles": len(keys), "quotes": len(quote_offsets) - 1, "skipped": skipped}
+    logger.info("Imported quote store into %s: %s", out_dir, stats)
+    return stats
+
+
+class QuoteStore:
+    """Read-only, memory-mapped view of an imported quote store."""
+
+    def __init__(self, root: str):
+        self.root = root
+        self._keys = np.load(os.path.join(root, "keys.npy"), mmap_mode="r")
+        self._groups = np.load(os.path.join(root, "groups.npy"), mmap_mode="r")
+        self._offsets = np.load(os.path.join(root, "quote_offsets.npy"), mmap_mode="r")
+        blob_path = os.path.join(root, "quotes.bin")
+        self._blob = np.memmap(blob_path, dtype=np.uint8, mode="r") if os.path.getsize(blob_path) else b""
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def _quotes_for_key(self, key: int) -> list[str]:
+        i = int(np.searchsorted(self._keys, np.uint64(key)))
+        if i >= len(self._keys) or int(self._keys[i]) != key:
+            return []
+        lo, hi = int(self._groups[i]), int(self._groups[i + 1])
+        bounds = self._offsets[lo:hi + 1].tolist()
+        return [bytes(self._blob[a:b]).decode("utf-8") for a, b in zip(bounds, bounds[1:])]
+
+    def quotes_for(self, title: str, year: Optional[int] = None) -> list[str]:
+        """Quotes filed under the title and year, or under the bare title."""
+        if year:
+            quotes = self._quotes_for_key(title_key(title, year))
+            if quotes:
+                return quotes
+        return self._quotes_for_key(title_key(title))
+
+
+@lru_cache(maxsize=1)
+def get_quote_store() -> Optional[QuoteStore]:
+    """The process-wide quote store, or None when none has been imported."""
+    root = default_store_dir()
+    try:
+        return QuoteStore(root)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as exc:
+        logger.warning("Could not open quote store %s: %s", root, exc)
+        return None
+
+
+def main(argv: list[str] = None):
+    parser = argparse.ArgumentParser(prog="python -m app.services.quote_store")
+    sub = parser.add_subparsers(dest="command", required=True)
+    importer = sub.add_parser("import", help="Build the quote store from CSV/JSONL dumps")
+    importer.add_argument("sources", nargs="+")
+    importer.add_argument("--out", default=None, help="Store directory (default: BYETZ_QUOTE_DB_PATH)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    stats = import_quotes(args.sources, args.out)
+    print(json.dumps(stats))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
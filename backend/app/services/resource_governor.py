@@ -0,0 +1,203 @@
+import os
+import time
+import fcntl
+import ctypes
+import socket
+import tempfile
+import logging
+import platform
+from collections import Counter
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+from app.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+settings = get_settings()
+
+# ioprio_set(2) syscall numbers; other architectures skip I/O priorities
+_IOPRIO_SET_SYSCALL = {"x86_64": 251, "aarch64": 30, "i686": 289, "armv7l": 314}
+_IOPRIO_WHO_PROCESS = 1
+_IOPRIO_CLASS_SHIFT = 13
+
+
+def _set_io_priority(io_class: int, level: int = 7):
+    nr = _IOPRIO_SET_SYSCALL.get(platform.machine())
+    if nr is None:
+        return
+    try:
+        libc = ctypes.CDLL(None, use_errno=True)
+        libc.syscall(nr, _IOPRIO_WHO_PROCESS, 0, (io_class << _IOPRIO_CLASS_SHIFT) | level)
+    except (OSError, AttributeError):
+        pass
+
+
+def _stage_priority(stage: str) -> tuple[int, int]:
+    """(nice increment, ionice class) configured for a stage."""
+    return (
+        getattr(settings, f"{stage}_nice", 0),
+        getattr(settings, f"{stage}_ionice_class", 0),
+    )
+
+
+@dataclass
+class FfmpegLease:
+    """Thread allocation and process priority for one ffmpeg run."""
+    stage: str
+    threads: int = 0
+    concurrent: int = 1
+    nice: int = 0
+    ionice_class: int = 0
+    started: float = field(default_factory=time.monotonic)
+
+    @property
+    def input_args(self) -> list[str]:
+        """Decoder threads; goes before each ``-i``."""
+        return ["-threads", str(self.threads)] if self.threads else []
+
+    @property
+    def global_args(self) -> list[str]:
+        return ["-filter_complex_threads", str(self.threads)] if self.threads else []
+
+    @property
+    def output_args(self) -> list[str]:
+        """Encoder (libx264) threads; goes after the inputs."""
+        return ["-threads", str(self.threads)] if self.threads else []
+
+    @property
+    def preexec_fn(self) -> Optional[Callable[[], None]]:
+        if not (self.nice or self.ionice_class):
+            return None
+        nice, ionice_class = self.nice, self.ionice_class
+
+        def apply():
+            if nice:
+                os.nice(nice)
+            if ionice_class:
+                _set_io_priority(ionice_class)
+        return apply
+
+
+class ResourceGovernor:
+    """Splits the host's ffmpeg CPU budget between concurrently running ffmpeg processes.
+
+    Every ffmpeg run holds an exclusive flock on a lease file in a directory
+    shared by all workers on the host (containers included); the number of
+    locked leases decides how many threads the next run gets, so two concurrent encodes on an 8-core box get 4 threads each
+    instead of 8 apiece. Background stages can also be niced and given a
+    lower I/O class. CPU time used per stage is logged and counted in
+    ``stats`` for tuning."""
+
+    # Per-process totals, shared by every governor instance in the worker
+    stats: Counter = Counter()
+
+    def __init__(self, root: str = None, cpu_budget: int = None, enabled: bool = None):
+        self.root = root or settings.ffmpeg_governor_path or os.path.join(tempfile.gettempdir(), "byetz-ffmpeg")
+        self.cpu_budget = cpu_budget or settings.ffmpeg_cpu_budget or os.cpu_count() or 1
+        self.enabled = settings.ffmpeg_governor_enabled if enabled is None else enabled
+        self._host = socket.gethostname()
+
+    def _live_leases(self) -> int:
+        try:
+            entries = list(os.scandir(self.root))
+        except FileNotFoundError:
+            return 0
+        live = 0
+        for entry in entries:
+            if entry.name.startswith("."):
+                continue  # lease still being created
+            if _lease_held(entry.path):
+                live += 1
+            else:
+                _remove(entry.path)
+        return live
+
+    @contextmanager
+    def lease(self, stage: str):
+        """Context for one ffmpeg run of ``stage``; yields an FfmpegLease."""
+        nice, ionice_class = _stage_priority(stage)
+        if not self.enabled:
+            yield FfmpegLease(stage=stage)
+            return
+
+        name = f"{self._host}@{os.getpid()}-{time.monotonic_ns()}"
+        path = os.path.join(self.root, name)
+        handle = None
+        try:
+            os.makedirs(self.root, exist_ok=True)
+            # Lock under a hidden name first so no one reclaims it before it is held;
+            # the kernel drops the lock when this process dies, wherever it runs
+            tmp_path = os.path.join(self.root, f".{name}")
+            handle = open(tmp_path, "w")
+            fcntl.flock(handle, fcntl.LOCK_EX)
+            os.rename(tmp_path, path)
+        except OSError as exc:
+            logger.warning("ffmpeg governor could not write lease in %s: %s", self.root, exc)
+            if handle:
+                handle.close()
+                _remove(tmp_path)
+            handle = path = None
+        concurrent = max(1, self._live_leases())
+        lease = FfmpegLease(
+            stage=stage, threads=max(1, self.cpu_budget // concurrent), concurrent=concurrent,
+            nice=nice, ionice_class=ionice_class,
+        )
+        cpu_before = _children_cpu_seconds()
+        try:
+            yield lease
+        finally:
+            if path:
+                _remove(path)
+                handle.close()
+            self._record(lease, _children_cpu_seconds() - cpu_before)
+
+    def _record(self, lease: FfmpegLease, cpu_s: float):
+        wall_s = time.monotonic() - lease.started
+        self.stats[f"{lease.stage}_runs"] += 1
+        self.stats[f"{lease.stage}_cpu_s"] += cpu_s
+        self.stats[f"{lease.stage}_wall_s"] += wall_s
+        utilization = cpu_s / (wall_s * lease.threads) if wall_s > 0 and lease.threads else 0.0
+        logger.info(
+            "ffmpeg %s: %.1fs wall, %.1fs CPU, %d threads (%.0f%% used), %d concurrent",
+            lease.stage, wall_s, cpu_s, lease.threads, 100 * utilization, lease.concurrent,
+        )
+
+
+def _children_cpu_seconds() -> float:
+    # Counts only children that have been waited for, i.e. finished ffmpeg runs
+    times = os.times()
+    return times.children_user + times.children_system
+
+
+def _lease_held(path: str) -> bool:
+    """Whether a live ffmpeg run still holds the lease at ``path``."""
+    try:
+        with open(path) as handle:
+            try:
+                fcntl.flock(handle, fcntl.LOCK_SH | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return True
+            return False
+    except FileNotFoundError:
+        return False  # released meanwhile
+    except OSError:
+        return True
+
+
+def _remove(path: str):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+_governor: Optional[ResourceGovernor] = None
+
+
+def get_governor() -> ResourceGovernor:
+    """The worker process's governor."""
+    global _governor
+    if _governor is None:
+        _governor = ResourceGovernor()
+    return _governor
@@ -1,5 +1,6 @@
 import numpy as np
 from dataclasses import dataclass
+from typing import Union
 
 
 @dataclass
@@ -14,6 +15,61 @@ class ClipCandidate:
     temporal_position_score: float = 0.0
 
 
+# Candidates overlapping an already chosen (or existing) clip by more than this
+# intersection-over-union are near-duplicates and are suppressed
+NMS_MAX_IOU = 0.3
+
+# Top-k pool examined by suppression, as a multiple of the clips requested;
+# doubled until enough survivors are found or every candidate was examined
+NMS_POOL_FACTOR = 4
+
+SCORE_FIELDS = (
+    ("quote_match_score", "quote_match"),
+    ("audio_energy_score", "audio_energy"),
+    ("scene_composition_score", "scene_composition"),
+    ("dialogue_density_score", "dialogue_density"),
+    ("temporal_position_score", "temporal_position"),
+)
+
+CANDIDATE_DTYPE = np.dtype(
+    [("start_ms", np.int64), ("end_ms", np.int64), ("duration_ms", np.int64)]
+    + [(name, np.float64) for name, _ in SCORE_FIELDS]
+)
+
+
+class CandidateBatch:
+    """Structured-array view of many ClipCandidates for vectorized scoring."""
+
+    def __init__(self, data: np.ndarray):
+        self.data = data
+
+    @classmethod
+    def from_candidates(cls, candidates: list[ClipCandidate]) -> "CandidateBatch":
+        data = np.array(
+            [(c.start_ms, c.end_ms, c.duration_ms) + tuple(getattr(c, name) for name, _ in SCORE_FIELDS)
+             for c in candidates],
+            dtype=CANDIDATE_DTYPE,
+        )
+        return cls(data)
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    def to_candidates(self, indices=None) -> list[ClipCandidate]:
+        rows = self.data if indices is None else self.data[indices]
+        return [
+            ClipCandidate(*(row[name].item() for name in CANDIDATE_DTYPE.names))
+            for row in rows
+        ]
+
+
+def _interval_iou(start: int, end: int, starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+    """Intersection over union of one interval against many."""
+    inter = np.clip(np.minimum(end, ends) - np.maximum(start, starts), 0, None)
+    union = (end - start) + (ends - starts) - inter
+    return np.divide(inter, union, out=np.zeros(len(starts)), where=union > 0)
+
+
 class ClipScoringService:
     WEIGHTS = {
         "quote_match": 0.35,
@@ -72,8 +128,66 @@ class ClipScoringService:
             embedding = [x / norm for x in embedding]
         return embedding
 
-    def rank_candidates(self, candidates: list[ClipCandidate], max_clips: int) -> list[ClipCandidate]:
-        for c in candidates:
-            c.composite_score = self.compute_composite_score(c)
-        candidates.sort(key=lambda c: c.composite_score, reverse=True)
-        return candidates[:max_clips]
+    def composite_scores(self, batch: CandidateBatch) -> np.ndarray:
+        """compute_composite_score for every candidate of a batch at once."""
+        score = np.zeros(len(batch))
+        for name, weight in SCORE_FIELDS:
+            score = score + batch.data[name] * self.WEIGHTS[weight]
+        return np.round(np.clip(score, 0.0, 1.0), 4)
+
+    def rank_candidates(
+        self, candidates: Union[list[ClipCandidate], CandidateBatch], max_clips: int,
+        existing: list[tuple[int, int]] = None, max_iou: float = NMS_MAX_IOU,
+    ) -> list[ClipCandidate]:
+        """Best ``max_clips`` candidates by composite score, without near-duplicates.
+
+        Candidates are taken greedily in score order; one overlapping an
+        already chosen candidate or an ``existing`` (start_ms, end_ms) clip by
+        more than ``max_iou`` is skipped. Only the top of the score
+        distribution is sorted (argpartition), widening the pool when
+        suppression leaves too few survivors."""
+        batch = candidates if isinstance(candidates, CandidateBatch) else CandidateBatch.from_candidates(candidates)
+        n = len(batch)
+        if n == 0 or max_clips <= 0:
+            return []
+        scores = self.composite_scores(batch)
+        starts, ends = batch.data["start_ms"], batch.data["end_ms"]
+
+        existing = existing or []
+        kept_starts = np.empty(len(existing) + max_clips, dtype=np.int64)
+        kept_ends = np.empty_like(kept_starts)
+        for i, (start, end) in enumerate(existing):
+            kept_starts[i], kept_ends[i] = start, end
+
+        pool_size = min(n, max_clips * NMS_POOL_FACTOR)
+        seen = np.zeros(n, dtype=bool)
+        selected: list[int] = []
+        while True:
+            if pool_size < n:
+                # Everything scoring at least the pool_size-th best, ties included
+                threshold = np.partition(scores, n - pool_size)[n - pool_size]
+                pool = np.flatnonzero(scores >= threshold)
+            else:
+                pool = np.arange(n)
+            # Highest score first; ties keep candidate order
+            for idx in pool[np.lexsort((pool, -scores[pool]))]:
+                if seen[idx]:
+                    continue
+                seen[idx] = True
+                kept = len(existing) + len(selected)
+                if kept and (_interval_iou(
+                    starts[idx], ends[idx], kept_starts[:kept], kept_ends[:kept],
+                ) > max_iou).any():
+                    continue
+                kept_starts[kept], kept_ends[kept] = starts[idx], ends[idx]
+                selected.append(int(idx))
+                if len(selected) == max_clips:
+                    break
+            if len(selected) == max_clips or len(pool) == n:
+                break
+            pool_size = min(n, pool_size * 2)
+
+        ranked = batch.to_candidates(selected)
+        for candidate, idx in zip(ranked, selected):
+            candidate.composite_score = float(scores[idx])
+        return ranked
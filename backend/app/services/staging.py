@@ -0,0 +1,287 @@
+import os
+import time
+import fcntl
+import shutil
+import hashlib
+import logging
+import tempfile
+from collections import Counter
+from contextlib import contextmanager
+from typing import Iterator
+from app.config import get_settings
+from app.services.analysis_cache import MediaFingerprint
+
+logger = logging.getLogger(__name__)
+
+settings = get_settings()
+
+COPY_CHUNK_BYTES = 8 * 1024 * 1024
+# How often a worker waiting for a volume copy slot retries
+SLOT_POLL_S = 0.5
+
+
+def default_staging_dir() -> str:
+    return settings.source_staging_path or os.path.join(tempfile.gettempdir(), "byetz-staging")
+
+
+def volume_of(path: str) -> str:
+    """Mount point holding ``path``."""
+    path = os.path.realpath(path)
+    while not os.path.ismount(path):
+        parent = os.path.dirname(path)
+        if parent == path:
+            break
+        path = parent
+    return path
+
+
+def _process_read_bytes() -> int:
+    """Bytes read by this process and its reaped children (finished ffmpeg runs)."""
+    try:
+        with open("/proc/self/io") as f:
+            for line in f:
+                if line.startswith("rchar:"):
+                    return int(line.split()[1])
+    except (OSError, ValueError):
+        pass
+    return 0
+
+
+def _sidecars(media_path: str) -> list[str]:
+    directory, base = os.path.split(media_path)
+    stem = os.path.splitext(base)[0]
+    try:
+        names = os.listdir(directory or ".")
+    except OSError:
+        return []
+    return [
+        os.path.join(directory, n) for n in names
+        if n != base and n.startswith(stem + ".") and n.lower().endswith(".srt")
+    ]
+
+
+def _dir_size(path: str) -> int:
+    total = 0
+    for entry in os.scandir(path):
+        if entry.is_file(follow_symlinks=False):
+            total += entry.stat().st_size
+    return total
+
+
+class ScratchStaging:
+    """Local scratch copies of source files for multi-pass processing.
+
+    Every ffmpeg pass of a stage (probe, analysis, keyframe index, each
+    extraction and thumbnail batch) then reads the local copy instead of
+    seeking around a NAS or spinning up a sleeping disk. The source is read
+    once, sequentially; at most ``volume_concurrency`` copies per source
+    volume run at a time on a host. Entries are keyed by fingerprint, held
+    under a shared lock while in use and evicted least recently used first
+    once the directory exceeds its budget. Bytes read per volume, by the
+    copies and by the ffmpeg runs that follow, are counted in ``stats``."""
+
+    # Per-process totals, shared by every staging instance in the worker
+    stats: Counter = Counter()
+
+    def __init__(
+        self, root: str = None, max_bytes: int = None, volume_concurrency: int = None,
+        enabled: bool = None,
+    ):
+        self.root = root or default_staging_dir()
+        self.max_bytes = max_bytes if max_bytes is not None else settings.source_staging_max_mb * 1024 * 1024
+        self.volume_concurrency = max(1, volume_concurrency or settings.source_staging_volume_concurrency)
+        self.enabled = settings.source_staging_enabled if enabled is None else enabled
+
+    def _entry_dir(self, fingerprint: MediaFingerprint) -> str:
+        return os.path.join(self.root, fingerprint.key)
+
+    def _lock_path(self, name: str) -> str:
+        return os.path.join(self.root, ".locks", f"{name}.lock")
+
+    @contextmanager
+    def stage(self, media_path: str, fingerprint: MediaFingerprint) -> Iterator[str]:
+        """Context yielding the path every pass should read: the staged copy,
+        or ``media_path`` itself when staging is off or the file does not fit."""
+        if not self.enabled:
+            with self._metered(media_path, volume_of(media_path)):
+                yield media_path
+            return
+
+        entry = self._entry_dir(fingerprint)
+        local_path = os.path.join(entry, os.path.basename(media_path))
+        try:
+            os.makedirs(os.path.dirname(self._lock_path(fingerprint.key)), exist_ok=True)
+            lock = open(self._lock_path(fingerprint.key), "a+")
+        except OSError as exc:
+            logger.warning("Scratch staging unavailable in %s: %s", self.root, exc)
+            with self._metered(media_path, volume_of(media_path)):
+                yield media_path
+            return
+
+        try:
+            # Exclusive while checking/copying so concurrent stagers of one file copy it once
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            staged = self._staged(local_path, fingerprint) or self._copy_in(media_path, entry, fingerprint)
+            # Shared while in use; gc() only evicts entries it can lock exclusively
+            fcntl.flock(lock, fcntl.LOCK_SH)
+            if not staged:
+                with self._metered(media_path, volume_of(media_path)):
+                    yield media_path
+                return
+            try:
+                os.utime(entry)
+            except OSError:
+                pass
+            with self._metered(media_path, volume_of(self.root)):
+                yield local_path
+        finally:
+            lock.close()
+
+    def _staged(self, local_path: str, fingerprint: MediaFingerprint) -> bool:
+        try:
+            hit = os.path.getsize(local_path) == fingerprint.size
+        except OSError:
+            return False
+        if hit:
+            self.stats["hits"] += 1
+        return hit
+
+    def _copy_in(self, media_path: str, entry: str, fingerprint: MediaFingerprint) -> bool:
+        size = fingerprint.size
+        if size > self.max_bytes or not self._make_room(size):
+            logger.info("Not staging %s: %d MB does not fit the scratch budget", media_path, size >> 20)
+            self.stats["skipped"] += 1
+            return False
+
+        volume = volume_of(media_path)
+        tmp_dir = f"{entry}.{os.getpid()}.tmp"
+        started = time.monotonic()
+        try:
+            with self._volume_slot(volume):
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+                os.makedirs(tmp_dir)
+                copied = self._copy_file(media_path, os.path.join(tmp_dir, os.path.basename(media_path)))
+                for sidecar in _sidecars(media_path):
+                    copied += self._copy_file(sidecar, os.path.join(tmp_dir, os.path.basename(sidecar)))
+            shutil.rmtree(entry, ignore_errors=True)
+            os.replace(tmp_dir, entry)
+        except OSError as exc:
+            # Staging is an optimization; fall back to reading the source in place
+            logger.warning("Could not stage %s: %s", media_path, exc)
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            self.stats["skipped"] += 1
+            return False
+
+        elapsed = time.monotonic() - started
+        self.stats["copies"] += 1
+        self.stats[f"copy_bytes:{volume}"] += copied
+        self.stats[f"read_bytes:{volume}"] += copied
+        logger.info(
+            "Staged %s: %.1f MB from %s in %.1fs (%.0f MB/s)",
+            os.path.basename(media_path), copied / 1e6, volume, elapsed, copied / 1e6 / max(elapsed, 1e-3),
+        )
+        return True
+
+    def _copy_file(self, src: str, dst: str) -> int:
+        copied = 0
+        with open(src, "rb") as fin, open(dst, "wb") as fout:
+            if hasattr(os, "posix_fadvise"):
+                # Ask for aggressive read-ahead on the one sequential pass over the source
+                os.posix_fadvise(fin.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+            while chunk := fin.read(COPY_CHUNK_BYTES):
+                fout.write(chunk)
+                copied += len(chunk)
+        return copied
+
+    @contextmanager
+    def _volume_slot(self, volume: str):
+        """Hold one of the volume's copy slots, waiting until one is free."""
+        name = hashlib.sha1(volume.encode("utf-8")).hexdigest()[:12]
+        handles = []
+        try:
+            for slot in range(self.volume_concurrency):
+                handles.append(open(self._lock_path(f"volume-{name}-{slot}"), "a+"))
+            while True:
+                for handle in handles:
+                    try:
+                        fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    except BlockingIOError:
+                        continue
+                    yield
+                    return
+                self.stats["slot_waits"] += 1
+                time.sleep(SLOT_POLL_S)
+        finally:
+            for handle in handles:
+                handle.close()
+
+    @contextmanager
+    def _metered(self, media_path: str, volume: str):
+        """Count the bytes the enclosed ffmpeg runs read against ``volume``."""
+        before = _process_read_bytes()
+        try:
+            yield
+        finally:
+            read = _process_read_bytes() - before
+            if read > 0:
+                self.stats[f"read_bytes:{volume}"] += read
+                logger.info(
+                    "Read %.1f MB of %s from %s (%s)", read / 1e6, os.path.basename(media_path), volume,
+                    ", ".join(f"{k.split(':', 1)[1]}: {v / 1e6:.0f} MB"
+                              for k, v in sorted(self.stats.items()) if k.startswith("read_bytes:")),
+                )
+
+    def _entries(self) -> list[tuple[float, int, str]]:
+        """(mtime, size, path) of every complete entry."""
+        try:
+            dirs = [e for e in os.scandir(self.root) if e.is_dir() and not e.name.startswith(".")
+                    and not e.name.endswith(".tmp")]
+        except FileNotFoundError:
+            return []
+        entries = []
+        for d in dirs:
+            try:
+                entries.append((d.stat().st_mtime, _dir_size(d.path), d.path))
+            except OSError:
+                continue
+        return entries
+
+    def _make_room(self, incoming: int) -> bool:
+        """Evict unused entries until ``incoming`` bytes fit; False if they cannot."""
+        entries = self._entries()
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total + incoming <= self.max_bytes:
+                break
+            if self._evict(path):
+                total -= size
+        try:
+            os.makedirs(self.root, exist_ok=True)
+            free = shutil.disk_usage(self.root).free
+        except OSError:
+            return False
+        return total + incoming <= self.max_bytes and incoming < free
+
+    def gc(self) -> int:
+        """Evict least recently used entries until the directory fits its budget."""
+        before = self.stats["evictions"]
+        self._make_room(0)
+        return self.stats["evictions"] - before
+
+    def _evict(self, path: str) -> bool:
+        try:
+            lock = open(self._lock_path(os.path.basename(path)), "a+")
+        except OSError:
+            return False
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            # Being staged or read right now
+            lock.close()
+            return False
+        try:
+            shutil.rmtree(path, ignore_errors=True)
+            self.stats["evictions"] += 1
+            return True
+        finally:
+            lock.close()
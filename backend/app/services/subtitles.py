@@ -0,0 +1,149 @@
+"""Subtitle sources and SRT parsing.
+
+Subtitles come from a sidecar file next to the media when one matches the
+preferred languages (``Movie (1999).en.srt``, ``Movie (1999).srt``), and
+otherwise from the best text stream in the container.
+"""
+import os
+import re
+import logging
+from dataclasses import dataclass
+from typing import Iterable, Optional
+from app.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+settings = get_settings()
+
+_TIMING_RE = re.compile(
+    r"(\d+):(\d{2}):(\d{2})[,.](\d{3})\s*-->\s*(\d+):(\d{2}):(\d{2})[,.](\d{3})"
+)
+# HTML-style tags and ASS override blocks left over from conversion
+_MARKUP_RE = re.compile(r"<[^>]+>|\{\\[^}]*\}")
+
+# Sidecar name tags that are not languages
+_SIDECAR_MODIFIERS = {"forced", "sdh", "cc", "default"}
+
+
+@dataclass
+class SubtitleEntry:
+    index: int
+    start_ms: int
+    end_ms: int
+    text: str
+
+
+def preferred_languages() -> list[str]:
+    return [lang.strip().lower() for lang in settings.subtitle_languages.split(",") if lang.strip()]
+
+
+def language_rank(language: Optional[str], languages: list[str]) -> int:
+    """Position of a language in the preference list; untagged sorts after
+    every preferred language and any other language after that."""
+    if not language or language.lower() in ("und", "unknown"):
+        return len(languages)
+    language = language.lower()
+    return languages.index(language) if language in languages else len(languages) + 1
+
+
+def _timestamp_ms(h: str, m: str, s: str, ms: str) -> int:
+    return (int(h) * 3600 + int(m) * 60 + int(s)) * 1000 + int(ms)
+
+
+class SrtParser:
+    """Line-at-a-time SRT parser.
+
+    Cues are emitted as soon as their closing blank line is fed, so a file or
+    pipe can be parsed while it is read. Tolerates CRLF line endings, a BOM,
+    missing cue numbers and ``.`` as the millisecond separator."""
+
+    def __init__(self):
+        self.entries: list[SubtitleEntry] = []
+        self._index: Optional[int] = None
+        self._timing: Optional[tuple[int, int]] = None
+        self._text: list[str] = []
+
+    def feed(self, line: str):
+        line = line.strip().lstrip("\ufeff")
+        if not line:
+            self._flush()
+        elif self._timing is not None:
+            self._text.append(line)
+        else:
+            match = _TIMING_RE.match(line)
+            if match:
+                g = match.groups()
+                self._timing = (_timestamp_ms(*g[:4]), _timestamp_ms(*g[4:]))
+            elif line.isdigit():
+                self._index = int(line)
+
+    def close(self) -> list[SubtitleEntry]:
+        self._flush()
+        return self.entries
+
+    def _flush(self):
+        if self._timing is not None:
+            text = _MARKUP_RE.sub("", " ".join(self._text)).strip()
+            if text:
+                index = self._index if self._index is not None else len(self.entries) + 1
+                self.entries.append(SubtitleEntry(index, self._timing[0], self._timing[1], text))
+        self._index = None
+        self._timing = None
+        self._text = []
+
+
+def parse_srt(lines: Iterable[str]) -> list[SubtitleEntry]:
+    parser = SrtParser()
+    for line in lines:
+        parser.feed(line)
+    return parser.close()
+
+
+def read_srt(path: str) -> list[SubtitleEntry]:
+    with open(path, encoding="utf-8-sig", errors="replace") as f:
+        return parse_srt(f)
+
+
+def find_sidecar(media_path: str, languages: list[str] = None) -> Optional[str]:
+    """Best ``.srt`` next to ``media_path``, or None.
+
+    Sidecars tagged with a preferred language win in preference order,
+    then untagged ones; forced (foreign-dialogue only) tracks and other
+    languages are ignored, and SDH/CC variants lose to plain ones."""
+    languages = preferred_languages() if languages is None else languages
+    directory, base = os.path.split(media_path)
+    stem = os.path.splitext(base)[0]
+    try:
+        names = os.listdir(directory or ".")
+    except OSError:
+        return None
+
+    best, best_rank = None, None
+    for name in names:
+        if not name.lower().endswith(".srt") or not name.startswith(stem + "."):
+            continue
+        tags = [t for t in name[len(stem) + 1:-4].lower().split(".") if t]
+        if "forced" in tags:
+            continue
+        tagged = [t for t in tags if t not in _SIDECAR_MODIFIERS]
+        lang = min((language_rank(t, languages) for t in tagged), default=len(languages))
+        if lang > len(languages):
+            continue
+        rank = (lang, "sdh" in tags or "cc" in tags, name)
+        if best_rank is None or rank < best_rank:
+            best, best_rank = os.path.join(directory, name), rank
+    return best
+
+
+def subtitle_source(media_path: str) -> str:
+    """Identifies where subtitles for ``media_path`` would come from, for
+    caching: a sidecar's path, size and mtime, or the embedded stream choice."""
+    languages = preferred_languages()
+    sidecar = find_sidecar(media_path, languages)
+    if sidecar:
+        try:
+            st = os.stat(sidecar)
+            return f"sidecar:{sidecar}:{st.st_size}:{st.st_mtime_ns}"
+        except OSError:
+            pass
+    return f"embedded:{','.join(languages)}"
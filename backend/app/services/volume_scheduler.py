@@ -0,0 +1,160 @@
+import os
+import time
+import logging
+from typing import Callable, Hashable, Iterable, Optional, TypeVar
+from app.config import get_settings
+from app.services.staging import volume_of
+
+logger = logging.getLogger(__name__)
+
+settings = get_settings()
+
+SLOT_KEY = "byetz:volume:{volume}:slot:{n}"
+WAIT_KEY = "byetz:volume:{volume}:waiting"
+# Waiting items are scored (9 - priority) * span + enqueue time: highest
+# priority first, oldest first within a priority
+WAIT_PRIORITY_SPAN = 1e10
+
+T = TypeVar("T")
+
+
+def volume_key(path: str) -> str:
+    """Identity of the storage device holding ``path``.
+
+    Files on one device share an st_dev, even across separate bind mounts
+    of it, so this groups work by spindle/array rather than by mount. Falls
+    back to the mount point when the path cannot be stat'ed."""
+    probe = path
+    while probe:
+        try:
+            dev = os.stat(probe).st_dev
+            return f"{os.major(dev)}:{os.minor(dev)}"
+        except OSError:
+            parent = os.path.dirname(probe)
+            if parent == probe:
+                break
+            probe = parent
+    return volume_of(path)
+
+
+class VolumeKeys:
+    """volume_key() memoized per directory, so a library scan stats each
+    folder once instead of every file."""
+
+    def __init__(self):
+        self._by_dir: dict[str, str] = {}
+
+    def __call__(self, path: Optional[str]) -> str:
+        if not path:
+            return ""
+        directory = os.path.dirname(path)
+        if directory not in self._by_dir:
+            self._by_dir[directory] = volume_key(directory or path)
+        return self._by_dir[directory]
+
+
+def round_robin(items: Iterable[T], key: Callable[[T], Hashable]) -> list[T]:
+    """Interleave ``items`` across ``key`` groups, keeping each group's order.
+
+    ``[a1, a2, a3, b1, c1, c2]`` becomes ``[a1, b1, c1, a2, c2, a3]``."""
+    groups: dict[Hashable, list[T]] = {}
+    for item in items:
+        groups.setdefault(key(item), []).append(item)
+    queues = [list(reversed(g)) for g in groups.values()]
+    ordered = []
+    while queues:
+        for queue in queues:
+            ordered.append(queue.pop())
+        queues = [q for q in queues if q]
+    return ordered
+
+
+def _decode(value) -> Optional[str]:
+    return value.decode() if isinstance(value, bytes) else value
+
+
+class VolumeSlots:
+    """Per-volume cap on items in flight, shared by every worker through Redis.
+
+    An item takes one of its volume's ``max_in_flight`` slots when it is
+    admitted and gives it back when its pipeline finishes or fails. Items
+    that find every slot taken wait() in the volume's sorted set, and
+    whoever frees a slot starts the next one with admit_next(), so workers
+    move on to items on other drives instead of polling a busy one. Slots
+    expire after ``ttl_s`` in case a worker dies holding one."""
+
+    def __init__(self, store, max_in_flight: int = None, ttl_s: int = None):
+        self.store = store
+        self.max_in_flight = settings.volume_max_in_flight if max_in_flight is None else max_in_flight
+        self.ttl_s = ttl_s or settings.volume_slot_ttl_s
+
+    def _keys(self, volume: str) -> list[str]:
+        return [SLOT_KEY.format(volume=volume, n=n) for n in range(self.max_in_flight)]
+
+    def acquire(self, volume: str, owner: str) -> bool:
+        """Take a slot on ``volume`` for ``owner``; True if it may start."""
+        if self.max_in_flight <= 0 or not volume:
+            return True
+        keys = self._keys(volume)
+        # A retried or re-queued item keeps the slot it already holds
+        for key in keys:
+            if _decode(self.store.get(key)) == owner:
+                self.store.set(key, owner, ex=self.ttl_s)
+                return True
+        for key in keys:
+            if self.store.set(key, owner, nx=True, ex=self.ttl_s):
+                return True
+        return False
+
+    def release(self, volume: str, owner: str):
+        if self.max_in_flight <= 0 or not volume:
+            return
+        for key in self._keys(volume):
+            if _decode(self.store.get(key)) == owner:
+                self.store.delete(key)
+
+    def in_flight(self, volume: str) -> int:
+        return sum(1 for key in self._keys(volume) if self.store.get(key) is not None)
+
+    def wait(self, volume: str, owner: str, priority: int = 0):
+        """Park ``owner`` until a slot on ``volume`` frees up; waiting again keeps its place."""
+        score = (9 - priority) * WAIT_PRIORITY_SPAN + time.time()
+        self.store.zadd(WAIT_KEY.format(volume=volume), {owner: score}, nx=True)
+
+    def admit_next(self, volume: str) -> Optional[tuple[str, int]]:
+        """Take a free slot for the next waiting item: (owner, priority), or
+        None when nothing waits or no slot is free."""
+        key = WAIT_KEY.format(volume=volume)
+        popped = self.store.zpopmin(key)
+        if not popped:
+            return None
+        member, score = popped[0]
+        owner = _decode(member)
+        if not self.acquire(volume, owner):
+            # Every slot is taken after all; back in line at the same place
+            self.store.zadd(key, {owner: score})
+            return None
+        return owner, 9 - int(score // WAIT_PRIORITY_SPAN)
+
+    def waiting(self, volume: str) -> int:
+        return self.store.zcard(WAIT_KEY.format(volume=volume))
+
+    def waiting_volumes(self) -> list[str]:
+        """Volumes with items waiting for a slot."""
+        prefix, suffix = WAIT_KEY.split("{volume}")
+        return [
+            _decode(key)[len(prefix):-len(suffix)]
+            for key in self.store.scan_iter(match=WAIT_KEY.format(volume="*"))
+        ]
+
+
+_slots: Optional[VolumeSlots] = None
+
+
+def get_volume_slots() -> VolumeSlots:
+    """The process's slot table, backed by the Celery Redis instance."""
+    global _slots
+    if _slots is None:
+        import redis
+        _slots = VolumeSlots(redis.Redis.from_url(settings.redis_url))
+    return _slots
@@ -18,8 +18,36 @@ celery_app.conf.update(
     task_track_started=True,
     task_acks_late=True,
     worker_prefetch_multiplier=1,
+    # Redis priorities: 0 is served first (see app.services.processing_queue)
+    broker_transport_options={"priority_steps": list(range(10)), "queue_order_strategy": "priority"},
 )
 
 celery_app.conf.update(
-    include=["app.tasks.clip_processing"],
+    include=["app.tasks.clip_processing", "app.tasks.intake"],
 )
+
+# Pipeline stages run on their own queues so I/O-bound analysis and CPU-bound
+# encoding can be sized independently (see app.tasks.worker). Everything else,
+# including the short DB-only stages, goes to the "db" queue. New items enter
+# through the "intake" queue, which the db workers stop consuming while Plex
+# is busy (see app.tasks.intake).
+INTAKE_QUEUE = "intake"
+
+celery_app.conf.update(
+    task_default_queue="db",
+    task_routes={
+        "app.tasks.clip_processing.process_media_item": {"queue": INTAKE_QUEUE},
+        "app.tasks.clip_processing.analyze_media_item": {"queue": "analysis"},
+        "app.tasks.clip_processing.extract_media_clips": {"queue": "encode"},
+        "app.tasks.clip_processing.*": {"queue": "db"},
+    },
+)
+
+# Incremental library scans (run `celery -A app.tasks.celery_app beat` once)
+if settings.plex_delta_scan_interval_min > 0:
+    celery_app.conf.beat_schedule = {
+        "plex-delta-scan": {
+            "task": "app.tasks.clip_processing.delta_scan_libraries",
+            "schedule": settings.plex_delta_scan_interval_min * 60.0,
+        },
+    }
@@ -2,52 +2,330 @@ import os
 import uuid
 import asyncio
 import logging
+import threading
 from datetime import datetime, timedelta
-from sqlalchemy import create_engine, select, func
+from itertools import groupby
+from typing import Iterable, Optional
+from sqlalchemy import create_engine, select, func, update, delete, and_, or_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.orm import sessionmaker
+from celery import chain
+from celery.signals import worker_process_init, worker_process_shutdown
+from dataclasses import asdict
 from app.tasks.celery_app import celery_app
 
 logger = logging.getLogger(__name__)
 from app.config import get_settings
 from app.models.clip import Clip, MediaItem, PlexLibrary
-from app.models.user import User
+from app.models.user import User, TasteSelection
 from app.services.clip_engine import ClipEngine
-from app.services.scoring import ClipScoringService
-from app.services.plex import PlexService
+from app.services.analysis_cache import AnalysisCache, MediaFingerprint, fingerprint_file
+from app.services.scoring import ClipScoringService, ClipCandidate
+from app.services.plex import PlexListingError, PlexService
+from app.services.http_client import close_http_client, forget_http_clients
+from app.services.processing_queue import compute_priority, celery_priority
+from app.services.quote_matcher import QuoteMatcher, get_quote_matcher
+from app.services.quote_store import get_quote_store
+from app.services.subtitles import subtitle_source
+from app.services.staging import ScratchStaging
+from app.services.volume_scheduler import VolumeKeys, get_volume_slots, round_robin, volume_key
 
 settings = get_settings()
 
 sync_engine = create_engine(settings.database_url_sync)
 SyncSession = sessionmaker(bind=sync_engine)
 
-# Overlap threshold: if a candidate's midpoint is within this range of an
-# existing clip's midpoint, consider it a duplicate (in ms)
-OVERLAP_THRESHOLD_MS = 5000
+# Namespace for deterministic clip ids (see _clip_id)
+CLIP_ID_NAMESPACE = uuid.UUID("5b0f7c52-3d1e-4c8a-9a57-2f6d1c9e8b41")
+# Seconds delta scans rewind the watermarks by, so items sharing the
+# watermark's second (or indexed slightly out of order) are not missed
+DELTA_OVERLAP_S = 60
 
 
-def _existing_clip_midpoints(db, media_id: str) -> list[int]:
-    """Get midpoints of all existing clips for a media item."""
+def _existing_clip_intervals(db, media_id: str) -> list[tuple[int, int]]:
+    """(start_ms, end_ms) of all active clips of a media item."""
     result = db.execute(
         select(Clip.start_time_ms, Clip.end_time_ms).where(
             Clip.media_id == media_id, Clip.is_active == True
         )
     )
-    return [(row[0] + row[1]) // 2 for row in result.all()]
+    return [(row[0], row[1]) for row in result.all()]
 
 
-def _overlaps_existing(candidate_start: int, candidate_end: int, existing_midpoints: list[int]) -> bool:
-    """Check if a candidate overlaps with any existing clip."""
-    candidate_mid = (candidate_start + candidate_end) // 2
-    for mid in existing_midpoints:
-        if abs(candidate_mid - mid) < OVERLAP_THRESHOLD_MS:
-            return True
-    return False
+def _plex_timestamp(epoch_seconds) -> Optional[datetime]:
+    return datetime.utcfromtimestamp(int(epoch_seconds)) if epoch_seconds else None
+
+
+def _taste_selection_keys(db) -> tuple[set[str], set[str]]:
+    """Rating keys and titles picked in any user's taste profile.
+
+    Titles let episodes match a show that was picked as a whole."""
+    rows = db.execute(select(TasteSelection.media_id, TasteSelection.title)).all()
+    return {row[0] for row in rows}, {row[1] for row in rows}
+
+
+def _keyframe_index(engine: ClipEngine, cache, fingerprint, media_path: str) -> list[int]:
+    """Keyframe index for smart-cut extraction, reusing the analysis cache when enabled.
+
+    Only definite results are cached; an incompatible source caches as an
+    empty index. A failed or timed-out probe re-encodes this run's clips and
+    is retried next time, since it may have been a passing NAS hiccup."""
+    if cache:
+        keyframes = cache.get_keyframes(fingerprint)
+        if keyframes is not None:
+            return keyframes
+    keyframes = engine.build_keyframe_index(media_path)
+    if keyframes is None:
+        logger.warning("Keyframe probe failed for %s; re-encoding its clips", media_path)
+        return []
+    if cache:
+        cache.put_keyframes(fingerprint, keyframes)
+    return keyframes
+
+
+def _popular_quotes(payload: dict) -> Optional[QuoteMatcher]:
+    """Quote matcher for the item's title from the local quote store, if any."""
+    store = get_quote_store()
+    if store is None:
+        return None
+    title = payload["title"]
+    if payload.get("media_type") == "episode":
+        # Episodes are stored as "Show - S01E02 - Episode"; quotes are filed by show
+        title = title.split(" - ")[0]
+    quotes = store.quotes_for(title, payload.get("year"))
+    logger.info("  [%s] Popular quotes: %d", payload["title"], len(quotes))
+    return get_quote_matcher(quotes) if quotes else None
+
+
+# Event loop of each worker thread, kept across tasks so the shared HTTP
+# client's pooled connections stay usable from one task to the next. Per
+# thread because the intake gate polls Plex from its own thread.
+_loops = threading.local()
+
+
+def _event_loop() -> asyncio.AbstractEventLoop:
+    loop = getattr(_loops, "loop", None)
+    if loop is None or loop.is_closed():
+        loop = _loops.loop = asyncio.new_event_loop()
+    return loop
+
+
+@worker_process_init.connect
+def _reset_event_loop(**kwargs):
+    # A forked child must not reuse the parent's loop or sockets
+    _loops.loop = None
+    forget_http_clients()
+
+
+@worker_process_shutdown.connect
+def _close_event_loop(**kwargs):
+    loop = getattr(_loops, "loop", None)
+    if loop is not None and not loop.is_closed():
+        loop.run_until_complete(close_http_client())
+        loop.close()
+    _loops.loop = None
+
+
+# (server url, token) polled for playback activity, resolved once per process
+_plex_connection: Optional[tuple[str, str]] = None
+
+
+def _fetch_plex_sessions() -> Optional[dict]:
+    """Active Plex sessions on the server the workers share a machine with."""
+    global _plex_connection
+    plex_service = PlexService()
+    loop = _event_loop()
+    if _plex_connection is None:
+        if settings.plex_server_url:
+            _plex_connection = (settings.plex_server_url, settings.plex_server_token)
+        else:
+            db = SyncSession()
+            try:
+                token = db.execute(
+                    select(User.plex_token).where(User.plex_token != None).limit(1)
+                ).scalar()
+            finally:
+                db.close()
+            if not token:
+                return None
+            servers = loop.run_until_complete(plex_service.get_servers(token))
+            if not servers:
+                return None
+            server = servers[0]
+            _plex_connection = (
+                f"http://{server['address']}:{server['port']}", server.get("token", token),
+            )
+    return loop.run_until_complete(plex_service.get_sessions(*_plex_connection))
+
+
+def _admit_volume(volume: str, media_item_id: str) -> bool:
+    """Whether the item's source volume has a free in-flight slot (taking it)."""
+    try:
+        return get_volume_slots().acquire(volume, media_item_id)
+    except Exception as exc:
+        # Like the Plex throttle, the cap only spreads load; never stop processing over it
+        logger.warning("Volume slots unavailable: %s", exc)
+        return True
+
+
+def _release_volume(volume: Optional[str], media_item_id: str):
+    """Give back the item's slot and start whatever waits for it."""
+    if not volume:
+        return
+    try:
+        get_volume_slots().release(volume, media_item_id)
+    except Exception as exc:
+        logger.warning("Could not release volume slot for %s: %s", media_item_id, exc)
+        return
+    _dispatch_waiting(volume)
+
+
+def _wait_for_volume(volume: str, media_item_id: str, priority: int):
+    """Park an item in its volume's queue instead of re-queueing it on a timer."""
+    try:
+        get_volume_slots().wait(volume, media_item_id, priority)
+    except Exception as exc:
+        logger.warning("Could not queue %s for volume %s: %s", media_item_id, volume, exc)
+        return
+    # A slot may have freed between the failed admission and the wait
+    _dispatch_waiting(volume)
+
+
+def _dispatch_waiting(volume: str) -> int:
+    """Start waiting items of ``volume`` while it has free slots; returns how many."""
+    started = 0
+    try:
+        slots = get_volume_slots()
+        while (admitted := slots.admit_next(volume)) is not None:
+            media_item_id, priority = admitted
+            process_media_item.apply_async(args=[media_item_id], priority=celery_priority(priority))
+            started += 1
+    except Exception as exc:
+        logger.warning("Could not dispatch waiting items of volume %s: %s", volume, exc)
+    return started
+
+
+def _dispatch_all_waiting() -> int:
+    """Safety net for slots that expired instead of being released (dead worker)."""
+    try:
+        volumes = get_volume_slots().waiting_volumes()
+    except Exception as exc:
+        logger.warning("Could not list waiting volumes: %s", exc)
+        return 0
+    return sum(_dispatch_waiting(volume) for volume in volumes)
+
+
+# Celery states of a stage task that is running or waiting to retry
+LIVE_TASK_STATES = ("STARTED", "PROGRESS", "RETRY")
+
+
+def _task_live(task_id: Optional[str]) -> bool:
+    """Whether the stage task ``task_id`` is still working on its item."""
+    if not task_id:
+        return False
+    try:
+        return celery_app.AsyncResult(task_id).state in LIVE_TASK_STATES
+    except Exception as exc:
+        # Without the result backend we cannot tell; never start a second pipeline
+        logger.warning("Could not check task %s: %s", task_id, exc)
+        return True
+
+
+def _mark_failed(
+    media_item_id: str, stage: str, exc: Exception, volume: str = None, task_id: str = None,
+):
+    # A retried stage carries on without the slot rather than block its volume
+    _release_volume(volume, media_item_id)
+    db = SyncSession()
+    try:
+        item = db.get(MediaItem, uuid.UUID(media_item_id))
+        title = item.title if item else media_item_id
+        logger.error("Failed %s for '%s': %s", stage, title, exc, exc_info=True)
+        if item:
+            item.processing_status = "failed"
+            if task_id:
+                # The stage retries itself; scans see the task as live and leave the item alone
+                item.processing_task_id = task_id
+            db.commit()
+    finally:
+        db.close()
+
+
+def _update_item(media_item_id: str, **values):
+    """Write progress bookkeeping (stage, progress, task id) for an item."""
+    db = SyncSession()
+    try:
+        db.execute(
+            update(MediaItem).where(MediaItem.id == uuid.UUID(media_item_id)).values(**values)
+        )
+        db.commit()
+    finally:
+        db.close()
+
+
+def _clip_id(plex_rating_key: str, candidate: ClipCandidate) -> str:
+    """Stable clip id for a candidate, so a retried extraction reuses ids and file paths."""
+    return str(uuid.uuid5(CLIP_ID_NAMESPACE, f"{plex_rating_key}:{candidate.start_ms}:{candidate.end_ms}"))
+
+
+def _clip_row(item: MediaItem, scoring: ClipScoringService, clip_id: str, result) -> dict:
+    """Column values for the Clip row of an extracted clip."""
+    candidate = result.candidate
+    decade = f"{(item.year // 10) * 10}s" if item.year else None
+    embedding = scoring.generate_content_embedding(
+        item.genre_tags or [], item.actors or [],
+        item.director or "", decade or "",
+        {"quote_match": candidate.quote_match_score,
+         "audio_energy": candidate.audio_energy_score},
+    )
+    return dict(
+        id=uuid.UUID(clip_id), media_id=item.plex_rating_key, title=item.title,
+        start_time_ms=candidate.start_ms, end_time_ms=candidate.end_ms,
+        duration_ms=candidate.duration_ms, file_path=result.output_path,
+        thumbnail_paths=result.thumbnail_paths,
+        composite_score=scoring.compute_composite_score(candidate),
+        quote_match_score=candidate.quote_match_score,
+        audio_energy_score=candidate.audio_energy_score,
+        scene_composition_score=candidate.scene_composition_score,
+        dialogue_density_score=candidate.dialogue_density_score,
+        temporal_position_score=candidate.temporal_position_score,
+        genre_tags=item.genre_tags, actors=item.actors,
+        director=item.director, decade=decade, embedding=embedding,
+        is_active=True, created_at=datetime.utcnow(),
+    )
+
+
+def _clip_upsert():
+    """Insert for Clip rows that revives a deactivated clip with the same id.
+
+    Clip ids derive from the candidate, so a title that was removed from
+    Plex (deactivating its clips) and comes back regenerates the same ids."""
+    stmt = pg_insert(Clip)
+    return stmt.on_conflict_do_update(
+        index_elements=["id"],
+        set_={
+            column.name: stmt.excluded[column.name]
+            for column in Clip.__table__.columns if column.name not in ("id", "created_at")
+        },
+    )
 
 
 @celery_app.task(bind=True, max_retries=3)
 def process_media_item(self, media_item_id: str):
+    """Check what an item still needs and start its processing pipeline.
+
+    The work itself runs as a chain of stage tasks on dedicated queues:
+    analyze (``analysis``) -> rank (``db``) -> extract (``encode``) ->
+    persist (``db``). Stages pass a small JSON payload; the analysis result
+    travels by reference to its AnalysisCache entry.
+
+    Items arrive on the ``intake`` queue, which workers stop consuming while
+    Plex is streaming (see app.tasks.intake). While its source volume already
+    has its share of items in flight it waits in the volume's queue and is
+    dispatched again when a slot frees up (see VolumeSlots)."""
     db = SyncSession()
     item = None
+    volume = None
     try:
         item = db.execute(
             select(MediaItem).where(MediaItem.id == uuid.UUID(media_item_id))
@@ -57,10 +335,20 @@ def process_media_item(self, media_item_id: str):
             logger.warning("Skipping %s: item not found or no file path", media_item_id)
             return {"status": "skipped", "reason": "item not found or no file path"}
 
+        # A duplicate message (rescan, retry) must not start a second pipeline
+        if item.processing_status == "processing" or _task_live(item.processing_task_id):
+            logger.info("Skipping '%s': already in progress", item.title)
+            return {"status": "skipped", "reason": "already in progress"}
+
+        # A slot may have been taken on the item's behalf by _dispatch_waiting;
+        # every skip below gives it back
+        volume = volume_key(item.file_path)
+
         # Check if file is accessible
         if not os.path.exists(item.file_path):
             item.processing_status = "pending"
             db.commit()
+            _release_volume(volume, media_item_id)
             logger.warning("Skipping '%s': file not accessible: %s", item.title, item.file_path)
             return {"status": "skipped", "reason": f"file not accessible: {item.file_path}"}
 
@@ -77,118 +365,296 @@ def process_media_item(self, media_item_id: str):
             item.clips_generated = existing_count
             item.last_processed = datetime.utcnow()
             db.commit()
+            _release_volume(volume, media_item_id)
             logger.info("Skipping '%s': already has %d/%d clips", item.title, existing_count, max_clips)
             return {"status": "skipped", "reason": f"already has {existing_count}/{max_clips} clips"}
 
         clips_needed = max_clips - existing_count
-        existing_midpoints = _existing_clip_midpoints(db, item.plex_rating_key)
-
+        if not _admit_volume(volume, media_item_id):
+            _wait_for_volume(volume, media_item_id, item.priority or 0)
+            logger.info("'%s' waits for a slot: volume %s is busy", item.title, volume)
+            return {"status": "waiting", "volume": volume}
         logger.info("Processing '%s' (%s) — need %d clips", item.title, item.media_type, clips_needed)
 
-        item.processing_status = "processing"
+        # Claim the item; of two workers holding messages for it only one wins
+        analysis_task_id = str(uuid.uuid4())
+        claimed = db.execute(
+            update(MediaItem)
+            .where(MediaItem.id == item.id, MediaItem.processing_status != "processing")
+            .values(processing_status="processing", processing_task_id=analysis_task_id)
+            .execution_options(synchronize_session=False)
+        ).rowcount
         db.commit()
+        if not claimed:
+            logger.info("Skipping '%s': claimed by another worker", item.title)
+            return {"status": "skipped", "reason": "already in progress"}
+
+        payload = {
+            "media_item_id": media_item_id,
+            "plex_rating_key": item.plex_rating_key,
+            "title": item.title,
+            "media_type": item.media_type,
+            "year": item.year,
+            "file_path": item.file_path,
+            "duration_ms": item.duration_ms or 7200000,
+            "clips_needed": clips_needed,
+            "existing_count": existing_count,
+            "volume": volume,
+        }
+        priority = celery_priority(item.priority or 0)
+        chain(
+            analyze_media_item.s(payload).set(priority=priority, task_id=analysis_task_id),
+            rank_clip_candidates.s().set(priority=priority),
+            extract_media_clips.s().set(priority=priority),
+            persist_media_clips.s().set(priority=priority),
+        ).apply_async()
+        return {"status": "queued", "clips_needed": clips_needed}
 
+    except Exception as exc:
+        db.rollback()
+        _release_volume(volume, media_item_id)
+        title = item.title if item else media_item_id
+        logger.error("Failed processing '%s': %s", title, exc, exc_info=True)
+        if item:
+            item.processing_status = "failed"
+            db.commit()
+        raise self.retry(exc=exc, countdown=60)
+    finally:
+        db.close()
+
+
+@celery_app.task(bind=True, max_retries=3)
+def analyze_media_item(self, payload: dict) -> dict:
+    """Stage 1 (analysis queue): decode the source once, or reuse a cached analysis."""
+    title = payload["title"]
+    try:
         engine = ClipEngine()
-        scoring = ClipScoringService()
+        cache = AnalysisCache()
+        fingerprint = fingerprint_file(payload["file_path"])
+
+        targeted = settings.analysis_mode == "targeted"
+        analysis = None
+        if settings.analysis_cache_enabled:
+            profile = settings.scene_analysis_profile
+            # A full analysis covers every window a targeted one would decode
+            if targeted:
+                analysis = cache.get(fingerprint, f"{profile}-targeted")
+            analysis = analysis or cache.get(fingerprint, profile)
+            logger.info(
+                "  [%s] Analysis cache %s (hits=%d misses=%d)", title,
+                "hit" if analysis else "miss", cache.stats["hits"], cache.stats["misses"],
+            )
+        analysis_cached = analysis is not None
+        if analysis_cached:
+            analysis_ref = cache.entry_path(fingerprint, analysis.cache_variant)
+        else:
+            logger.info("  [%s] Analyzing media (subtitles, scenes, audio)...", title)
+            _update_item(
+                payload["media_item_id"], processing_task_id=self.request.id,
+                processing_stage="analysis", processing_progress=0.0,
+            )
 
-        logger.info("  [%s] Extracting subtitles...", item.title)
-        subtitles = engine.extract_subtitles(item.file_path)
-        logger.info("  [%s] Subtitles: %d entries", item.title, len(subtitles))
+            def report(fraction: float):
+                self.update_state(state="PROGRESS", meta={
+                    "media_item_id": payload["media_item_id"],
+                    "stage": "analysis",
+                    "progress": round(fraction, 3),
+                })
+
+            # Subtitles survive a change of scene profile or analysis mode
+            source = subtitle_source(payload["file_path"])
+            subtitles = cache.get_subtitles(fingerprint, source) if settings.analysis_cache_enabled else None
+            with ScratchStaging().stage(payload["file_path"], fingerprint) as media_path:
+                if targeted:
+                    analysis = engine.analyze_media_targeted(
+                        media_path, payload.get("duration_ms"), progress=report,
+                        subtitle_entries=subtitles,
+                    )
+                else:
+                    analysis = engine.analyze_media(
+                        media_path, duration_ms=payload.get("duration_ms"), progress=report,
+                        subtitle_entries=subtitles,
+                    )
+            if subtitles is None and analysis.complete:
+                cache.put_subtitles(fingerprint, source, analysis.subtitles)
+            analysis_ref = cache.stash(fingerprint, analysis)
+            if analysis_ref is None:
+                raise RuntimeError("could not store analysis for the next stage")
+        logger.info(
+            "  [%s] Subtitles: %d entries, scene changes: %d, audio energy: %d hops "
+            "(%.1fs, scene profile: %s, windows: %s)",
+            title, len(analysis.subtitles), len(analysis.scene_changes), len(analysis.audio_energy),
+            analysis.wall_time_s, analysis.scene_profile, len(analysis.windows) or "full",
+        )
+        return {
+            **payload,
+            "analysis_ref": analysis_ref,
+            "fingerprint": asdict(fingerprint),
+            "analysis_seconds": analysis.wall_time_s,
+            "scene_profile": analysis.scene_profile,
+            "analysis_cached": analysis_cached,
+        }
+    except Exception as exc:
+        _mark_failed(payload["media_item_id"], "analysis", exc, payload.get("volume"), self.request.id)
+        raise self.retry(exc=exc, countdown=60)
 
-        logger.info("  [%s] Detecting scene changes...", item.title)
-        scene_changes = engine.detect_scene_changes(item.file_path)
-        logger.info("  [%s] Scene changes: %d detected", item.title, len(scene_changes))
 
-        logger.info("  [%s] Analyzing audio energy...", item.title)
-        audio_energy = engine.analyze_audio_energy(item.file_path)
-        logger.info("  [%s] Audio energy: %d samples", item.title, len(audio_energy))
+@celery_app.task(bind=True, max_retries=3)
+def rank_clip_candidates(self, payload: dict) -> dict:
+    """Stage 2 (db queue): build candidates, drop overlaps with existing clips, keep the best."""
+    title = payload["title"]
+    _update_item(payload["media_item_id"], processing_stage="ranking", processing_progress=None)
+    db = SyncSession()
+    try:
+        analysis = AnalysisCache().load(payload["analysis_ref"])
+        if analysis is None:
+            raise RuntimeError(f"analysis {payload['analysis_ref']} is gone")
 
-        total_duration = item.duration_ms or 7200000
+        engine = ClipEngine()
+        scoring = ClipScoringService()
+        existing = _existing_clip_intervals(db, payload["plex_rating_key"])
+
+        quotes = _popular_quotes(payload)
         candidates = engine.identify_clip_candidates(
-            subtitles, scene_changes, audio_energy, total_duration,
+            analysis.subtitles, analysis.scene_changes, analysis.audio_energy, payload["duration_ms"],
+            popular_quotes=quotes, audio_hop_ms=analysis.audio_hop_ms, windows=analysis.windows,
         )
-        logger.info("  [%s] Candidates identified: %d", item.title, len(candidates))
-
-        # Filter out candidates that overlap with existing clips
-        if existing_midpoints:
-            before = len(candidates)
-            candidates = [
-                c for c in candidates
-                if not _overlaps_existing(c.start_ms, c.end_ms, existing_midpoints)
-            ]
-            logger.info("  [%s] After overlap filter: %d (removed %d)", item.title, len(candidates), before - len(candidates))
+        logger.info("  [%s] Candidates identified: %d", title, len(candidates))
 
-        # Rank and take only what we need
-        ranked = scoring.rank_candidates(candidates, clips_needed)
-        logger.info("  [%s] Extracting %d clips...", item.title, len(ranked))
+        # Rank, dropping near-duplicates of each other and of existing clips
+        ranked = scoring.rank_candidates(candidates, payload["clips_needed"], existing=existing)
+        logger.info("  [%s] Selected %d clips (%d existing)", title, len(ranked), len(existing))
+        return {**payload, "candidates": [asdict(c) for c in ranked]}
+    except Exception as exc:
+        db.rollback()
+        _mark_failed(payload["media_item_id"], "ranking", exc, payload.get("volume"), self.request.id)
+        raise self.retry(exc=exc, countdown=60)
+    finally:
+        db.close()
 
-        clips_dir = os.path.join(settings.clip_storage_path, str(item.plex_rating_key))
-        os.makedirs(clips_dir, exist_ok=True)
 
-        clips_created = 0
-        for i, candidate in enumerate(ranked):
-            clip_id = uuid.uuid4()
-            clip_path = os.path.join(clips_dir, f"{clip_id}.mp4")
+@celery_app.task(bind=True, max_retries=3)
+def extract_media_clips(self, payload: dict) -> dict:
+    """Stage 3 (encode queue): write the clip MP4s and thumbnails, checkpointing as it goes.
+
+    Each extraction batch is inserted as soon as its files exist, so a
+    retry only redoes clips that were never persisted. Clip ids derive from
+    the candidate, so a redone clip overwrites its own file instead of
+    leaving an orphan."""
+    title = payload["title"]
+    media_item_id = payload["media_item_id"]
+    db = SyncSession()
+    try:
+        item = db.get(MediaItem, uuid.UUID(media_item_id))
+        ranked = [ClipCandidate(**c) for c in payload["candidates"]]
+        clip_ids = [_clip_id(payload["plex_rating_key"], c) for c in ranked]
+        persisted = set()
+        if clip_ids:
+            persisted = {
+                str(clip_id) for clip_id in db.execute(
+                    select(Clip.id).where(
+                        Clip.id.in_([uuid.UUID(c) for c in clip_ids]), Clip.is_active == True
+                    )
+                ).scalars()
+            }
+        pending = [(clip_id, c) for clip_id, c in zip(clip_ids, ranked) if clip_id not in persisted]
+        if persisted:
+            logger.info("  [%s] Resuming: %d/%d clips already persisted", title, len(persisted), len(ranked))
+        logger.info("  [%s] Extracting %d clips...", title, len(pending))
+
+        item.processing_task_id = self.request.id
+        item.processing_stage = "extraction"
+        item.processing_progress = len(persisted) / len(ranked) if ranked else 1.0
+        db.commit()
 
-            success = engine.extract_clip(
-                item.file_path, clip_path, candidate.start_ms, candidate.end_ms,
-            )
+        engine = ClipEngine()
+        scoring = ClipScoringService()
+        cache = AnalysisCache() if settings.analysis_cache_enabled else None
+        fingerprint = MediaFingerprint(**payload["fingerprint"])
 
-            if success:
-                thumb_dir = os.path.join(clips_dir, str(clip_id))
-                mid_point = candidate.start_ms + (candidate.duration_ms // 2)
-                thumbs = engine.generate_thumbnails(
-                    item.file_path, thumb_dir,
-                    [candidate.start_ms, mid_point, candidate.end_ms - 1000],
-                )
-                decade = f"{(item.year // 10) * 10}s" if item.year else None
-                embedding = scoring.generate_content_embedding(
-                    item.genre_tags or [], item.actors or [],
-                    item.director or "", decade or "",
-                    {"quote_match": candidate.quote_match_score,
-                     "audio_energy": candidate.audio_energy_score},
+        clips_dir = os.path.join(settings.clip_storage_path, payload["plex_rating_key"])
+        os.makedirs(clips_dir, exist_ok=True)
+        ids_by_path = {os.path.join(clips_dir, f"{clip_id}.mp4"): clip_id for clip_id, _ in pending}
+        done = len(persisted)
+        created = 0
+
+        def checkpoint(results):
+            nonlocal done, created
+            rows = [
+                _clip_row(item, scoring, ids_by_path[r.output_path], r) for r in results if r.success
+            ]
+            if rows:
+                db.execute(_clip_upsert(), rows)
+            for r in results:
+                if not r.success:
+                    logger.warning("  [%s] Clip extraction failed (%s)", title, os.path.basename(r.output_path))
+            done += len(results)
+            created += len(rows)
+            item.processing_progress = done / len(ranked)
+            db.commit()
+
+        extracted = []
+        if pending:
+            with ScratchStaging().stage(payload["file_path"], fingerprint) as media_path:
+                keyframes = (
+                    _keyframe_index(engine, cache, fingerprint, media_path)
+                    if settings.clip_smart_cut else None
                 )
-                composite = scoring.compute_composite_score(candidate)
-
-                clip = Clip(
-                    id=clip_id, media_id=item.plex_rating_key, title=item.title,
-                    start_time_ms=candidate.start_ms, end_time_ms=candidate.end_ms,
-                    duration_ms=candidate.duration_ms, file_path=clip_path,
-                    thumbnail_paths=thumbs, composite_score=composite,
-                    quote_match_score=candidate.quote_match_score,
-                    audio_energy_score=candidate.audio_energy_score,
-                    scene_composition_score=candidate.scene_composition_score,
-                    dialogue_density_score=candidate.dialogue_density_score,
-                    temporal_position_score=candidate.temporal_position_score,
-                    genre_tags=item.genre_tags, actors=item.actors,
-                    director=item.director, decade=decade, embedding=embedding,
+                extracted = engine.extract_clips(
+                    media_path, [c for _, c in pending], list(ids_by_path),
+                    keyframes=keyframes, on_batch=checkpoint,
                 )
-                db.add(clip)
-                clips_created += 1
-            else:
-                logger.warning("  [%s] Clip %d/%d extraction failed", item.title, i + 1, len(ranked))
+        logger.info(
+            "  [%s] %d/%d clips stream-copied on keyframes", title,
+            sum(1 for r in extracted if r.stream_copied), len(extracted),
+        )
+        logger.info("  [%s] Checkpointed %d new clips", title, created)
+        return {**payload, "clips_failed": sum(1 for r in extracted if not r.success)}
+    except Exception as exc:
+        db.rollback()
+        _mark_failed(media_item_id, "extraction", exc, payload.get("volume"), self.request.id)
+        raise self.retry(exc=exc, countdown=60)
+    finally:
+        db.close()
+
+
+@celery_app.task(bind=True, max_retries=3)
+def persist_media_clips(self, payload: dict) -> dict:
+    """Stage 4 (db queue): mark the item completed once its clips are checkpointed."""
+    title = payload["title"]
+    db = SyncSession()
+    try:
+        item = db.get(MediaItem, uuid.UUID(payload["media_item_id"]))
+        total_clips = db.execute(
+            select(func.count()).select_from(Clip).where(
+                Clip.media_id == item.plex_rating_key, Clip.is_active == True
+            )
+        ).scalar() or 0
+        clips_created = max(0, total_clips - payload["existing_count"])
 
-        total_clips = existing_count + clips_created
         item.processing_status = "completed"
+        item.processing_stage = None
+        item.processing_progress = None
+        item.processing_task_id = None
         item.clips_generated = total_clips
         item.last_processed = datetime.utcnow()
 
         db.commit()
-        logger.info("Completed '%s': %d clips created (%d total)", item.title, clips_created, total_clips)
+        _release_volume(payload.get("volume"), payload["media_item_id"])
+        logger.info("Completed '%s': %d clips created (%d total)", title, clips_created, total_clips)
         return {
             "status": "completed",
             "clips_created": clips_created,
-            "clips_existing": existing_count,
+            "clips_existing": payload["existing_count"],
             "clips_total": total_clips,
+            "clips_failed": payload.get("clips_failed", 0),
+            "analysis_seconds": payload["analysis_seconds"],
+            "scene_profile": payload["scene_profile"],
+            "analysis_cached": payload["analysis_cached"],
         }
-
     except Exception as exc:
         db.rollback()
-        title = item.title if item else media_item_id
-        logger.error("Failed processing '%s': %s", title, exc, exc_info=True)
-        if item:
-            item.processing_status = "failed"
-            db.commit()
+        _mark_failed(payload["media_item_id"], "persisting", exc, payload.get("volume"), self.request.id)
         raise self.retry(exc=exc, countdown=60)
     finally:
         db.close()
@@ -207,7 +673,7 @@ def discover_libraries(user_id: str):
             return {"status": "error", "reason": "user not found"}
 
         plex_service = PlexService()
-        loop = asyncio.new_event_loop()
+        loop = _event_loop()
         servers = loop.run_until_complete(plex_service.get_servers(user.plex_token))
 
         libraries_found = 0
@@ -244,8 +710,6 @@ def discover_libraries(user_id: str):
                     plex_lib.last_scanned = datetime.utcnow()
 
                 libraries_found += 1
-
-        loop.close()
         db.commit()
         return {"status": "completed", "libraries_found": libraries_found}
     except Exception as exc:
@@ -255,13 +719,249 @@ def discover_libraries(user_id: str):
         db.close()
 
 
+def _sync_library_items(
+    db, plex_lib: PlexLibrary, items: list[dict], taste: tuple[set[str], set[str]],
+) -> dict:
+    """Reconcile one library's Plex items with MediaItem rows in a fixed number of statements.
+
+    Existing rows come from one keyed query and the active clip counts of
+    completed items from one GROUP BY; new items are bulk-inserted with
+    ON CONFLICT DO NOTHING so an overlapping scan cannot trip the unique
+    rating key. Returns the items to queue and the counts scan_library reports."""
+    taste_keys, taste_titles = taste
+    by_key = {d["rating_key"]: d for d in items if d.get("rating_key")}
+    existing: dict[str, MediaItem] = {}
+    if by_key:
+        existing = {
+            m.plex_rating_key: m for m in db.execute(
+                select(MediaItem).where(MediaItem.plex_rating_key.in_(list(by_key)))
+            ).scalars()
+        }
+    completed_keys = [k for k, m in existing.items() if m.processing_status == "completed"]
+    clip_counts: dict[str, int] = {}
+    if completed_keys:
+        clip_counts = dict(db.execute(
+            select(Clip.media_id, func.count()).where(
+                Clip.media_id.in_(completed_keys), Clip.is_active == True,
+            ).group_by(Clip.media_id)
+        ).all())
+
+    def in_taste(key: str, title: str) -> bool:
+        return key in taste_keys or title.split(" - ")[0] in taste_titles
+
+    to_process: list[MediaItem] = []
+    new_rows: list[dict] = []
+    skipped = 0
+    for key, item_data in by_key.items():
+        existing_item = existing.get(key)
+        if existing_item is None:
+            # Brand new item
+            added_at = _plex_timestamp(item_data.get("added_at"))
+            new_rows.append({
+                "plex_rating_key": key,
+                "title": item_data["title"], "media_type": item_data["type"],
+                "year": item_data.get("year"), "genre_tags": item_data.get("genres", []),
+                "actors": item_data.get("actors", []),
+                "director": item_data.get("director"),
+                "duration_ms": item_data.get("duration"),
+                "poster_url": item_data.get("poster"),
+                "content_rating": item_data.get("content_rating"),
+                "file_path": item_data.get("file_path"),
+                "library_id": plex_lib.id,
+                "plex_added_at": added_at,
+                "priority": compute_priority(added_at, 0, in_taste(key, item_data["title"])),
+            })
+            continue
+
+        if existing_item.plex_added_at is None:
+            existing_item.plex_added_at = _plex_timestamp(item_data.get("added_at"))
+        existing_item.library_id = plex_lib.id
+        if item_data.get("file_path") and existing_item.file_path != item_data["file_path"]:
+            # Replaced or moved file (an updatedAt change)
+            existing_item.file_path = item_data["file_path"]
+            existing_item.duration_ms = item_data.get("duration")
+
+        if existing_item.processing_status in ("pending", "failed"):
+            # Retry failed/pending items
+            to_process.append(existing_item)
+        elif existing_item.processing_status == "completed":
+            # Check if we need more clips (diff check)
+            max_clips = (
+                settings.clips_per_movie
+                if existing_item.media_type == "movie"
+                else settings.clips_per_episode
+            )
+            if clip_counts.get(key, 0) < max_clips:
+                # Need more clips — re-queue
+                existing_item.processing_status = "pending"
+                to_process.append(existing_item)
+            else:
+                skipped += 1
+
+    # Priority: recently added, clip-less and taste-profile titles first (CE-07)
+    for media_item in to_process:
+        media_item.priority = compute_priority(
+            media_item.plex_added_at, media_item.clips_generated,
+            in_taste(media_item.plex_rating_key, media_item.title),
+        )
+    inserted: list[MediaItem] = []
+    if new_rows:
+        inserted = db.scalars(
+            pg_insert(MediaItem)
+            .on_conflict_do_nothing(index_elements=["plex_rating_key"])
+            .returning(MediaItem),
+            new_rows,
+        ).all()
+
+    return {
+        "to_process": to_process + list(inserted),
+        "new": len(inserted),
+        "skipped": skipped,
+    }
+
+
+def _reconcile_library(db, plex_lib: PlexLibrary, listed_keys: set[str]) -> int:
+    """Drop items a full listing of ``plex_lib`` no longer has (deleted in Plex).
+
+    Their clips are deactivated rather than deleted. Returns the number removed."""
+    known = db.execute(
+        select(MediaItem.plex_rating_key).where(MediaItem.library_id == plex_lib.id)
+    ).scalars().all()
+    gone = [key for key in known if key not in listed_keys]
+    if gone:
+        db.execute(
+            update(Clip).where(Clip.media_id.in_(gone)).values(is_active=False)
+            .execution_options(synchronize_session=False)
+        )
+        db.execute(
+            delete(MediaItem).where(MediaItem.plex_rating_key.in_(gone))
+            .execution_options(synchronize_session=False)
+        )
+        logger.info("Removed %d items deleted from Plex library %s", len(gone), plex_lib.library_title)
+    return len(gone)
+
+
+def _unlisted_retries(db, plex_lib: PlexLibrary, listed_keys: set[str]) -> list[MediaItem]:
+    """Pending and failed items of ``plex_lib`` a delta listing did not include."""
+    return db.execute(
+        select(MediaItem).where(
+            MediaItem.library_id == plex_lib.id,
+            MediaItem.processing_status.in_(("pending", "failed")),
+            MediaItem.plex_rating_key.notin_(list(listed_keys)),
+        )
+    ).scalars().all()
+
+
+def _recover_stale_items(db) -> int:
+    """Reset items whose pipeline or queue message was lost back to pending.
+
+    A "processing" item is stale once nothing has touched it for 2 hours and
+    its stage task is no longer running; a "queued" item once it has waited
+    a whole reconcile interval (its message was likely lost with the broker)."""
+    now = datetime.utcnow()
+    stale_cutoff = now - timedelta(hours=2)
+    queued_cutoff = now - timedelta(hours=settings.plex_reconcile_interval_h)
+    candidates = db.execute(
+        select(MediaItem.id, MediaItem.processing_status, MediaItem.processing_task_id).where(
+            or_(
+                and_(MediaItem.processing_status == "processing",
+                     or_(MediaItem.updated_at < stale_cutoff, MediaItem.updated_at == None)),
+                and_(MediaItem.processing_status == "queued", MediaItem.updated_at < queued_cutoff),
+            )
+        )
+    ).all()
+    stale = [
+        row[0] for row in candidates if row[1] == "queued" or not _task_live(row[2])
+    ]
+    if stale:
+        db.execute(
+            update(MediaItem).where(MediaItem.id.in_(stale))
+            .values(processing_status="pending", processing_task_id=None)
+            .execution_options(synchronize_session=False)
+        )
+        db.commit()
+    return len(stale)
+
+
+def _queue_items(db, items: list[MediaItem], volumes: VolumeKeys) -> int:
+    """Commit ``items`` and queue their pipelines; returns how many were queued.
+
+    Queued items are marked "queued" so later scans do not dispatch them again."""
+    for m in items:
+        m.processing_status = "queued"
+    items = sorted(items, key=lambda m: (m.priority, m.plex_added_at or datetime.min), reverse=True)
+    # Within each priority, alternate between source volumes so workers
+    # pulling consecutive items read from different drives
+    dispatch = [
+        (str(m.id), m.priority)
+        for _, band in groupby(items, key=lambda m: m.priority)
+        for m in round_robin(band, key=lambda m: volumes(m.file_path))
+    ]
+
+    # Commit items to DB BEFORE queuing tasks so workers can find them
+    db.commit()
+    for item_id, priority in dispatch:
+        process_media_item.apply_async(args=[item_id], priority=celery_priority(priority))
+    return len(dispatch)
+
+
+def _iter_pages(loop, pages):
+    """Drive the async generator ``pages`` from synchronous code on ``loop``."""
+    while True:
+        try:
+            yield loop.run_until_complete(pages.__anext__())
+        except StopAsyncIteration:
+            return
+
+
+def _processed_count(db, plex_lib: PlexLibrary) -> int:
+    return db.execute(
+        select(func.count()).select_from(MediaItem).where(
+            MediaItem.library_id == plex_lib.id,
+            MediaItem.processing_status == "completed",
+        )
+    ).scalar() or 0
+
+
+def _plex_epoch(value: Optional[datetime]) -> Optional[int]:
+    return int((value - datetime(1970, 1, 1)).total_seconds()) if value else None
+
+
+def _delta_since(watermark: Optional[datetime]) -> Optional[int]:
+    """Filter value for a delta listing: the watermark, rewound a little."""
+    epoch = _plex_epoch(watermark)
+    return epoch - DELTA_OVERLAP_S if epoch is not None else None
+
+
+def _advance_watermarks(plex_lib: PlexLibrary, items: Iterable[dict]):
+    """Move the library's watermarks to the newest timestamps Plex reported.
+
+    Plex's own clock is used rather than ours so skew cannot hide items."""
+    for field, attr in (("added_at", "added_watermark"), ("updated_at", "updated_watermark")):
+        newest = max((int(d[field]) for d in items if d.get(field)), default=None)
+        current = _plex_epoch(getattr(plex_lib, attr))
+        if newest is not None and (current is None or newest > current):
+            setattr(plex_lib, attr, _plex_timestamp(newest))
+
+
 @celery_app.task
-def scan_library(user_id: str):
+def scan_library(user_id: str, full: bool = False):
     """Phase 2: Process only enabled libraries — fetch items and queue clip generation.
     Commits items to DB first, THEN queues Celery tasks so workers can find them.
 
     Diff-aware: only queues items that need clips generated. Skips items that
     already have the expected number of clips. Recovers stuck 'processing' items.
+    Listings are consumed page by page: each page is saved, committed and
+    queued before the next, in a fixed handful of set-based statements (see
+    _sync_library_items) however many items it holds. A library whose
+    listing fails part way keeps the pages already saved but is not
+    reconciled and its watermarks stay put.
+
+    Incremental: a library with watermarks only lists items Plex added or
+    updated since the last scan. A full listing runs when ``full`` is set,
+    on a library's first scan and every ``plex_reconcile_interval_h``; it
+    also removes items deleted from Plex and re-queues completed items that
+    are short of clips.
     """
     db = SyncSession()
     try:
@@ -272,43 +972,29 @@ def scan_library(user_id: str):
             return {"status": "error", "reason": "user not found"}
 
         plex_service = PlexService()
-        loop = asyncio.new_event_loop()
+        loop = _event_loop()
         servers = loop.run_until_complete(plex_service.get_servers(user.plex_token))
 
         # Get enabled libraries from DB
-        enabled_libs = db.execute(
-            select(PlexLibrary).where(PlexLibrary.enabled == True)
-        ).scalars().all()
-        enabled_keys = {(lib.server_id, lib.library_key) for lib in enabled_libs}
-
-        # Recover stuck items: reset "processing" items older than 2 hours
-        stale_cutoff = datetime.utcnow() - timedelta(hours=2)
-        stale_items = db.execute(
-            select(MediaItem).where(
-                MediaItem.processing_status == "processing",
-                MediaItem.last_processed < stale_cutoff,
-            )
-        ).scalars().all()
-        for stale in stale_items:
-            stale.processing_status = "pending"
-
-        # Also reset items stuck in "processing" with no last_processed timestamp
-        stuck_items = db.execute(
-            select(MediaItem).where(
-                MediaItem.processing_status == "processing",
-                MediaItem.last_processed == None,
-            )
-        ).scalars().all()
-        for stuck in stuck_items:
-            stuck.processing_status = "pending"
+        enabled_libs = {
+            (lib.server_id, lib.library_key): lib
+            for lib in db.execute(
+                select(PlexLibrary).where(PlexLibrary.enabled == True)
+            ).scalars().all()
+        }
 
-        if stale_items or stuck_items:
-            db.commit()
+        items_recovered = _recover_stale_items(db)
+        _dispatch_all_waiting()
+
+        taste = _taste_selection_keys(db)
 
-        # Phase 1: Collect all items and save to DB
-        item_ids_to_process = []
+        # Items are saved and queued one listing page at a time
+        volumes = VolumeKeys()
+        items_queued = 0
         items_skipped = 0
         items_new = 0
+        items_removed = 0
+        reconcile_cutoff = datetime.utcnow() - timedelta(hours=settings.plex_reconcile_interval_h)
 
         for server in servers:
             server_token = server.get("token", user.plex_token)
@@ -318,106 +1004,82 @@ def scan_library(user_id: str):
             )
 
             for lib_info in libraries:
-                key = (server["server_id"], lib_info["library_key"])
-                if key not in enabled_keys:
+                plex_lib = enabled_libs.get((server["server_id"], lib_info["library_key"]))
+                if plex_lib is None:
                     continue
 
-                plex_lib = db.execute(
-                    select(PlexLibrary).where(
-                        PlexLibrary.server_id == server["server_id"],
-                        PlexLibrary.library_key == lib_info["library_key"],
-                    )
-                ).scalar_one_or_none()
-
-                if plex_lib:
-                    plex_lib.total_items = lib_info.get("total_items", 0)
-                    plex_lib.last_scanned = datetime.utcnow()
-
-                # Fetch items — pass library_type so episodes are fetched for shows
-                items = loop.run_until_complete(
-                    plex_service.get_library_items(
-                        server_url, server_token, lib_info["library_key"],
-                        library_type=lib_info["library_type"],
-                    )
+                plex_lib.total_items = lib_info.get("total_items", 0)
+                plex_lib.last_scanned = datetime.utcnow()
+                delta = not full and plex_lib.updated_watermark is not None and (
+                    plex_lib.last_reconciled is not None and plex_lib.last_reconciled > reconcile_cutoff
                 )
 
-                for item_data in items:
-                    existing = db.execute(
-                        select(MediaItem).where(
-                            MediaItem.plex_rating_key == item_data["rating_key"]
-                        )
-                    ).scalar_one_or_none()
-
-                    if not existing:
-                        # Brand new item
-                        media_item = MediaItem(
-                            plex_rating_key=item_data["rating_key"],
-                            title=item_data["title"], media_type=item_data["type"],
-                            year=item_data.get("year"), genre_tags=item_data.get("genres", []),
-                            actors=item_data.get("actors", []),
-                            director=item_data.get("director"),
-                            duration_ms=item_data.get("duration"),
-                            poster_url=item_data.get("poster"),
-                            content_rating=item_data.get("content_rating"),
-                            file_path=item_data.get("file_path"),
-                        )
-                        db.add(media_item)
-                        db.flush()
-                        item_ids_to_process.append(str(media_item.id))
-                        items_new += 1
-
-                    elif existing.processing_status in ("pending", "failed"):
-                        # Retry failed/pending items
-                        item_ids_to_process.append(str(existing.id))
-
-                    elif existing.processing_status == "completed":
-                        # Check if we need more clips (diff check)
-                        max_clips = (
-                            settings.clips_per_movie
-                            if existing.media_type == "movie"
-                            else settings.clips_per_episode
-                        )
-                        actual_clips = db.execute(
-                            select(func.count()).select_from(Clip).where(
-                                Clip.media_id == existing.plex_rating_key,
-                                Clip.is_active == True,
-                            )
-                        ).scalar() or 0
-
-                        if actual_clips < max_clips:
-                            # Need more clips — re-queue
-                            existing.processing_status = "pending"
-                            item_ids_to_process.append(str(existing.id))
-                        else:
-                            items_skipped += 1
-
-                # Update processed count
-                if plex_lib:
-                    processed = db.execute(
-                        select(func.count()).select_from(MediaItem).where(
-                            MediaItem.processing_status == "completed",
+                # Fetch items — pass library_type so episodes are fetched for shows.
+                # Watermarks are rewound a little: re-listing an item is harmless
+                pages = plex_service.iter_library_items(
+                    server_url, server_token, lib_info["library_key"],
+                    library_type=lib_info["library_type"],
+                    added_since=_delta_since(plex_lib.added_watermark) if delta else None,
+                    updated_since=_delta_since(plex_lib.updated_watermark) if delta else None,
+                )
+                listed: dict[str, dict] = {}
+                try:
+                    for page in _iter_pages(loop, pages):
+                        synced = _sync_library_items(db, plex_lib, page, taste)
+                        items_new += synced["new"]
+                        items_skipped += synced["skipped"]
+                        items_queued += _queue_items(db, synced["to_process"], volumes)
+                        listed.update(
+                            (d["rating_key"], {"added_at": d.get("added_at"), "updated_at": d.get("updated_at")})
+                            for d in page
                         )
-                    ).scalar() or 0
-                    plex_lib.processed_items = processed
-
-        loop.close()
-
-        # Commit all items to DB BEFORE queuing tasks
-        db.commit()
+                except PlexListingError as exc:
+                    # Pages already saved stay, but a partial or shifting listing
+                    # must not reconcile deletions; the next scan lists it again
+                    logger.warning("Listing %s stopped early: %s", plex_lib.library_title, exc)
+                    plex_lib.processed_items = _processed_count(db, plex_lib)
+                    db.commit()
+                    continue
 
-        # Phase 2: Now queue tasks — workers will find committed items
-        for item_id in item_ids_to_process:
-            process_media_item.delay(item_id)
+                if delta:
+                    items_queued += _queue_items(db, _unlisted_retries(db, plex_lib, set(listed)), volumes)
+                elif listed:
+                    # An empty full listing is more likely a failed request than an empty library
+                    items_removed += _reconcile_library(db, plex_lib, set(listed))
+                    plex_lib.last_reconciled = datetime.utcnow()
+                _advance_watermarks(plex_lib, listed.values())
+                plex_lib.processed_items = _processed_count(db, plex_lib)
+                db.commit()
 
         return {
             "status": "completed",
-            "items_queued": len(item_ids_to_process),
+            "items_queued": items_queued,
             "items_new": items_new,
             "items_skipped": items_skipped,
-            "items_recovered": len(stale_items) + len(stuck_items),
+            "items_recovered": items_recovered,
+            "items_removed": items_removed,
         }
     except Exception as exc:
         db.rollback()
         return {"status": "error", "reason": str(exc)}
     finally:
         db.close()
+
+
+@celery_app.task
+def delta_scan_libraries():
+    """Periodic incremental library scan, scheduled by celery beat.
+
+    Runs scan_library with the first signed-in user's Plex token; libraries
+    due for reconciliation get their full listing as part of it."""
+    db = SyncSession()
+    try:
+        user_id = db.execute(
+            select(User.id).where(User.is_active == True, User.plex_token != None)
+            .order_by(User.created_at).limit(1)
+        ).scalar()
+    finally:
+        db.close()
+    if user_id is None:
+        return {"status": "skipped", "reason": "no signed-in user"}
+    return scan_library(str(user_id))
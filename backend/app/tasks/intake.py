@@ -0,0 +1,107 @@
+"""Plex-aware gate on the intake queue.
+
+New items reach the pipeline only through process_media_item on the intake
+queue. Instead of every queued item re-checking the Plex throttle and
+re-publishing itself while Plex is busy, each worker consuming the intake
+queue runs one IntakeGate that stops and resumes consuming it: closed while
+Plex is transcoding, open while idle, and opened for a single item per slow
+interval while Plex is direct-playing. The backlog stays in the broker
+untouched until the gate opens.
+"""
+import logging
+import threading
+from typing import Optional
+from celery.signals import task_received, worker_ready, worker_shutdown
+from app.config import get_settings
+from app.services.plex_throttle import SLOW, PlexThrottle, get_throttle
+from app.tasks.celery_app import INTAKE_QUEUE, celery_app
+
+logger = logging.getLogger(__name__)
+
+settings = get_settings()
+
+INTAKE_TASK = "app.tasks.clip_processing.process_media_item"
+
+
+class IntakeGate:
+    """Opens and closes one worker's intake consumer as Plex playback allows."""
+
+    def __init__(self, app, hostname: str, throttle: PlexThrottle, queue: str = INTAKE_QUEUE):
+        self.app = app
+        self.hostname = hostname
+        self.throttle = throttle
+        self.queue = queue
+        # Workers start out consuming every queue they were given
+        self.is_open = True
+        # Close again after the next intake task (slow mode lets one through)
+        self.one_shot = False
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def step(self) -> float:
+        """Re-check the throttle; returns seconds until the next check."""
+        try:
+            delay = self.throttle.admit()
+            level = self.throttle.current().level
+        except Exception as exc:
+            # The throttle protects playback; it must never stop processing outright
+            logger.warning("Plex throttle unavailable: %s", exc)
+            delay, level = 0, None
+        self.one_shot = delay == 0 and level == SLOW
+        self._set_open(delay == 0)
+        return max(1, min(delay or settings.plex_throttle_poll_s, settings.plex_throttle_poll_s))
+
+    def on_received(self, task_name: str):
+        if self.one_shot and task_name == INTAKE_TASK:
+            self.one_shot = False
+            self._set_open(False)
+
+    def _set_open(self, is_open: bool):
+        if is_open == self.is_open:
+            return
+        control = self.app.control
+        if is_open:
+            control.add_consumer(self.queue, destination=[self.hostname])
+        else:
+            control.cancel_consumer(self.queue, destination=[self.hostname])
+        self.is_open = is_open
+        logger.info("Intake %s on %s", "resumed" if is_open else "paused", self.hostname)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="intake-gate", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.step()):
+            pass
+
+
+_gate: Optional[IntakeGate] = None
+
+
+@worker_ready.connect
+def _start_gate(sender=None, **kwargs):
+    global _gate
+    if not settings.plex_throttle_enabled or sender is None:
+        return
+    if INTAKE_QUEUE not in sender.app.amqp.queues.consume_from:
+        return
+    from app.tasks.clip_processing import _fetch_plex_sessions
+
+    _gate = IntakeGate(celery_app, sender.hostname, get_throttle(_fetch_plex_sessions))
+    _gate.start()
+
+
+@task_received.connect
+def _gate_task_received(request=None, **kwargs):
+    if _gate is not None and request is not None:
+        _gate.on_received(request.name)
+
+
+@worker_shutdown.connect
+def _stop_gate(**kwargs):
+    if _gate is not None:
+        _gate.stop()
@@ -0,0 +1,28 @@
+"""Start a Celery worker for one pipeline queue.
+
+    python -m app.tasks.worker analysis|encode|db
+
+Concurrency comes from Settings (``<queue>_concurrency``), so each stage can
+be sized for its bottleneck: analysis is bound by media volume reads, encode
+by CPU, and db by round trips. db workers also consume the intake queue.
+"""
+import sys
+from app.config import get_settings
+from app.tasks.celery_app import INTAKE_QUEUE, celery_app
+
+QUEUES = ("analysis", "encode", "db")
+
+
+def worker_argv(queue: str) -> list[str]:
+    if queue not in QUEUES:
+        raise ValueError(f"Unknown queue {queue!r}; expected one of {QUEUES}")
+    concurrency = getattr(get_settings(), f"{queue}_concurrency")
+    queues = f"{queue},{INTAKE_QUEUE}" if queue == "db" else queue
+    return [
+        "worker", "--loglevel=info", "-Q", queues,
+        f"--concurrency={concurrency}", "-n", f"{queue}@%h",
+    ]
+
+
+if __name__ == "__main__":
+    celery_app.worker_main(worker_argv(sys.argv[1] if len(sys.argv) > 1 else "db"))
@@ -1,3 +1,4 @@
+import time
 import pytest
 import asyncio
 from unittest.mock import AsyncMock, MagicMock
@@ -35,3 +36,70 @@ def sample_user_id():
 @pytest.fixture
 def sample_clip_id():
     return uuid4()
+
+
+class FakeRedis:
+    """Just enough of redis.Redis for the Redis-backed services: get/set with
+    nx/ex, delete, ttl, scan_iter and the sorted-set calls the volume queue uses."""
+
+    def __init__(self):
+        self.values = {}
+        self.expiry = {}
+
+    def _alive(self, key):
+        if key in self.expiry and self.expiry[key] <= time.time():
+            self.values.pop(key, None)
+            self.expiry.pop(key, None)
+        return key in self.values
+
+    def get(self, key):
+        return self.values.get(key) if self._alive(key) else None
+
+    def set(self, key, value, nx=False, ex=None):
+        if nx and self._alive(key):
+            return None
+        self.values[key] = value
+        if ex:
+            self.expiry[key] = time.time() + ex
+        return True
+
+    def delete(self, key):
+        self.values.pop(key, None)
+        self.expiry.pop(key, None)
+
+    def scan_iter(self, match="*"):
+        import fnmatch
+        return [key for key in list(self.values) if self._alive(key) and fnmatch.fnmatchcase(key, match)]
+
+    def zadd(self, key, mapping, nx=False):
+        zset = self.values.setdefault(key, {})
+        added = 0
+        for member, score in mapping.items():
+            if nx and member in zset:
+                continue
+            added += member not in zset
+            zset[member] = score
+        return added
+
+    def zpopmin(self, key):
+        zset = self.values.get(key) or {}
+        if not zset:
+            return []
+        member = min(zset, key=zset.get)
+        score = zset.pop(member)
+        if not zset:
+            self.values.pop(key)
+        return [(member, score)]
+
+    def zcard(self, key):
+        return len(self.values.get(key) or {})
+
+    def ttl(self, key):
+        if not self._alive(key) or key not in self.expiry:
+            return -2
+        return int(self.expiry[key] - time.time())
+
+
+@pytest.fixture
+def fake_redis():
+    return FakeRedis()
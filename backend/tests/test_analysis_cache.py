@@ -0,0 +1,150 @@
+import os
+import pytest
+from app.services.analysis_cache import AnalysisCache, fingerprint_file
+from app.services.clip_engine import MediaAnalysis, SubtitleEntry, SceneChange, energy_array
+
+
+def _analysis(profile="full"):
+    return MediaAnalysis(
+        subtitles=[
+            SubtitleEntry(1, 1000, 4000, "Hello, world!"),
+            SubtitleEntry(2, 5000, 8500, "Ça va? — 你好"),
+        ],
+        scene_changes=[SceneChange(4000, 0.3), SceneChange(9000, 0.3)],
+        audio_energy=energy_array([-30.5, -12.25, -100.0]),
+        scene_profile=profile,
+        wall_time_s=12.5,
+    )
+
+
+@pytest.fixture
+def media_file(tmp_path):
+    path = tmp_path / "movie.mkv"
+    path.write_bytes(os.urandom(3 * 1024 * 1024))
+    return str(path)
+
+
+class TestAnalysisCache:
+    def setup_method(self):
+        AnalysisCache.stats.clear()
+
+    def test_round_trip(self, tmp_path, media_file):
+        cache = AnalysisCache(root=str(tmp_path / "cache"))
+        fp = fingerprint_file(media_file)
+        assert cache.get(fp, "full") is None
+        cache.put(fp, _analysis())
+
+        cached = cache.get(fp, "full")
+        assert cached == _analysis()
+        assert AnalysisCache.stats["hits"] == 1
+        assert AnalysisCache.stats["misses"] == 1
+
+    def test_profile_is_part_of_key(self, tmp_path, media_file):
+        cache = AnalysisCache(root=str(tmp_path / "cache"))
+        fp = fingerprint_file(media_file)
+        cache.put(fp, _analysis("full"))
+        assert cache.get(fp, "keyframe") is None
+
+    def test_targeted_analysis_keyed_separately(self, tmp_path, media_file):
+        cache = AnalysisCache(root=str(tmp_path / "cache"))
+        fp = fingerprint_file(media_file)
+        targeted = _analysis()
+        targeted.windows = [(0, 20000), (60000, 95000)]
+        cache.put(fp, targeted)
+
+        assert cache.get(fp, "full") is None
+        assert cache.get(fp, "full-targeted") == targeted
+
+    def test_modified_file_misses(self, tmp_path, media_file):
+        cache = AnalysisCache(root=str(tmp_path / "cache"))
+        cache.put(fingerprint_file(media_file), _analysis())
+
+        with open(media_file, "r+b") as f:
+            f.write(b"changed")
+        os.utime(media_file, ns=(0, 0))
+        assert cache.get(fingerprint_file(media_file), "full") is None
+
+    def test_incomplete_analysis_not_cached(self, tmp_path, media_file):
+        cache = AnalysisCache(root=str(tmp_path / "cache"))
+        fp = fingerprint_file(media_file)
+        assert cache.put(fp, MediaAnalysis(complete=False)) is None
+        assert cache.get(fp, "full") is None
+
+    def test_gc_evicts_least_recently_used(self, tmp_path):
+        cache = AnalysisCache(root=str(tmp_path / "cache"), max_bytes=10 ** 9)
+        paths = []
+        for i in range(3):
+            media = tmp_path / f"ep{i}.mkv"
+            media.write_bytes(os.urandom(1024))
+            path = cache.put(fingerprint_file(str(media)), _analysis())
+            os.utime(path, (1000 + i, 1000 + i))
+            paths.append(path)
+
+        cache.max_bytes = os.path.getsize(paths[1]) + os.path.getsize(paths[2])
+        assert cache.gc() == 1
+        assert not os.path.exists(paths[0])
+        assert os.path.exists(paths[1]) and os.path.exists(paths[2])
+        assert AnalysisCache.stats["evictions"] == 1
+
+    def test_corrupt_entry_is_discarded(self, tmp_path, media_file):
+        cache = AnalysisCache(root=str(tmp_path / "cache"))
+        fp = fingerprint_file(media_file)
+        path = cache.put(fp, _analysis())
+        with open(path, "wb") as f:
+            f.write(b"not an npz")
+        assert cache.get(fp, "full") is None
+        assert not os.path.exists(path)
+
+    def test_keyframe_index_round_trip(self, tmp_path, media_file):
+        cache = AnalysisCache(root=str(tmp_path / "cache"))
+        fp = fingerprint_file(media_file)
+        assert cache.get_keyframes(fp) is None
+        cache.put_keyframes(fp, [0, 2002, 4005])
+        assert cache.get_keyframes(fp) == [0, 2002, 4005]
+
+        cache.put_keyframes(fp, [])
+        assert cache.get_keyframes(fp) == []
+
+    def test_only_definite_keyframe_results_cached(self, tmp_path, media_file):
+        from unittest.mock import MagicMock
+        from app.tasks.clip_processing import _keyframe_index
+
+        cache = AnalysisCache(root=str(tmp_path / "cache"))
+        fp = fingerprint_file(media_file)
+        engine = MagicMock()
+        # A failed probe re-encodes this time and is retried on the next run
+        engine.build_keyframe_index.return_value = None
+        assert _keyframe_index(engine, cache, fp, media_file) == []
+        assert cache.get_keyframes(fp) is None
+
+        # An incompatible source is a definite answer
+        engine.build_keyframe_index.return_value = []
+        assert _keyframe_index(engine, cache, fp, media_file) == []
+        assert _keyframe_index(engine, cache, fp, media_file) == []
+        assert engine.build_keyframe_index.call_count == 2
+
+    def test_subtitles_keyed_by_source(self, tmp_path, media_file):
+        cache = AnalysisCache(root=str(tmp_path / "cache"))
+        fp = fingerprint_file(media_file)
+        subtitles = _analysis().subtitles
+        assert cache.get_subtitles(fp, "embedded:en") is None
+        cache.put_subtitles(fp, "embedded:en", subtitles)
+
+        assert cache.get_subtitles(fp, "embedded:en") == subtitles
+        assert cache.get_subtitles(fp, "sidecar:/media/movie.en.srt:10:1") is None
+        cache.put_subtitles(fp, "embedded:fr", [])
+        assert cache.get_subtitles(fp, "embedded:fr") == []
+
+    def test_stash_and_load_by_reference(self, tmp_path, media_file):
+        cache = AnalysisCache(root=str(tmp_path / "cache"))
+        fp = fingerprint_file(media_file)
+
+        ref = cache.stash(fp, _analysis())
+        assert cache.load(ref) == _analysis()
+
+        partial = MediaAnalysis(subtitles=_analysis().subtitles, complete=False)
+        partial_ref = cache.stash(fp, partial)
+        assert partial_ref != ref
+        assert cache.load(partial_ref).complete is False
+        # Partial results are handed off but never reused
+        assert cache.get(fp, "full") == _analysis()
@@ -0,0 +1,163 @@
+import random
+import time
+from app.config import get_settings
+from app.services.clip_engine import ClipEngine, SubtitleEntry, SceneChange, energy_array
+from app.services.scoring import ClipCandidate
+
+settings = get_settings()
+
+TWO_HOURS_MS = 2 * 60 * 60 * 1000
+
+
+def _synthetic_timeline(seed: int = 7, n_subs: int = 1500, n_scenes: int = 1500, n_audio: int = 15000):
+    rng = random.Random(seed)
+    subtitles = []
+    for i, start in enumerate(sorted(rng.randrange(0, TWO_HOURS_MS - 5000) for _ in range(n_subs))):
+        subtitles.append(SubtitleEntry(i + 1, start, start + rng.randrange(800, 4500), f"line {i}"))
+    scenes = [SceneChange(rng.randrange(0, TWO_HOURS_MS), 0.3) for _ in range(n_scenes)]
+    scenes.sort(key=lambda sc: sc.timestamp_ms)
+    audio = energy_array([rng.uniform(-70.0, -5.0) for _ in range(n_audio)])
+    return subtitles, scenes, audio
+
+
+def _hop_ms(audio) -> int:
+    return TWO_HOURS_MS // len(audio)
+
+
+def _reference_candidates(engine, subtitles, scene_changes, audio_energy, total_duration_ms):
+    """The original full-scan implementation, kept as the correctness oracle."""
+    hop = _hop_ms(audio_energy)
+    audio_energy = [{"time_ms": i * hop, "rms_db": rms} for i, rms in enumerate(audio_energy)]
+    candidates = []
+    for sub in subtitles:
+        start = max(0, sub.start_ms - 2000)
+        end = min(total_duration_ms, sub.end_ms + 2000)
+        clip_start = max((sc.timestamp_ms for sc in scene_changes if sc.timestamp_ms <= start), default=start)
+        clip_end = min((sc.timestamp_ms for sc in scene_changes if sc.timestamp_ms >= end), default=end)
+        duration = clip_end - clip_start
+        if duration < settings.min_clip_duration_ms:
+            clip_end = clip_start + settings.min_clip_duration_ms
+        elif duration > settings.max_clip_duration_ms:
+            clip_end = clip_start + settings.max_clip_duration_ms
+        duration = clip_end - clip_start
+
+        nearby_subs = [s for s in subtitles if s.start_ms >= clip_start and s.end_ms <= clip_end]
+        dialogue_score = engine.scoring.compute_dialogue_density_score([{"text": s.text} for s in nearby_subs])
+        temporal_score = engine.scoring.compute_temporal_position_score(clip_start, total_duration_ms)
+        audio_score = 0.5
+        if audio_energy:
+            nearby_energy = [e for e in audio_energy if clip_start <= e["time_ms"] <= clip_end]
+            if nearby_energy:
+                max_rms = max(e["rms_db"] for e in nearby_energy)
+                audio_score = min(1.0, max(0.0, (max_rms + 60) / 60))
+        scene_density = len([sc for sc in scene_changes if clip_start <= sc.timestamp_ms <= clip_end])
+        candidates.append(ClipCandidate(
+            start_ms=clip_start, end_ms=clip_end, duration_ms=duration,
+            audio_energy_score=audio_score, scene_composition_score=min(1.0, scene_density / 5.0),
+            dialogue_density_score=dialogue_score, temporal_position_score=temporal_score,
+        ))
+    return candidates
+
+
+class TestCandidateGenerationBenchmark:
+    def test_matches_reference_and_is_faster(self):
+        engine = ClipEngine()
+        subtitles, scenes, audio = _synthetic_timeline()
+
+        t0 = time.perf_counter()
+        expected = _reference_candidates(engine, subtitles, scenes, audio, TWO_HOURS_MS)
+        reference_s = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        actual = engine.identify_clip_candidates(subtitles, scenes, audio, TWO_HOURS_MS, audio_hop_ms=_hop_ms(audio))
+        indexed_s = time.perf_counter() - t0
+
+        print(f"\nidentify_clip_candidates: reference {reference_s:.3f}s, indexed {indexed_s:.3f}s "
+              f"({reference_s / indexed_s:.1f}x)")
+        assert actual == expected
+        assert indexed_s * 5 < reference_s
+
+    def test_unsorted_inputs_match_reference(self):
+        engine = ClipEngine()
+        subtitles, scenes, audio = _synthetic_timeline(seed=11, n_subs=200, n_scenes=150, n_audio=1000)
+        random.Random(3).shuffle(subtitles)
+        random.Random(4).shuffle(scenes)
+
+        expected = _reference_candidates(engine, subtitles, scenes, audio, TWO_HOURS_MS)
+        actual = engine.identify_clip_candidates(subtitles, scenes, audio, TWO_HOURS_MS, audio_hop_ms=_hop_ms(audio))
+        assert actual == expected
+
+
+def _reference_rank(scoring, candidates, max_clips, existing, max_iou):
+    """Per-candidate scoring, a full sort and pairwise suppression, as the oracle."""
+    scored = sorted(
+        enumerate(candidates), key=lambda ic: (-scoring.compute_composite_score(ic[1]), ic[0]),
+    )
+    kept = list(existing)
+    ranked = []
+    for _, c in scored:
+        duplicate = False
+        for start, end in kept:
+            inter = max(0, min(c.end_ms, end) - max(c.start_ms, start))
+            union = (c.end_ms - c.start_ms) + (end - start) - inter
+            if union > 0 and inter / union > max_iou:
+                duplicate = True
+                break
+        if duplicate:
+            continue
+        kept.append((c.start_ms, c.end_ms))
+        ranked.append(c)
+        if len(ranked) == max_clips:
+            break
+    return ranked
+
+
+class TestRankingBenchmark:
+    def _candidates(self, n=10_000, seed=5):
+        rng = random.Random(seed)
+        candidates = []
+        for _ in range(n):
+            start = rng.randrange(0, TWO_HOURS_MS - 30000)
+            duration = rng.randrange(8000, 30000)
+            candidates.append(ClipCandidate(
+                start, start + duration, duration,
+                quote_match_score=rng.choice([0.0, 0.0, 0.0, rng.random()]),
+                audio_energy_score=rng.random(), scene_composition_score=rng.random(),
+                dialogue_density_score=rng.choice([0.1, 0.3, 0.5, 0.8, 1.0]),
+                temporal_position_score=rng.choice([0.2, 0.3, 0.5, 0.7, 1.0]),
+            ))
+        return candidates
+
+    def test_vectorized_ranking_matches_reference(self):
+        from app.services.scoring import CandidateBatch, ClipScoringService, NMS_MAX_IOU
+
+        scoring = ClipScoringService()
+        candidates = self._candidates()
+        existing = [(600_000, 620_000), (3_000_000, 3_015_000)]
+
+        t0 = time.perf_counter()
+        expected = _reference_rank(scoring, candidates, 10, existing, NMS_MAX_IOU)
+        reference_s = time.perf_counter() - t0
+
+        batch = CandidateBatch.from_candidates(candidates)
+        t0 = time.perf_counter()
+        actual = scoring.rank_candidates(batch, 10, existing=existing)
+        vectorized_s = time.perf_counter() - t0
+
+        print(f"\nrank_candidates (10k): reference {reference_s:.4f}s, vectorized {vectorized_s:.4f}s "
+              f"({reference_s / vectorized_s:.1f}x)")
+        assert actual == expected
+        assert vectorized_s * 5 < reference_s
+
+    def test_heavy_suppression_widens_pool(self):
+        from app.services.scoring import ClipScoringService, NMS_MAX_IOU
+
+        scoring = ClipScoringService()
+        # Most high scorers pile onto the same few windows
+        candidates = self._candidates(n=2000, seed=9)
+        for c in candidates[:1500]:
+            c.start_ms, c.end_ms, c.duration_ms = 100_000, 120_000, 20_000
+            c.quote_match_score = 1.0
+        expected = _reference_rank(scoring, candidates, 10, [], NMS_MAX_IOU)
+        assert scoring.rank_candidates(candidates, 10) == expected
+        assert len(expected) == 10
@@ -1,5 +1,7 @@
+import math
 import pytest
-from app.services.clip_engine import ClipEngine
+import numpy as np
+from app.services.clip_engine import ClipEngine, energy_array, settings
 
 
 class TestClipEngine:
@@ -65,10 +67,10 @@ Line two
             SceneChange(59000, 0.6),
             SceneChange(64000, 0.5),
         ]
-        audio_energy = [
-            {"time_ms": 6000, "rms_db": -20.0},
-            {"time_ms": 61000, "rms_db": -10.0},
-        ]
+        levels = np.full(120000 // 50, -np.inf)
+        levels[6000 // 50] = -20.0
+        levels[61000 // 50] = -10.0
+        audio_energy = energy_array(levels)
 
         candidates = self.engine.identify_clip_candidates(
             subtitles, scene_changes, audio_energy,
@@ -78,6 +80,34 @@ Line two
         assert len(candidates) == 2
         assert candidates[0].quote_match_score > 0.5
         assert candidates[1].quote_match_score > 0.5
+        assert candidates[0].audio_energy_score == pytest.approx(40 / 60)
+
+    def test_targeted_candidates_snap_within_their_window(self):
+        from app.services.clip_engine import SubtitleEntry, SceneChange
+
+        subtitles = [
+            SubtitleEntry(1, 100000, 103000, "First line"),
+            SubtitleEntry(2, 600000, 603000, "Much later"),
+        ]
+        # Sparse cuts: the only ones found are near the first line
+        scene_changes = [SceneChange(95000, 0.5), SceneChange(380000, 0.5)]
+        candidates = self.engine.identify_clip_candidates(
+            subtitles, scene_changes, [], total_duration_ms=3_600_000,
+            windows=[(88000, 115000), (588000, 615000)],
+        )
+        first, later = candidates
+        assert first.start_ms == 95000
+        assert first.end_ms < 380000
+        assert later.start_ms <= 600000 and later.end_ms >= 603000
+
+    def test_unanalyzed_audio_scores_neutral(self):
+        from app.services.clip_engine import SubtitleEntry
+
+        subtitles = [SubtitleEntry(1, 5000, 8000, "Just a regular line")]
+        # Targeted analysis leaves hops outside its windows at -inf
+        audio_energy = energy_array(np.full(120000 // 50, -np.inf))
+        candidates = self.engine.identify_clip_candidates(subtitles, [], audio_energy, 120000)
+        assert candidates[0].audio_energy_score == 0.5
 
     def test_identify_clip_candidates_no_quotes(self):
         from app.services.clip_engine import SubtitleEntry
@@ -95,3 +125,438 @@ Line two
     def test_identify_clip_candidates_empty(self):
         candidates = self.engine.identify_clip_candidates([], [], [], 120000)
         assert len(candidates) == 0
+
+
+class TestMediaAnalysis:
+    PROBE = (
+        '{"streams": [{"index": 0, "codec_type": "video", "codec_name": "h264"},'
+        ' {"index": 1, "codec_type": "audio", "codec_name": "aac"},'
+        ' {"index": 2, "codec_type": "subtitle", "codec_name": "hdmv_pgs_subtitle"},'
+        ' {"index": 3, "codec_type": "subtitle", "codec_name": "subrip"}]}'
+    )
+    SRT = "1\n00:00:01,000 --> 00:00:04,000\nHello, world!\n"
+    LOG = "\n".join([
+        "[Parsed_showinfo_1 @ 0x1] n:   0 pts:  12012 pts_time:12.012 duration:1001",
+        "[Parsed_showinfo_1 @ 0x1] n:   1 pts:  45045 pts_time:45.045 duration:1001",
+    ])
+    # One second of a 0.5 amplitude sine (-9.03 dBFS RMS), then one second of silence
+    PCM = np.concatenate([
+        0.5 * np.sin(2 * np.pi * 440 * np.arange(8000) / 8000), np.zeros(8000),
+    ]).astype("<f4").tobytes()
+
+    def setup_method(self):
+        self.engine = ClipEngine()
+
+    def _patched(self, commands, log=None, pcm=None, returncodes=None):
+        """Patch ffprobe (subprocess.run) and the streaming ffmpeg run (Popen).
+
+        ``returncodes`` are the exit statuses of successive ffmpeg runs (default 0)."""
+        import io
+        from contextlib import ExitStack
+        from unittest.mock import MagicMock, patch
+
+        def fake_run(cmd, **kwargs):
+            commands.append(cmd)
+            return MagicMock(stdout=self.PROBE, stderr="")
+
+        def fake_popen(cmd, **kwargs):
+            commands.append(cmd)
+            if "srt" in cmd:
+                with open(cmd[cmd.index("srt") + 1], "w") as f:
+                    f.write(self.SRT)
+            proc = MagicMock()
+            proc.stderr = io.BytesIO(((log or self.LOG) + "\n").encode())
+            proc.stdout = io.BytesIO(self.PCM if pcm is None else pcm)
+            proc.wait.return_value = returncodes.pop(0) if returncodes else 0
+            return proc
+
+        stack = ExitStack()
+        stack.enter_context(patch("app.services.clip_engine.subprocess.run", side_effect=fake_run))
+        stack.enter_context(patch("app.services.clip_engine.subprocess.Popen", side_effect=fake_popen))
+        return stack
+
+    def test_analyze_media_single_ffmpeg_pass(self):
+        commands = []
+        with self._patched(commands):
+            analysis = self.engine.analyze_media("/media/movie.mkv")
+
+        ffmpeg_runs = [c for c in commands if c[0] == "ffmpeg"]
+        assert len(ffmpeg_runs) == 1
+        cmd = ffmpeg_runs[0]
+        assert "-filter_complex" in cmd
+        assert "0:3" in cmd  # first text subtitle stream, not the PGS one
+
+        assert [s.text for s in analysis.subtitles] == ["Hello, world!"]
+        assert [s.timestamp_ms for s in analysis.scene_changes] == [12012, 45045]
+        assert "pipe:1" in cmd and "pcm_f32le" in cmd
+        assert "astats" not in cmd[cmd.index("-filter_complex") + 1]
+        assert len(analysis.audio_energy) == 40
+        assert analysis.audio_energy[:20] == pytest.approx([20 * math.log10(0.5 / math.sqrt(2))] * 20, abs=0.01)
+        assert analysis.audio_energy[20:] == pytest.approx([-100.0] * 20)
+
+    def test_audio_only_analysis_skips_video(self):
+        commands = []
+        with self._patched(commands):
+            energy = self.engine.analyze_audio_energy("/media/movie.mkv")
+
+        cmd = [c for c in commands if c[0] == "ffmpeg"][0]
+        assert cmd.index("-vn") < cmd.index("-i")
+        assert "-filter_complex" not in cmd
+        assert len(energy) == 40
+
+    def test_wrappers_request_single_analysis(self):
+        commands = []
+        with self._patched(commands):
+            scenes = self.engine.detect_scene_changes("/media/movie.mkv")
+
+        cmd = [c for c in commands if c[0] == "ffmpeg"][0]
+        graph = cmd[cmd.index("-filter_complex") + 1]
+        assert "select=" in graph and "astats" not in graph
+        assert "pipe:1" not in cmd
+        assert len(scenes) == 2
+
+    def test_progress_reported_while_streaming(self):
+        from unittest.mock import patch
+
+        from app.services.clip_engine import PCM_CHUNK_BYTES
+
+        # Ten seconds of PCM, read in ~2 second chunks
+        pcm = bytes(8000 * 4 * 10)
+        reported = []
+        # Each chunk lands a second apart, so only the 1% step throttles
+        clock = iter(range(1000))
+        with self._patched([], pcm=pcm), \
+                patch("app.services.clip_engine.time.monotonic", side_effect=lambda: next(clock)):
+            self.engine.analyze_media("/media/movie.mkv", duration_ms=10_000, progress=reported.append)
+        chunk_s = PCM_CHUNK_BYTES / 4 / 8000
+        assert reported == pytest.approx([min(1.0, chunk_s * i / 10) for i in range(1, len(reported) + 1)])
+        assert reported[-1] == pytest.approx(1.0)
+
+    def test_energy_windows_independent_of_chunking(self):
+        from app.services.clip_engine import _EnergyWindows
+
+        pcm = np.random.default_rng(1).uniform(-1, 1, 8000 * 3 + 123).astype("<f4").tobytes()
+        whole = _EnergyWindows()
+        whole.feed(pcm)
+        split = _EnergyWindows()
+        for i in range(0, len(pcm), 999):  # chunks that split samples and hops
+            split.feed(pcm[i:i + 999])
+
+        expected = whole.finish()
+        assert len(expected) == 61  # 60 whole hops and a partial one
+        np.testing.assert_array_equal(split.finish(), expected)
+        assert split.position_s == pytest.approx((8000 * 3 + 123) / 8000)
+
+    def test_streaming_run_timeout(self):
+        import subprocess
+        import threading
+        from unittest.mock import MagicMock, patch
+
+        killed = threading.Event()
+        proc = MagicMock()
+        proc.kill.side_effect = killed.set
+        # stderr blocks until the watchdog kills the process
+        proc.stderr.__iter__.side_effect = lambda: iter([] if killed.wait(5) else [])
+        with patch("app.services.clip_engine.subprocess.Popen", return_value=proc):
+            with pytest.raises(subprocess.TimeoutExpired):
+                self.engine._run_streaming(["ffmpeg"], 0.05, lambda line: None)
+        assert killed.is_set()
+
+    def test_sidecar_subtitles_skip_ffmpeg(self, tmp_path):
+        media = tmp_path / "movie.mkv"
+        media.touch()
+        (tmp_path / "movie.en.srt").write_text("1\n00:00:02,000 --> 00:00:03,000\nFrom the sidecar\n")
+        commands = []
+        with self._patched(commands):
+            subtitles = self.engine.resolve_subtitles(str(media))
+            analysis = self.engine.analyze_media(str(media))
+
+        assert [s.text for s in subtitles] == ["From the sidecar"]
+        assert [s.text for s in analysis.subtitles] == ["From the sidecar"]
+        ffmpeg_runs = [c for c in commands if c[0] == "ffmpeg"]
+        assert len(ffmpeg_runs) == 1 and "srt" not in ffmpeg_runs[0]
+
+    def test_embedded_subtitles_demux_only(self):
+        self.PROBE = (
+            '{"streams": [{"index": 0, "codec_type": "video", "codec_name": "h264"},'
+            ' {"index": 1, "codec_type": "audio", "codec_name": "aac"},'
+            ' {"index": 2, "codec_type": "subtitle", "codec_name": "subrip", "tags": {"language": "fre"}},'
+            ' {"index": 3, "codec_type": "subtitle", "codec_name": "subrip", "tags": {"language": "eng"},'
+            '  "disposition": {"forced": 1}},'
+            ' {"index": 4, "codec_type": "subtitle", "codec_name": "ass", "tags": {"language": "eng"}}]}'
+        )
+        commands = []
+        with self._patched(commands):
+            subtitles = self.engine.resolve_subtitles("/media/movie.mkv")
+
+        cmd = [c for c in commands if c[0] == "ffmpeg"][0]
+        assert cmd.index("-vn") < cmd.index("-i") and cmd.index("-an") < cmd.index("-i")
+        assert "-filter_complex" not in cmd
+        assert "0:4" in cmd  # English, not forced
+        assert [s.text for s in subtitles] == ["Hello, world!"]
+
+    def test_candidate_windows_merge(self):
+        from app.services.clip_engine import SubtitleEntry, _candidate_windows
+
+        subs = [
+            SubtitleEntry(1, 100_000, 103_000, "a"),
+            SubtitleEntry(2, 110_000, 112_000, "b"),
+            SubtitleEntry(3, 600_000, 601_000, "c"),
+        ]
+        windows = _candidate_windows(subs, 3_600_000, padding_ms=10_000, merge_gap_ms=5_000)
+        assert windows == [(88_000, 124_000), (588_000, 613_000)]
+
+    def test_targeted_analysis_seeks_windows(self):
+        from unittest.mock import patch
+
+        commands = []
+        with self._patched(commands), patch.object(settings, "targeted_windows_per_run", 16):
+            analysis = self.engine.analyze_media_targeted("/media/movie.mkv", duration_ms=3_600_000)
+
+        ffmpeg_runs = [c for c in commands if c[0] == "ffmpeg"]
+        assert len(ffmpeg_runs) == 2  # subtitle demux, then one windowed decode
+        assert "-filter_complex" not in ffmpeg_runs[0]
+        cmd = ffmpeg_runs[1]
+        assert "-copyts" in cmd
+        assert cmd[cmd.index("-ss") + 1] == "0.000"
+        assert cmd[cmd.index("-t") + 1] == "16.000"
+        assert analysis.windows == [(0, 16000)]
+        assert [s.timestamp_ms for s in analysis.scene_changes] == [12012, 45045]
+        graph = cmd[cmd.index("-filter_complex") + 1]
+        assert "apad=whole_dur=16.000,atrim=duration=16.000" in graph
+        assert "concat=n=1:v=0:a=1[pcm]" in graph
+        # Audio lands at its window's hops; the rest of the runtime is unanalyzed
+        assert len(analysis.audio_energy) == 3_600_000 // 50
+        assert analysis.audio_energy[0] == pytest.approx(-9.03, abs=0.01)
+        assert analysis.audio_energy[39] == pytest.approx(-100.0)
+        assert analysis.audio_energy[40] == -math.inf
+
+    def test_targeted_analysis_falls_back_to_full_scan(self):
+        commands = []
+        self.SRT = ""
+        with self._patched(commands):
+            analysis = self.engine.analyze_media_targeted("/media/movie.mkv", duration_ms=3_600_000)
+
+        ffmpeg_runs = [c for c in commands if c[0] == "ffmpeg"]
+        assert "-copyts" not in ffmpeg_runs[-1]
+        assert "-filter_complex" in ffmpeg_runs[-1]
+        assert analysis.windows == []
+
+    def test_failed_ffmpeg_run_is_incomplete(self):
+        from unittest.mock import patch
+
+        with self._patched([], returncodes=[1]):
+            assert not self.engine.analyze_media("/media/movie.mkv").complete
+        # The subtitle demux succeeds; the windowed decode fails
+        with self._patched([], returncodes=[0, 1]), patch.object(settings, "targeted_windows_per_run", 16):
+            analysis = self.engine.analyze_media_targeted("/media/movie.mkv", duration_ms=3_600_000)
+        assert not analysis.complete
+        assert [s.text for s in analysis.subtitles] == ["Hello, world!"]
+
+    def test_analyze_media_missing_ffmpeg(self):
+        from unittest.mock import patch
+
+        with patch("app.services.clip_engine.subprocess.run", side_effect=FileNotFoundError):
+            analysis = self.engine.analyze_media("/media/movie.mkv")
+        assert analysis.subtitles == []
+        assert analysis.scene_changes == []
+        assert len(analysis.audio_energy) == 0
+
+    def test_scene_profiles_shape_command(self):
+        for profile, expected_input, expected_graph in [
+            ("full", None, "[0:v:0]select="),
+            ("reduced", None, "fps=4.0,scale=320:-2,select="),
+            ("keyframe", "nokey", "scale=320:-2,select="),
+        ]:
+            commands = []
+            with self._patched(commands):
+                analysis = self.engine.analyze_media("/media/movie.mkv", scene_profile=profile)
+            cmd = [c for c in commands if c[0] == "ffmpeg"][0]
+            graph = cmd[cmd.index("-filter_complex") + 1]
+            assert expected_graph in graph
+            assert ("-skip_frame:v" in cmd) == (expected_input is not None)
+            assert analysis.scene_profile == profile
+            assert analysis.wall_time_s >= 0.0
+
+    def test_unknown_scene_profile(self):
+        with pytest.raises(ValueError):
+            self.engine.analyze_media("/media/movie.mkv", scene_profile="turbo")
+
+
+class TestBatchExtraction:
+    def setup_method(self):
+        self.engine = ClipEngine()
+
+    def _candidates(self):
+        from app.services.scoring import ClipCandidate
+        return [
+            ClipCandidate(10000, 25000, 15000),
+            ClipCandidate(600000, 610000, 10000),
+            ClipCandidate(3000000, 3020000, 20000),
+        ]
+
+    def test_single_ffmpeg_run_for_all_clips(self, tmp_path):
+        import os
+        from unittest.mock import patch
+
+        paths = [str(tmp_path / f"clip{i}.mp4") for i in range(3)]
+        commands = []
+
+        def fake_run(cmd, **kwargs):
+            commands.append(cmd)
+            if "-filter_complex" in cmd and "libx264" in cmd:
+                for i, path in enumerate(paths):
+                    if i != 1:  # simulate one clip producing no output
+                        with open(path, "wb") as f:
+                            f.write(b"mp4")
+            else:
+                for i in (0, 2):
+                    for t in range(3):
+                        with open(os.path.join(str(tmp_path / f"clip{i}"), f"thumb_{t}.jpg"), "wb") as f:
+                            f.write(b"jpg")
+
+        with patch("app.services.clip_engine.subprocess.run", side_effect=fake_run):
+            results = self.engine.extract_clips("/media/movie.mkv", self._candidates(), paths)
+
+        # One encode run against the source, one thumbnail run against the new clips
+        assert len(commands) == 2
+        encode, thumbs = commands
+        assert encode.count("-i") == 3
+        assert all(p in encode for p in paths)
+        assert "[2:a:0]afade" in encode[encode.index("-filter_complex") + 1]
+
+        assert thumbs.count("-i") == 2
+        assert "/media/movie.mkv" not in thumbs
+        assert paths[0] in thumbs and paths[2] in thumbs
+        graph = thumbs[thumbs.index("-filter_complex") + 1]
+        assert "gte(t,7.5)*lt(prev_t,7.5)" in graph
+        assert "scale=480:-2" in graph
+
+        assert [r.success for r in results] == [True, False, True]
+        assert len(results[0].thumbnail_paths) == 3
+        assert results[0].thumbnail_paths[0].endswith(os.path.join("clip0", "thumb_0.jpg"))
+        assert results[1].thumbnail_paths == []
+        assert results[2].candidate.start_ms == 3000000
+
+    def test_on_batch_called_as_each_batch_finishes(self, tmp_path):
+        from unittest.mock import patch
+
+        paths = [str(tmp_path / f"clip{i}.mp4") for i in range(3)]
+        batches = []
+        with patch("app.services.clip_engine.subprocess.run"), \
+                patch.object(settings, "clip_extract_batch_size", 2):
+            results = self.engine.extract_clips(
+                "/media/movie.mkv", self._candidates(), paths,
+                on_batch=lambda rs: batches.append([r.output_path for r in rs]),
+            )
+        assert batches == [paths[:2], paths[2:]]
+        assert len(results) == 3
+
+    def test_failed_batch_falls_back_to_single_clips(self, tmp_path):
+        import subprocess
+        from unittest.mock import patch
+
+        paths = [str(tmp_path / f"clip{i}.mp4") for i in range(3)]
+        commands = []
+
+        def fake_run(cmd, **kwargs):
+            commands.append(cmd)
+            if cmd.count("-i") > 1:
+                raise subprocess.CalledProcessError(1, cmd)
+            if cmd[-1] == paths[1]:
+                raise subprocess.CalledProcessError(1, cmd)
+
+        with patch("app.services.clip_engine.subprocess.run", side_effect=fake_run):
+            results = self.engine.extract_clips("/media/movie.mkv", self._candidates(), paths)
+
+        assert [r.success for r in results] == [True, False, True]
+        # 1 batch + 3 single extractions + 1 thumbnail run for each of the 2 successful clips
+        assert len(commands) == 1 + 3 + 2
+        assert commands[2][commands[2].index("-i") + 1] == paths[0]
+
+    def test_generate_thumbnails_from_clip(self, tmp_path):
+        from unittest.mock import patch
+        from app.services.clip_engine import small_thumbnail_path
+
+        commands = []
+        with patch("app.services.clip_engine.subprocess.run", side_effect=lambda cmd, **kw: commands.append(cmd)):
+            self.engine.generate_thumbnails(str(tmp_path / "c.mp4"), str(tmp_path / "c"), [0, 7500, 14000])
+
+        assert len(commands) == 1
+        cmd = commands[0]
+        assert cmd[cmd.index("-i") + 1] == str(tmp_path / "c.mp4")
+        assert str(tmp_path / "c" / "thumb_%d_small.jpg") in cmd
+        assert small_thumbnail_path("/x/thumb_0.jpg") == "/x/thumb_0_small.jpg"
+
+
+class TestSmartCut:
+    def setup_method(self):
+        self.engine = ClipEngine()
+
+    def test_parse_keyframe_packets(self):
+        csv_text = "0.000000,K__\n0.041708,__\n2.002000,K_\n2.043708,__\nN/A,K_\n4.0045,K__\n"
+        assert self.engine._parse_keyframe_packets(csv_text) == [0, 2002, 4005]
+
+    def test_keyframe_index_unknown_when_probe_fails(self):
+        import subprocess
+        from unittest.mock import patch
+
+        timeout = subprocess.TimeoutExpired("ffprobe", 30)
+        with patch("app.services.clip_engine.subprocess.run", side_effect=timeout):
+            assert self.engine.stream_copy_compatible("/media/movie.mkv") is None
+            assert self.engine.build_keyframe_index("/media/movie.mkv") is None
+        with patch.object(self.engine, "stream_copy_compatible", return_value=False):
+            assert self.engine.build_keyframe_index("/media/movie.mkv") == []
+
+    def test_snap_to_keyframes(self):
+        from app.services.clip_engine import _snap_to_keyframes
+        from app.services.scoring import ClipCandidate
+
+        keyframes = [0, 2000, 4000, 6000, 8000, 10000, 12000, 14000, 16000, 18000]
+        snapped = _snap_to_keyframes(ClipCandidate(5000, 15100, 10100, quote_match_score=0.9), keyframes)
+        assert (snapped.start_ms, snapped.end_ms, snapped.duration_ms) == (4000, 16000, 12000)
+        assert snapped.quote_match_score == 0.9
+
+    def test_snap_rejects_distant_keyframe(self):
+        from app.services.clip_engine import _snap_to_keyframes
+        from app.services.scoring import ClipCandidate
+
+        assert _snap_to_keyframes(ClipCandidate(25000, 40000, 15000), [0, 20000, 60000]) is None
+
+    def test_batch_stream_copies_snapped_clips(self, tmp_path):
+        from unittest.mock import patch
+        from app.services.scoring import ClipCandidate
+
+        commands = []
+        with patch("app.services.clip_engine.subprocess.run", side_effect=lambda cmd, **kw: commands.append(cmd)):
+            results = self.engine.extract_clips(
+                "/media/movie.mkv",
+                [ClipCandidate(5000, 15000, 10000), ClipCandidate(100000, 112000, 12000)],
+                [str(tmp_path / "a.mp4"), str(tmp_path / "b.mp4")],
+                keyframes=[4000, 16000],
+            )
+
+        cmd = commands[0]
+        assert cmd[cmd.index("0:v:0") + 3:cmd.index("0:v:0") + 5] == ["-c:v", "copy"]
+        assert cmd[cmd.index("1:v:0") + 3:cmd.index("1:v:0") + 5] == ["-c:v", "libx264"]
+        assert [r.stream_copied for r in results] == [True, False]
+        assert results[0].candidate.start_ms == 4000
+
+    def test_single_fallback_re_encodes_when_copy_fails(self, tmp_path):
+        import subprocess
+        from unittest.mock import patch
+        from app.services.scoring import ClipCandidate
+
+        commands = []
+
+        def fake_run(cmd, **kwargs):
+            commands.append(cmd)
+            if "copy" in cmd:
+                raise subprocess.CalledProcessError(1, cmd)
+
+        with patch("app.services.clip_engine.subprocess.run", side_effect=fake_run):
+            result = self.engine._extract_single(
+                "/media/movie.mkv", ClipCandidate(4000, 16000, 12000), str(tmp_path / "a.mp4"), True,
+            )
+        assert result.success and not result.stream_copied
+        assert "libx264" in commands[1]
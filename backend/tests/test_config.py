@@ -13,6 +13,7 @@ class TestConfig:
         assert s.cold_start_threshold == 50
         assert s.clips_per_movie == 10
         assert s.clips_per_episode == 5
+        assert s.scene_analysis_profile == "full"
 
     def test_clip_duration_bounds(self):
         s = Settings()
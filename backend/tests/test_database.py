@@ -0,0 +1,23 @@
+import re
+from unittest.mock import MagicMock
+from app.database import Base, SCHEMA_UPGRADES, upgrade_schema
+from app.models import clip  # noqa: F401 — register tables
+
+
+class TestSchemaUpgrades:
+    def test_upgrades_are_idempotent_and_match_models(self):
+        for statement in SCHEMA_UPGRADES:
+            assert "IF NOT EXISTS" in statement
+            added = re.match(r"ALTER TABLE (\w+) ADD COLUMN IF NOT EXISTS (\w+)", statement)
+            if added:
+                table, column = added.groups()
+                assert column in Base.metadata.tables[table].columns
+
+    def test_indexed_columns_are_upgraded(self):
+        for name in ("library_id", "priority"):
+            assert any(f"ix_media_items_{name} " in s for s in SCHEMA_UPGRADES)
+
+    def test_upgrade_runs_every_statement(self):
+        connection = MagicMock()
+        upgrade_schema(connection)
+        assert connection.execute.call_count == len(SCHEMA_UPGRADES)
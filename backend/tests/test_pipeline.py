@@ -0,0 +1,280 @@
+import pytest
+from app.tasks.celery_app import celery_app
+from app.tasks.worker import worker_argv
+
+
+class TestPipelineRouting:
+    def _queue(self, task_name):
+        route = celery_app.amqp.router.route({}, task_name)
+        return route["queue"].name
+
+    def test_stages_routed_to_dedicated_queues(self):
+        assert self._queue("app.tasks.clip_processing.analyze_media_item") == "analysis"
+        assert self._queue("app.tasks.clip_processing.extract_media_clips") == "encode"
+        assert self._queue("app.tasks.clip_processing.rank_clip_candidates") == "db"
+        assert self._queue("app.tasks.clip_processing.persist_media_clips") == "db"
+        assert self._queue("app.tasks.clip_processing.scan_library") == "db"
+        assert self._queue("app.tasks.clip_processing.process_media_item") == "intake"
+
+    def test_worker_argv_uses_queue_concurrency(self):
+        argv = worker_argv("encode")
+        assert "-Q" in argv and argv[argv.index("-Q") + 1] == "encode"
+        assert "--concurrency=2" in argv
+        argv = worker_argv("db")
+        assert argv[argv.index("-Q") + 1] == "db,intake"
+
+    def test_worker_argv_rejects_unknown_queue(self):
+        with pytest.raises(ValueError):
+            worker_argv("gpu")
+
+
+class TestCheckpointing:
+    def test_clip_id_is_stable_per_candidate(self):
+        from app.services.scoring import ClipCandidate
+        from app.tasks.clip_processing import _clip_id
+
+        a = ClipCandidate(10000, 25000, 15000)
+        assert _clip_id("123", a) == _clip_id("123", ClipCandidate(10000, 25000, 15000, quote_match_score=0.5))
+        assert _clip_id("123", a) != _clip_id("124", a)
+        assert _clip_id("123", a) != _clip_id("123", ClipCandidate(10000, 26000, 16000))
+
+    def test_clip_upsert_reactivates_returning_clips(self):
+        from sqlalchemy.dialects import postgresql
+        from app.tasks.clip_processing import _clip_upsert
+
+        sql = str(_clip_upsert().compile(dialect=postgresql.dialect()))
+        assert "ON CONFLICT (id) DO UPDATE" in sql
+        assert "is_active = excluded.is_active" in sql
+        assert "created_at = excluded" not in sql
+
+
+class TestItemProgress:
+    def test_task_progress_reads_progress_state(self):
+        from unittest.mock import MagicMock, patch
+        from app.services.library import _task_progress
+
+        states = {
+            "a": MagicMock(state="PROGRESS", info={"stage": "analysis", "progress": 0.42}),
+            "b": MagicMock(state="SUCCESS", info={"status": "done"}),
+        }
+        with patch.object(celery_app, "AsyncResult", side_effect=states.get):
+            infos = _task_progress(["a", "b", None])
+        assert infos == [{"stage": "analysis", "progress": 0.42}, {}, {}]
+
+
+class _Result:
+    def __init__(self, rows=(), rowcount=0):
+        self._rows = list(rows)
+        self.rowcount = rowcount
+
+    def all(self):
+        return self._rows
+
+    def scalars(self):
+        return _Result(self._rows)
+
+    def __iter__(self):
+        return iter(self._rows)
+
+    def scalar_one_or_none(self):
+        return self._rows[0] if self._rows else None
+
+    def scalar(self):
+        return self.scalar_one_or_none()
+
+
+class _RecordingSession:
+    """Stands in for SyncSession, recording every statement scan_library sends."""
+
+    def __init__(self, existing, known=None, **library):
+        from unittest.mock import MagicMock
+        self.existing = existing
+        self.known = [m.plex_rating_key for m in existing] if known is None else known
+        self.statements = []
+        self.user = MagicMock(plex_token="token")
+        self.library = MagicMock(**{
+            "server_id": "srv", "library_key": "1", "library_title": "Movies", "added_watermark": None,
+            "updated_watermark": None, "last_reconciled": None, **library,
+        })
+
+    def execute(self, stmt, params=None):
+        self.statements.append(stmt)
+        sql = str(stmt)
+        if sql.startswith(("UPDATE", "DELETE")):
+            return _Result(rowcount=0)
+        if sql.startswith("SELECT media_items.id, media_items.processing_status,"):
+            return _Result()
+        if sql.startswith("SELECT count(*)"):
+            return _Result([0])
+        if sql.startswith("SELECT media_items.plex_rating_key \nFROM"):
+            return _Result(self.known)
+        if "FROM users" in sql:
+            return _Result([self.user])
+        if "FROM plex_libraries" in sql:
+            return _Result([self.library])
+        if "FROM media_items" in sql:
+            return _Result(self.existing)
+        if "FROM clips" in sql:
+            return _Result([(m.plex_rating_key, 0) for m in self.existing])
+        return _Result()
+
+    def scalars(self, stmt, params=None):
+        from unittest.mock import MagicMock
+        self.statements.append(stmt)
+        return _Result([MagicMock(id=f"new-{p['plex_rating_key']}", file_path=None, **{
+            k: v for k, v in p.items() if k != "file_path"
+        }) for p in params])
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+async def _pages(items, page_size=1000):
+    for start in range(0, len(items), page_size):
+        yield items[start:start + page_size]
+
+
+class TestScanLibrary:
+    def _scan(self, n_existing, n_new, full=False, pages=None, **session):
+        from unittest.mock import AsyncMock, MagicMock, patch
+        from app.tasks import clip_processing
+
+        existing = [
+            MagicMock(
+                plex_rating_key=f"old{i}", title=f"Old {i}", media_type="movie",
+                processing_status="completed", clips_generated=0, file_path=None,
+                plex_added_at=None,
+            )
+            for i in range(n_existing)
+        ]
+        items = [{"rating_key": m.plex_rating_key, "title": m.title, "type": "movie"} for m in existing]
+        items += [{"rating_key": f"new{i}", "title": f"New {i}", "type": "movie"} for i in range(n_new)]
+        session = _RecordingSession(existing, **session)
+        plex = MagicMock(
+            get_servers=AsyncMock(return_value=[{"server_id": "srv", "address": "nas", "port": 32400}]),
+            get_libraries=AsyncMock(return_value=[
+                {"library_key": "1", "library_type": "movie", "total_items": len(items)},
+            ]),
+        )
+        plex.iter_library_items = MagicMock(side_effect=lambda *a, **kw: (pages or _pages)(items))
+        with patch.object(clip_processing, "SyncSession", return_value=session), \
+                patch.object(clip_processing, "PlexService", return_value=plex), \
+                patch.object(clip_processing, "_dispatch_all_waiting", return_value=0), \
+                patch.object(clip_processing.process_media_item, "apply_async") as queued:
+            result = clip_processing.scan_library("00000000-0000-0000-0000-000000000001", full)
+        self.listing = plex.iter_library_items
+        return result, session, queued
+
+    def test_statement_count_independent_of_library_size(self):
+        small, small_session, _ = self._scan(2, 2)
+        large, large_session, queued = self._scan(400, 600)
+
+        assert small["status"] == large["status"] == "completed"
+        assert len(small_session.statements) == len(large_session.statements) <= 10
+        # Every existing item is short of clips, so all of them are re-queued with the new ones
+        assert large["items_new"] == 600 and large["items_queued"] == 1000
+        assert queued.call_count == 1000
+        assert large_session.library.processed_items == 0
+        # Dispatched items are marked so the next scan does not queue them again
+        assert {m.processing_status for m in large_session.existing} == {"queued"}
+
+    def test_first_scan_lists_everything_and_sets_watermarks(self):
+        from datetime import datetime
+        result, session, _ = self._scan(0, 3)
+        assert self.listing.call_args.kwargs["added_since"] is None
+        assert session.library.last_reconciled is not None
+        # No timestamps in the listing, so nothing to advance past
+        assert session.library.updated_watermark is None
+        assert result["items_removed"] == 0
+
+    def test_delta_scan_filters_past_watermarks(self):
+        from datetime import datetime, timedelta
+        from app.tasks.clip_processing import DELTA_OVERLAP_S
+        watermark = datetime(2024, 1, 1)
+        result, session, _ = self._scan(
+            0, 1, added_watermark=watermark, updated_watermark=watermark,
+            last_reconciled=datetime.utcnow() - timedelta(minutes=5),
+        )
+        kwargs = self.listing.call_args.kwargs
+        assert kwargs["added_since"] == kwargs["updated_since"] == 1704067200 - DELTA_OVERLAP_S
+        assert not any(str(s).startswith("DELETE") for s in session.statements)
+
+    def test_delta_scan_with_only_updated_watermark(self):
+        from datetime import datetime, timedelta
+        result, session, _ = self._scan(
+            0, 1, updated_watermark=datetime(2024, 1, 1),
+            last_reconciled=datetime.utcnow() - timedelta(minutes=5),
+        )
+        assert result["status"] == "completed"
+        kwargs = self.listing.call_args.kwargs
+        assert kwargs["added_since"] is None and kwargs["updated_since"] is not None
+
+    def test_reconcile_removes_items_gone_from_plex(self):
+        result, session, _ = self._scan(2, 0, known=["old0", "old1", "deleted"])
+        deletes = [s for s in session.statements if str(s).startswith("DELETE FROM media_items")]
+        assert len(deletes) == 1
+        assert result["items_removed"] == 1
+
+    def test_failed_listing_keeps_saved_pages(self):
+        from app.services.plex import PlexListingError
+
+        async def failing(items):
+            yield items[:2]
+            raise PlexListingError("page at 2: HTTP 503")
+
+        result, session, queued = self._scan(0, 5, pages=failing, known=["stale"])
+        assert result["status"] == "completed"
+        assert result["items_queued"] == queued.call_count == 2
+        assert result["items_removed"] == 0 and session.library.last_reconciled is None
+
+
+class TestLibraryWatermarks:
+    def test_advance_only_moves_forward(self):
+        from datetime import datetime
+        from unittest.mock import MagicMock
+        from app.tasks.clip_processing import _advance_watermarks
+
+        lib = MagicMock(added_watermark=None, updated_watermark=datetime(2024, 1, 1))
+        _advance_watermarks(lib, [
+            {"added_at": 1700000000, "updated_at": 1700000500},
+            {"added_at": "1700000100", "updated_at": None},
+        ])
+        assert lib.added_watermark == datetime.utcfromtimestamp(1700000100)
+        assert lib.updated_watermark == datetime(2024, 1, 1)
+
+
+class TestDuplicateDispatch:
+    def _session(self, *rows):
+        from unittest.mock import MagicMock
+        db = MagicMock()
+        db.execute.return_value.all.return_value = list(rows)
+        return db
+
+    def test_recovery_leaves_live_tasks_alone(self):
+        from unittest.mock import patch
+        from app.tasks import clip_processing
+
+        db = self._session(("a", "processing", "task-a"), ("b", "processing", "task-b"), ("c", "queued", None))
+        with patch.object(clip_processing, "_task_live", side_effect=lambda t: t == "task-a"):
+            assert clip_processing._recover_stale_items(db) == 2
+        update = db.execute.call_args_list[-1].args[0]
+        assert sorted(update.compile().params["id_1"]) == ["b", "c"]
+
+    def test_in_flight_item_not_started_again(self):
+        from unittest.mock import MagicMock, patch
+        from app.tasks import clip_processing
+
+        item = MagicMock(processing_status="processing", file_path="/media/movie.mkv", title="Movie")
+        db = MagicMock()
+        db.execute.return_value.scalar_one_or_none.return_value = item
+        with patch.object(clip_processing, "SyncSession", return_value=db), \
+                patch.object(clip_processing, "chain") as pipeline:
+            result = clip_processing.process_media_item.run("00000000-0000-0000-0000-000000000001")
+        assert result == {"status": "skipped", "reason": "already in progress"}
+        pipeline.assert_not_called()
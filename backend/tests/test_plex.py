@@ -0,0 +1,124 @@
+import httpx
+import pytest
+from unittest.mock import patch
+from app.services import plex
+from app.services.http_client import close_http_client, get_http_client
+from app.services.plex import PlexListingError, PlexService
+
+
+def _metadata(n):
+    return {
+        "ratingKey": str(n), "title": f"Movie {n}", "type": "movie", "addedAt": 1700000000 + n,
+        "Media": [{"Part": [{"file": f"/media/movie{n}.mkv"}]}],
+    }
+
+
+class FakeServer:
+    """Plex section listing honouring X-Plex-Container-Start/Size."""
+
+    def __init__(self, total, failures=None):
+        self.total = total
+        self.failures = dict(failures or {})
+        self.requests = []
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        start = int(request.headers["X-Plex-Container-Start"])
+        size = int(request.headers["X-Plex-Container-Size"])
+        self.requests.append((start, dict(request.url.params)))
+        if self.failures.get(start, 0) > 0:
+            self.failures[start] -= 1
+            return httpx.Response(503)
+        items = [_metadata(n) for n in range(start, min(start + size, self.total))]
+        return httpx.Response(200, json={"MediaContainer": {
+            "size": len(items), "totalSize": self.total, "Metadata": items,
+        }})
+
+
+async def _listing(server, **kwargs):
+    async with httpx.AsyncClient(transport=httpx.MockTransport(server)) as client:
+        with patch.object(plex.settings, "plex_page_size", 10), \
+                patch.object(plex, "PAGE_RETRY_BACKOFF_S", 0), \
+                patch.object(plex, "get_http_client", return_value=client):
+            return [
+                page async for page in PlexService().iter_library_items("http://plex", "token", "1", **kwargs)
+            ]
+
+
+class TestLibraryPaging:
+    @pytest.mark.asyncio
+    async def test_pages_in_order(self):
+        server = FakeServer(total=35)
+        pages = await _listing(server)
+        assert [len(p) for p in pages] == [10, 10, 10, 5]
+        assert [d["rating_key"] for p in pages for d in p] == [str(n) for n in range(35)]
+        assert sorted(start for start, _ in server.requests) == [0, 10, 20, 30]
+
+    @pytest.mark.asyncio
+    async def test_failed_page_retried(self):
+        server = FakeServer(total=25, failures={10: 2})
+        pages = await _listing(server)
+        assert sum(len(p) for p in pages) == 25
+        assert [start for start, _ in server.requests].count(10) == 3
+
+    @pytest.mark.asyncio
+    async def test_page_out_of_retries_raises(self):
+        server = FakeServer(total=25, failures={20: 100})
+        with patch.object(plex.settings, "plex_page_retries", 1), pytest.raises(PlexListingError):
+            await _listing(server)
+
+    @pytest.mark.asyncio
+    async def test_delta_filters_merge_once(self):
+        server = FakeServer(total=5)
+        pages = await _listing(server, added_since=1700000000, updated_since=1700000000)
+        assert sum(len(p) for p in pages) == 5
+        assert {"addedAt>>", "updatedAt>>"} <= {k for _, params in server.requests for k in params}
+
+
+class ShrinkingServer(FakeServer):
+    """Listing whose first item is deleted right after the first page is served."""
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        start = int(request.headers["X-Plex-Container-Start"])
+        size = int(request.headers["X-Plex-Container-Size"])
+        self.requests.append((start, dict(request.url.params)))
+        keys = list(range(1, self.total + 1)) if len(self.requests) > 1 else list(range(self.total + 1))
+        items = [_metadata(n) for n in keys[start:start + size]]
+        return httpx.Response(200, json={"MediaContainer": {
+            "size": len(items), "totalSize": len(keys), "Metadata": items,
+        }})
+
+
+class TestListingConsistency:
+    @pytest.mark.asyncio
+    async def test_full_listing_that_shrank_raises(self):
+        server = ShrinkingServer(total=25)
+        with pytest.raises(PlexListingError, match="changed during listing"):
+            await _listing(server)
+
+    @pytest.mark.asyncio
+    async def test_delta_listing_not_checked(self):
+        server = ShrinkingServer(total=25)
+        pages = await _listing(server, added_since=1700000000)
+        keys = {d["rating_key"] for p in pages for d in p}
+        assert len(keys) == 25 and "10" not in keys  # shifted out of view, but no error
+
+
+class TestSharedClient:
+    @pytest.mark.asyncio
+    async def test_one_client_per_loop_until_closed(self):
+        client = get_http_client("http://nas:32400/library/sections")
+        assert get_http_client("http://nas:32400/status/sessions") is client
+        await close_http_client()
+        assert client.is_closed
+        replacement = get_http_client("http://nas:32400/library/sections")
+        assert replacement is not client
+        await close_http_client()
+
+    @pytest.mark.asyncio
+    async def test_connection_limits_per_host(self):
+        lan = get_http_client("http://nas:32400/library/sections")
+        remote = get_http_client("https://plex.tv/api/v2/resources")
+        assert lan is not remote
+        assert get_http_client("http://nas2:32400/") not in (lan, remote)
+        await close_http_client()
+        assert lan.is_closed and remote.is_closed
@@ -0,0 +1,110 @@
+import pytest
+from app.services import plex_throttle
+from app.services.plex_throttle import PlexThrottle, IDLE, SLOW, PAUSED, UNKNOWN
+
+
+class FakePlex:
+    def __init__(self, streams=0, transcodes=0):
+        self.sessions = {"streams": streams, "transcodes": transcodes}
+        self.polls = 0
+
+    def __call__(self):
+        self.polls += 1
+        return self.sessions
+
+
+class TestPlexThrottle:
+    @pytest.mark.parametrize("sessions,level", [
+        ({"streams": 0, "transcodes": 0}, IDLE),
+        ({"streams": 1, "transcodes": 0}, SLOW),
+        ({"streams": 1, "transcodes": 1}, PAUSED),
+        ({"streams": 5, "transcodes": 0}, PAUSED),
+        (None, UNKNOWN),
+    ])
+    def test_classify(self, sessions, level):
+        assert plex_throttle.classify(sessions).level == level
+
+    def test_idle_admits_immediately(self, fake_redis):
+        throttle = PlexThrottle(fake_redis, FakePlex())
+        assert throttle.admit() == 0
+        assert throttle.admit() == 0
+        assert throttle.current().level == IDLE
+
+    def test_streaming_slows_intake(self, fake_redis):
+        throttle = PlexThrottle(fake_redis, FakePlex(streams=1))
+        assert throttle.admit() == 0
+        delay = throttle.admit()
+        assert 0 < delay <= plex_throttle.settings.plex_throttle_slow_interval_s
+
+    def test_transcode_pauses_until_next_poll(self, fake_redis):
+        plex = FakePlex(streams=1, transcodes=1)
+        throttle = PlexThrottle(fake_redis, plex)
+        assert throttle.admit() == plex_throttle.settings.plex_throttle_poll_s
+
+        # Playback stopped, but the state is only re-polled once it is stale
+        plex.sessions = {"streams": 0, "transcodes": 0}
+        assert throttle.admit() > 0
+        assert plex.polls == 1
+
+    def test_resumes_when_idle_again(self, monkeypatch, fake_redis):
+        plex = FakePlex(transcodes=1, streams=1)
+        store = fake_redis
+        throttle = PlexThrottle(store, plex)
+        assert throttle.admit() > 0
+
+        plex.sessions = {"streams": 0, "transcodes": 0}
+        monkeypatch.setattr(plex_throttle.settings, "plex_throttle_poll_s", 0)
+        store.values.pop(plex_throttle.REFRESH_LOCK_KEY)
+        assert throttle.admit() == 0
+        assert throttle.current().level == IDLE
+
+    def test_unreachable_plex_does_not_block(self, fake_redis):
+        def unreachable():
+            raise OSError("connection refused")
+
+        throttle = PlexThrottle(fake_redis, unreachable)
+        assert throttle.admit() == 0
+        assert throttle.current().level == UNKNOWN
+
+
+class TestIntakeGate:
+    def _gate(self, fake_redis, plex):
+        from unittest.mock import MagicMock
+        from app.tasks.intake import IntakeGate
+
+        app = MagicMock()
+        return IntakeGate(app, "db@host", PlexThrottle(fake_redis, plex)), app.control
+
+    def test_idle_keeps_consuming(self, fake_redis):
+        gate, control = self._gate(fake_redis, FakePlex())
+        gate.step()
+        assert gate.is_open
+        control.cancel_consumer.assert_not_called()
+
+    def test_transcode_stops_consuming_until_idle(self, fake_redis):
+        plex = FakePlex(streams=1, transcodes=1)
+        gate, control = self._gate(fake_redis, plex)
+        gate.step()
+        gate.step()
+        control.cancel_consumer.assert_called_once_with("intake", destination=["db@host"])
+
+        plex.sessions = {"streams": 0, "transcodes": 0}
+        fake_redis.delete(plex_throttle.STATE_KEY)
+        fake_redis.delete(plex_throttle.REFRESH_LOCK_KEY)
+        gate.step()
+        control.add_consumer.assert_called_once_with("intake", destination=["db@host"])
+
+    def test_streaming_lets_one_item_through(self, fake_redis):
+        from app.tasks.intake import INTAKE_TASK
+
+        gate, control = self._gate(fake_redis, FakePlex(streams=1))
+        gate.step()
+        assert gate.is_open
+        gate.on_received("app.tasks.clip_processing.rank_clip_candidates")
+        assert gate.is_open
+        gate.on_received(INTAKE_TASK)
+        assert not gate.is_open
+        # The slow slot is taken, so the next check keeps intake closed
+        assert gate.step() > 0
+        assert not gate.is_open
+        control.add_consumer.assert_not_called()
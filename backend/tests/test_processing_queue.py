@@ -0,0 +1,30 @@
+from datetime import datetime, timedelta
+from app.services.processing_queue import compute_priority, celery_priority, MAX_PRIORITY
+
+NOW = datetime(2026, 10, 1, 12, 0, 0)
+
+
+class TestProcessingPriority:
+    def test_recently_added_beats_back_catalog(self):
+        yesterday = compute_priority(NOW - timedelta(hours=20), 0, False, now=NOW)
+        last_year = compute_priority(NOW - timedelta(days=400), 0, False, now=NOW)
+        assert yesterday > last_year
+
+    def test_recency_steps(self):
+        ages = [timedelta(hours=1), timedelta(days=5), timedelta(days=20), timedelta(days=200), timedelta(days=900)]
+        scores = [compute_priority(NOW - age, 3, False, now=NOW) for age in ages]
+        assert scores == [4, 3, 2, 1, 0]
+
+    def test_items_without_clips_first(self):
+        assert compute_priority(None, 0, False, now=NOW) > compute_priority(None, 4, False, now=NOW)
+
+    def test_taste_selection_boost(self):
+        assert compute_priority(None, 5, True, now=NOW) == 3
+
+    def test_capped(self):
+        assert compute_priority(NOW, 0, True, now=NOW) == MAX_PRIORITY
+
+    def test_celery_priority_inverted_for_redis(self):
+        assert celery_priority(MAX_PRIORITY) == 0
+        assert celery_priority(0) == 9
+        assert celery_priority(42) == 0
@@ -0,0 +1,53 @@
+import random
+import time
+from app.services.quote_matcher import QuoteMatcher, get_quote_matcher, normalize_quote
+
+
+class TestQuoteMatcher:
+    def setup_method(self):
+        self.matcher = QuoteMatcher([
+            "I'll be back.",
+            "May the Force be with you.",
+            "Here's looking at you, kid.",
+            "You're gonna need a bigger boat.",
+        ])
+
+    def test_normalize(self):
+        assert normalize_quote("  Here's   lookin' at YOU, kid! ") == "heres lookin at you kid"
+        assert normalize_quote("Café — déjà vu") == "cafe deja vu"
+
+    def test_exact_quote_in_line_scores_highest(self):
+        assert self.matcher.score("I'll be back") == 1.0
+        assert self.matcher.score("Fine. I'll be back!") == 1.0
+
+    def test_fragment_of_quote_is_graded(self):
+        partial = self.matcher.score("need a bigger boat")
+        assert 0.5 < partial < 1.0
+        assert self.matcher.score("gonna need a bigger boat") > partial
+
+    def test_fuzzy_transcription_difference(self):
+        score = self.matcher.score("You are gonna need a bigger boat")
+        assert 0.5 <= score < 1.0
+
+    def test_short_or_unrelated_lines_do_not_match(self):
+        assert self.matcher.score("be") == 0.0
+        assert self.matcher.score("Where is the boat?") == 0.0
+        assert self.matcher.score("") == 0.0
+
+    def test_matcher_reused_per_process(self):
+        quotes = ["I'll be back", "Here's looking at you, kid"]
+        assert get_quote_matcher(quotes) is get_quote_matcher(list(quotes))
+
+    def test_large_collection_lookup(self):
+        rng = random.Random(3)
+        words = [f"w{i}" for i in range(5000)]
+        quotes = [" ".join(rng.choices(words, k=rng.randint(3, 12))) for _ in range(20000)]
+        matcher = QuoteMatcher(quotes)
+        lines = [" ".join(rng.choices(words, k=8)) for _ in range(2000)] + quotes[:50]
+
+        started = time.perf_counter()
+        scores = [matcher.score(line) for line in lines]
+        elapsed = time.perf_counter() - started
+
+        assert all(score == 1.0 for score in scores[-50:])
+        assert elapsed < 2.0
@@ -0,0 +1,64 @@
+import json
+import numpy as np
+from app.services.quote_store import QuoteStore, import_quotes
+
+
+def _write_dumps(tmp_path):
+    csv_path = tmp_path / "quotes.csv"
+    csv_path.write_text(
+        "title,year,quote\n"
+        "Jaws,1975,You're gonna need a bigger boat.\n"
+        "Jaws,1975,\"You're gonna need a BIGGER boat!\"\n"
+        "The Terminator,1984,I'll be back.\n"
+        "Casablanca,,\"Here's looking at you, kid.\"\n"
+        ",1999,no title\n",
+        encoding="utf-8",
+    )
+    jsonl_path = tmp_path / "quotes.jsonl"
+    jsonl_path.write_text(
+        json.dumps({"movie": "Amélie", "year": "2001", "text": "Les temps sont durs pour les rêveurs."}) + "\n"
+        + json.dumps({"title": "The Terminator", "year": 1984, "quote": "Come with me if you want to live."}) + "\n",
+        encoding="utf-8",
+    )
+    return [str(csv_path), str(jsonl_path)]
+
+
+class TestQuoteStore:
+    def test_import_and_lookup(self, tmp_path):
+        out = str(tmp_path / "store")
+        stats = import_quotes(_write_dumps(tmp_path), out)
+        assert stats["skipped"] == 1
+
+        store = QuoteStore(out)
+        assert store.quotes_for("Jaws", 1975) == ["You're gonna need a bigger boat."]
+        assert sorted(store.quotes_for("the terminator", 1984)) == [
+            "Come with me if you want to live.", "I'll be back.",
+        ]
+        assert store.quotes_for("AMELIE", 2001) == ["Les temps sont durs pour les rêveurs."]
+
+    def test_year_falls_back_to_bare_title(self, tmp_path):
+        out = str(tmp_path / "store")
+        import_quotes(_write_dumps(tmp_path), out)
+        store = QuoteStore(out)
+
+        assert store.quotes_for("Casablanca", 1942) == ["Here's looking at you, kid."]
+        assert store.quotes_for("Jaws", 2030) == ["You're gonna need a bigger boat."]
+        assert store.quotes_for("Unknown Title", 2000) == []
+
+    def test_reader_is_memory_mapped(self, tmp_path):
+        out = str(tmp_path / "store")
+        import_quotes(_write_dumps(tmp_path), out)
+        store = QuoteStore(out)
+        assert isinstance(store._keys, np.memmap)
+        assert isinstance(store._blob, np.memmap)
+
+    def test_reimport_replaces_store(self, tmp_path):
+        out = str(tmp_path / "store")
+        import_quotes(_write_dumps(tmp_path), out)
+        replacement = tmp_path / "jaws.jsonl"
+        replacement.write_text(json.dumps({"title": "Jaws", "year": 1975, "quote": "Smile, you son of a..."}) + "\n")
+        import_quotes([str(replacement)], out)
+
+        store = QuoteStore(out)
+        assert store.quotes_for("Jaws", 1975) == ["Smile, you son of a..."]
+        assert store.quotes_for("The Terminator") == []
@@ -0,0 +1,72 @@
+import os
+import fcntl
+import socket
+from app.services.clip_engine import _with_threads
+from app.services.resource_governor import FfmpegLease, ResourceGovernor
+
+
+class TestResourceGovernor:
+    def test_budget_split_between_concurrent_runs(self, tmp_path):
+        governor = ResourceGovernor(root=str(tmp_path), cpu_budget=8, enabled=True)
+        with governor.lease("encode") as first:
+            assert first.threads == 8
+            with governor.lease("encode") as second:
+                assert second.threads == 4
+                assert second.concurrent == 2
+        assert os.listdir(tmp_path) == []
+        assert ResourceGovernor.stats["encode_runs"] >= 2
+
+    def test_dead_process_leases_are_reclaimed(self, tmp_path):
+        # A lease left by a local process that no longer exists
+        stale = tmp_path / f"{socket.gethostname()}@999999999-1"
+        stale.touch()
+        governor = ResourceGovernor(root=str(tmp_path), cpu_budget=8, enabled=True)
+        with governor.lease("analysis") as lease:
+            assert lease.threads == 8
+        assert not stale.exists()
+
+    def test_leases_live_while_locked(self, tmp_path):
+        # Leases from another container: one still held, one left by a killed run
+        held = tmp_path / "other-container@12-1"
+        held.touch()
+        (tmp_path / "other-container@13-1").touch()
+        governor = ResourceGovernor(root=str(tmp_path), cpu_budget=8, enabled=True)
+        with open(held) as handle:
+            fcntl.flock(handle, fcntl.LOCK_EX)
+            with governor.lease("encode") as lease:
+                assert lease.concurrent == 2
+                assert lease.threads == 4
+        assert os.listdir(tmp_path) == ["other-container@12-1"]
+
+    def test_disabled_governor_leaves_commands_alone(self, tmp_path):
+        governor = ResourceGovernor(root=str(tmp_path), cpu_budget=8, enabled=False)
+        cmd = ["ffmpeg", "-y", "-i", "in.mkv", "-f", "null", "-"]
+        with governor.lease("analysis") as lease:
+            assert _with_threads(cmd, lease) == cmd
+            assert lease.threads == 0
+            assert lease.preexec_fn is None
+
+    def test_thread_args_placement(self):
+        lease = FfmpegLease(stage="encode", threads=8)
+        cmd = ["ffmpeg", "-y", "-ss", "1", "-i", "a.mkv", "-ss", "9", "-i", "a.mkv",
+               "-c:v", "libx264", "-movflags", "+faststart", "0.mp4",
+               "-c:v", "libx264", "-movflags", "+faststart", "1.mp4"]
+        threaded = _with_threads(cmd, lease, encoders=True)
+        assert threaded[:3] == ["ffmpeg", "-filter_complex_threads", "8"]
+        assert threaded.count("-threads") == 4  # two decoders, two encoders
+        assert threaded[threaded.index("-i") - 2:threaded.index("-i")] == ["-threads", "4"]
+        assert threaded[threaded.index("-movflags") - 2:threaded.index("-movflags")] == ["-threads", "4"]
+
+    def test_batch_splits_lease_threads(self):
+        lease = FfmpegLease(stage="encode", threads=8)
+        cmd = ["ffmpeg", "-y"]
+        for i in range(5):
+            cmd += ["-ss", str(i), "-i", "a.mkv"]
+        for i in range(5):
+            cmd += ["-c:v", "libx264", "-movflags", "+faststart", f"{i}.mp4"]
+        threaded = _with_threads(cmd, lease, encoders=True)
+        counts = [int(threaded[k + 1]) for k, arg in enumerate(threaded) if arg == "-threads"]
+        assert counts == [1] * 10  # 8 // 5 per decoder and per encoder
+
+        single = _with_threads(["ffmpeg", "-i", "a.mkv", "out.png"], lease)
+        assert single[single.index("-i") - 1] == "8"
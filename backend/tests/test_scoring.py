@@ -136,6 +136,38 @@ class TestClipScoringService:
         assert ranked[0].quote_match_score == 0.9
         assert ranked[1].quote_match_score == 0.5
 
+    def test_rank_candidates_suppresses_near_duplicates(self):
+        candidates = [
+            ClipCandidate(0, 20000, 20000, quote_match_score=0.9),
+            ClipCandidate(2000, 22000, 20000, quote_match_score=0.8),  # same moment, lower score
+            ClipCandidate(60000, 80000, 20000, quote_match_score=0.5),
+        ]
+        ranked = self.scoring.rank_candidates(candidates, max_clips=3)
+        assert [c.start_ms for c in ranked] == [0, 60000]
+        assert ranked[0].composite_score == self.scoring.compute_composite_score(candidates[0])
+
+    def test_rank_candidates_skips_existing_clips(self):
+        candidates = [
+            ClipCandidate(0, 20000, 20000, quote_match_score=0.9),
+            ClipCandidate(60000, 80000, 20000, quote_match_score=0.5),
+        ]
+        ranked = self.scoring.rank_candidates(candidates, max_clips=2, existing=[(1000, 19000)])
+        assert [c.start_ms for c in ranked] == [60000]
+
+    def test_composite_scores_vectorized(self):
+        from app.services.scoring import CandidateBatch
+
+        candidates = [
+            ClipCandidate(0, 15000, 15000, 0.8, 0.6, 0.5, 0.7, 0.9),
+            ClipCandidate(0, 10000, 10000, 5.0, 5.0, 5.0, 5.0, 5.0),
+            ClipCandidate(0, 10000, 10000),
+        ]
+        batch = CandidateBatch.from_candidates(candidates)
+        assert self.scoring.composite_scores(batch).tolist() == [
+            self.scoring.compute_composite_score(c) for c in candidates
+        ]
+        assert batch.to_candidates() == candidates
+
     def test_weights_sum(self):
         total = sum(self.scoring.WEIGHTS.values())
         assert abs(total - 0.95) < 0.01  # 5% reserved for AI vision (v2)
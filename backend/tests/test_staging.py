@@ -0,0 +1,92 @@
+import os
+import threading
+from unittest.mock import patch
+from app.services.analysis_cache import fingerprint_file
+from app.services.staging import ScratchStaging, volume_of
+
+
+def _source(tmp_path, name, size=64 * 1024):
+    library = tmp_path / "library"
+    library.mkdir(exist_ok=True)
+    path = library / f"{name}.mkv"
+    path.write_bytes(os.urandom(size))
+    return str(path)
+
+
+class TestScratchStaging:
+    def setup_method(self):
+        ScratchStaging.stats.clear()
+
+    def test_copy_then_hit(self, tmp_path):
+        source = _source(tmp_path, "movie")
+        (tmp_path / "library" / "movie.en.srt").write_text("1\n00:00:01,000 --> 00:00:02,000\nHi\n")
+        staging = ScratchStaging(root=str(tmp_path / "scratch"), max_bytes=10 ** 9, enabled=True)
+        fp = fingerprint_file(source)
+
+        with staging.stage(source, fp) as local:
+            assert local != source and local.startswith(str(tmp_path / "scratch"))
+            assert open(local, "rb").read() == open(source, "rb").read()
+            assert os.path.exists(os.path.join(os.path.dirname(local), "movie.en.srt"))
+        with staging.stage(source, fp) as again:
+            assert again == local
+
+        assert ScratchStaging.stats["copies"] == 1
+        assert ScratchStaging.stats["hits"] == 1
+        assert ScratchStaging.stats[f"copy_bytes:{volume_of(source)}"] >= 64 * 1024
+
+    def test_disabled_reads_source(self, tmp_path):
+        source = _source(tmp_path, "movie")
+        staging = ScratchStaging(root=str(tmp_path / "scratch"), enabled=False)
+        with staging.stage(source, fingerprint_file(source)) as path:
+            assert path == source
+        assert not os.path.exists(tmp_path / "scratch")
+
+    def test_lru_eviction_skips_entries_in_use(self, tmp_path):
+        size = 64 * 1024
+        staging = ScratchStaging(root=str(tmp_path / "scratch"), max_bytes=int(size * 2.5), enabled=True)
+        sources = [_source(tmp_path, f"ep{i}", size) for i in range(4)]
+        fps = [fingerprint_file(s) for s in sources]
+
+        with staging.stage(sources[0], fps[0]):
+            pass
+        os.utime(staging._entry_dir(fps[0]), (1000, 1000))
+        with staging.stage(sources[1], fps[1]) as b:
+            # ep0 is least recently used and idle, so it makes room for ep2
+            with staging.stage(sources[2], fps[2]) as c:
+                assert not os.path.exists(staging._entry_dir(fps[0]))
+                # ep1 and ep2 are both in use: ep3 is read in place
+                with staging.stage(sources[3], fps[3]) as d:
+                    assert d == sources[3]
+                assert os.path.exists(b) and os.path.exists(c)
+
+        assert ScratchStaging.stats["evictions"] == 1
+        assert ScratchStaging.stats["skipped"] == 1
+
+    def test_oversized_source_read_in_place(self, tmp_path):
+        source = _source(tmp_path, "movie")
+        staging = ScratchStaging(root=str(tmp_path / "scratch"), max_bytes=1024, enabled=True)
+        with staging.stage(source, fingerprint_file(source)) as path:
+            assert path == source
+
+    def test_volume_copy_slots(self, tmp_path):
+        source = _source(tmp_path, "movie")
+        staging = ScratchStaging(
+            root=str(tmp_path / "scratch"), max_bytes=10 ** 9, volume_concurrency=1, enabled=True,
+        )
+        os.makedirs(tmp_path / "scratch" / ".locks")
+        staged = []
+
+        def worker():
+            with staging.stage(source, fingerprint_file(source)) as path:
+                staged.append(path)
+
+        with patch("app.services.staging.SLOT_POLL_S", 0.01):
+            with staging._volume_slot(volume_of(source)):
+                thread = threading.Thread(target=worker)
+                thread.start()
+                thread.join(0.2)
+                # The only slot is taken, so the copy waits
+                assert thread.is_alive() and not staged
+            thread.join(5)
+        assert staged and staged[0] != source
+        assert ScratchStaging.stats["slot_waits"] > 0
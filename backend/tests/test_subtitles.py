@@ -0,0 +1,60 @@
+import os
+from app.services.subtitles import SrtParser, find_sidecar, parse_srt, read_srt, subtitle_source
+
+
+class TestSrtParser:
+    def test_crlf_bom_and_missing_numbers(self):
+        srt = (
+            "\ufeff1\r\n00:00:01,000 --> 00:00:04,000\r\nHello, world!\r\n\r\n"
+            "00:00:05.000 --> 00:00:08.500\r\n{\\an8}<i>How are</i>\r\nyou?\r\n"
+        )
+        entries = parse_srt(srt.splitlines(keepends=True))
+        assert [(e.index, e.start_ms, e.end_ms, e.text) for e in entries] == [
+            (1, 1000, 4000, "Hello, world!"),
+            (2, 5000, 8500, "How are you?"),
+        ]
+
+    def test_cues_emitted_while_feeding(self):
+        parser = SrtParser()
+        for line in ["7", "01:02:03,004 --> 01:02:05,000", "Line", ""]:
+            parser.feed(line)
+        assert parser.entries[0].index == 7
+        assert parser.entries[0].start_ms == 3_723_004
+        parser.feed("junk without timing")
+        assert len(parser.close()) == 1
+
+    def test_read_file(self, tmp_path):
+        path = tmp_path / "movie.srt"
+        path.write_text("1\n00:00:01,000 --> 00:00:02,000\nÇa va?\n", encoding="utf-8-sig")
+        assert [e.text for e in read_srt(str(path))] == ["Ça va?"]
+
+
+class TestSidecars:
+    def _media(self, tmp_path, *sidecars):
+        media = tmp_path / "Movie (1999).mkv"
+        media.touch()
+        for name in sidecars:
+            (tmp_path / name).write_text("")
+        return str(media)
+
+    def test_preferred_language_wins(self, tmp_path):
+        media = self._media(
+            tmp_path, "Movie (1999).srt", "Movie (1999).fr.srt", "Movie (1999).eng.srt",
+            "Movie (1999).en.forced.srt", "Movie (1999).en.sdh.srt",
+        )
+        assert find_sidecar(media, ["en", "eng"]) == os.path.join(tmp_path, "Movie (1999).en.sdh.srt")
+        os.remove(tmp_path / "Movie (1999).en.sdh.srt")
+        assert find_sidecar(media, ["en", "eng"]) == os.path.join(tmp_path, "Movie (1999).eng.srt")
+
+    def test_untagged_and_other_languages(self, tmp_path):
+        media = self._media(tmp_path, "Movie (1999).fr.srt", "Movie (1999) Extras.srt")
+        assert find_sidecar(media, ["en"]) is None
+        (tmp_path / "Movie (1999).srt").write_text("")
+        assert find_sidecar(media, ["en"]) == os.path.join(tmp_path, "Movie (1999).srt")
+
+    def test_source_changes_with_sidecar(self, tmp_path):
+        media = self._media(tmp_path)
+        embedded = subtitle_source(media)
+        assert embedded.startswith("embedded:")
+        (tmp_path / "Movie (1999).en.srt").write_text("1\n00:00:01,000 --> 00:00:02,000\nHi\n")
+        assert subtitle_source(media).startswith("sidecar:")
@@ -0,0 +1,98 @@
+import os
+from unittest.mock import patch
+from app.services import volume_scheduler
+from app.services.volume_scheduler import VolumeKeys, VolumeSlots, round_robin, volume_key
+
+
+class TestVolumeScheduler:
+    def test_round_robin_keeps_group_order(self):
+        items = ["a1", "a2", "a3", "b1", "c1", "c2"]
+        assert round_robin(items, key=lambda s: s[0]) == ["a1", "b1", "c1", "a2", "c2", "a3"]
+        assert round_robin([], key=lambda s: s) == []
+
+    def test_volume_key_groups_by_device(self, tmp_path):
+        (tmp_path / "a").mkdir()
+        (tmp_path / "a" / "movie.mkv").touch()
+        same = volume_key(str(tmp_path / "a" / "movie.mkv"))
+        assert same == volume_key(str(tmp_path))
+        # Missing files resolve through their nearest existing parent
+        assert volume_key(str(tmp_path / "gone" / "movie.mkv")) == same
+        dev = os.stat(tmp_path).st_dev
+        assert same == f"{os.major(dev)}:{os.minor(dev)}"
+
+    def test_volume_keys_memoized_per_directory(self, tmp_path):
+        keys = VolumeKeys()
+        assert keys(str(tmp_path / "ep1.mkv")) == keys(str(tmp_path / "ep2.mkv"))
+        assert len(keys._by_dir) == 1
+        assert keys(None) == ""
+
+    def test_slots_cap_in_flight_per_volume(self, fake_redis):
+        slots = VolumeSlots(fake_redis, max_in_flight=2, ttl_s=60)
+        assert slots.acquire("8:1", "item-a")
+        assert slots.acquire("8:1", "item-b")
+        assert not slots.acquire("8:1", "item-c")
+        # Other volumes are unaffected, and a holder is re-admitted
+        assert slots.acquire("8:17", "item-c")
+        assert slots.acquire("8:1", "item-a")
+        assert slots.in_flight("8:1") == 2
+
+        slots.release("8:1", "item-a")
+        assert slots.acquire("8:1", "item-c")
+        slots.release("8:1", "item-x")  # not a holder: no-op
+        assert slots.in_flight("8:1") == 2
+
+    def test_slots_expire(self, fake_redis):
+        store = fake_redis
+        slots = VolumeSlots(store, max_in_flight=1, ttl_s=60)
+        assert slots.acquire("8:1", "item-a")
+        for key in store.expiry:
+            store.expiry[key] = 0
+        assert slots.acquire("8:1", "item-b")
+
+    def test_disabled_cap_admits_everything(self, fake_redis):
+        slots = VolumeSlots(fake_redis, max_in_flight=0)
+        assert all(slots.acquire("8:1", f"item-{i}") for i in range(10))
+
+    def test_waiting_items_admitted_by_priority_then_age(self, fake_redis):
+        slots = VolumeSlots(fake_redis, max_in_flight=1, ttl_s=60)
+        assert slots.acquire("8:1", "running")
+        # Distinct enqueue times; back-to-back calls can share a clock tick
+        clock = iter(range(1_000_000, 1_000_010))
+        with patch.object(volume_scheduler.time, "time", lambda: next(clock)):
+            slots.wait("8:1", "old-low", priority=2)
+            slots.wait("8:1", "urgent", priority=7)
+            slots.wait("8:1", "new-low", priority=2)
+            slots.wait("8:1", "old-low", priority=9)  # already waiting: keeps its place
+        assert slots.waiting("8:1") == 3
+        assert slots.waiting_volumes() == ["8:1"]
+
+        # No free slot: the head stays in line
+        assert slots.admit_next("8:1") is None
+        assert slots.waiting("8:1") == 3
+
+        slots.release("8:1", "running")
+        assert slots.admit_next("8:1") == ("urgent", 7)
+        assert slots.admit_next("8:1") is None
+        slots.release("8:1", "urgent")
+        assert slots.admit_next("8:1") == ("old-low", 2)
+        slots.release("8:1", "old-low")
+        assert slots.admit_next("8:1") == ("new-low", 2)
+        assert slots.waiting("8:1") == 0 and slots.waiting_volumes() == []
+
+    def test_release_starts_next_waiting_item(self, fake_redis):
+        from unittest.mock import patch
+        from app.tasks import clip_processing
+
+        slots = VolumeSlots(fake_redis, max_in_flight=1, ttl_s=60)
+        with patch.object(clip_processing, "get_volume_slots", return_value=slots), \
+                patch.object(clip_processing.process_media_item, "apply_async") as dispatched:
+            assert clip_processing._admit_volume("8:1", "item-a")
+            assert not clip_processing._admit_volume("8:1", "item-b")
+            clip_processing._wait_for_volume("8:1", "item-b", 5)
+            dispatched.assert_not_called()
+
+            clip_processing._release_volume("8:1", "item-a")
+        dispatched.assert_called_once()
+        assert dispatched.call_args.kwargs["args"] == ["item-b"]
+        # The slot is already held for item-b, so its run is admitted
+        assert slots.acquire("8:1", "item-b") and slots.in_flight("8:1") == 1